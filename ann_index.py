@@ -0,0 +1,292 @@
+# ann_index.py
+"""
+Pure NumPy approximate nearest-neighbour index for semantic search.
+
+Vectors are unit-normalized, so the dot product is the cosine similarity.
+Small collections are scanned exactly; once an index holds more than
+``min_train_size`` vectors it is partitioned with k-means into ``nlist``
+inverted lists and a query only scores the ``nprobe`` closest lists.
+
+An index is not safe to change while it is being searched. Shared indexes
+are updated copy-on-write: change a ``copy()`` and publish it in place of
+the original.
+"""
+
+import heapq
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(vectors):
+    """
+    Return a float32 copy of ``vectors`` with every row scaled to unit length.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def kmeans(vectors, k, iterations=10, seed=0):
+    """
+    Spherical k-means; returns a (k, dim) matrix of unit centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                centroids[c] = vectors[rng.integers(len(vectors))]
+        centroids = normalize(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index with incremental insert and delete.
+
+    Keys are arbitrary hashable ids (e.g. ``('option', 42)``); adding a key
+    that already exists replaces its vector. With ``auto_train`` off, ``add``
+    never runs k-means; check ``needs_training`` and call ``train`` (or
+    ``partition``) when convenient instead.
+    """
+
+    def __init__(self, dim=None, nprobe=8, min_train_size=4096, iterations=10, auto_train=True):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.iterations = iterations
+        self.auto_train = auto_train
+
+        self._vectors = np.zeros((0, dim or 0), dtype=np.float32)
+        self._size = 0                 # rows used in _vectors, including deleted ones
+        self._keys = []                # row -> key (None once deleted)
+        self._rows = {}                # key -> row
+        self._centroids = None
+        self._assignment = np.zeros(0, dtype=np.int32)
+        self._lists = []               # centroid -> set of rows
+        self._list_arrays = {}         # centroid -> cached np.ndarray of rows
+        self._trained_size = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    @property
+    def trained(self):
+        return self._centroids is not None
+
+    @property
+    def needs_training(self):
+        """
+        Whether the index is big enough to partition, or has outgrown its partitioning.
+        """
+        if self.trained:
+            return len(self) > 4 * self._trained_size
+        return len(self) >= self.min_train_size
+
+    def copy(self):
+        """
+        Return an index with the same contents that can be changed while
+        searches keep reading this one.
+
+        The vector buffer is shared: rows in use are never rewritten and new
+        rows are written past ``_size``, so after copying only the copy may
+        be changed.
+        """
+        clone = IVFIndex.__new__(IVFIndex)
+        clone.__dict__.update(self.__dict__)
+        clone._keys = list(self._keys)
+        clone._rows = dict(self._rows)
+        clone._lists = [set(rows) for rows in self._lists]
+        clone._list_arrays = dict(self._list_arrays)
+        return clone
+
+    def add(self, keys, vectors):
+        """
+        Insert (or replace) vectors under the given keys.
+        """
+        keys = list(keys)
+        if not keys:
+            return
+        vectors = normalize(vectors)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+
+        self.remove([key for key in keys if key in self._rows])
+        self._reserve(self._size + len(keys))
+
+        rows = np.arange(self._size, self._size + len(keys))
+        self._vectors[rows] = vectors
+        self._size += len(keys)
+        for key, row in zip(keys, rows):
+            self._keys.append(key)
+            self._rows[key] = int(row)
+
+        if self.trained:
+            assignment = np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+            self._assignment = np.concatenate([self._assignment, assignment])
+            for row, c in zip(rows, assignment):
+                self._lists[c].add(int(row))
+                self._list_arrays.pop(int(c), None)
+        # (Re)train once the index has outgrown its partitioning
+        if self.auto_train and self.needs_training:
+            self.train()
+
+    def remove(self, keys):
+        """
+        Delete the given keys; unknown keys are ignored.
+        """
+        for key in keys:
+            row = self._rows.pop(key, None)
+            if row is None:
+                continue
+            self._keys[row] = None
+            if self.trained:
+                c = int(self._assignment[row])
+                self._lists[c].discard(row)
+                self._list_arrays.pop(c, None)
+
+        # Reclaim space once most rows are tombstones
+        if self._size > 1024 and len(self) < self._size // 2:
+            self._compact()
+
+    def train(self):
+        """
+        Partition the current vectors into ``sqrt(n)`` inverted lists.
+        """
+        sample = self.training_sample()
+        if sample is None:
+            return
+        self.partition(kmeans(sample[0], sample[1], self.iterations))
+
+    def training_sample(self):
+        """
+        Vectors to fit centroids on, for ``kmeans(vectors, nlist)``.
+
+        Returns:
+            tuple: ``(vectors, nlist)`` with up to 256 vectors (a copy) per
+            list, or None if the index is empty
+        """
+        live = self._live_rows()
+        if len(live) == 0:
+            return None
+        nlist = max(1, int(math.sqrt(len(live))))
+        if len(live) > 256 * nlist:
+            live = np.random.default_rng(0).choice(live, size=256 * nlist, replace=False)
+        return self._vectors[live], nlist
+
+    def partition(self, centroids):
+        """
+        Assign every vector to the closest of ``centroids`` (e.g. fitted on
+        a ``training_sample`` of an earlier copy of this index).
+        """
+        live = self._live_rows()
+        self._centroids = centroids
+        self._assignment = np.full(self._size, -1, dtype=np.int32)
+        self._assignment[live] = np.argmax(self._vectors[live] @ centroids.T, axis=1)
+        self._lists = [set() for _ in range(len(centroids))]
+        for row in live:
+            self._lists[self._assignment[row]].add(int(row))
+        self._list_arrays = {}
+        self._trained_size = len(live)
+        logger.info(f"Trained IVF index: {len(live)} vectors in {len(centroids)} lists")
+
+    def search(self, query, top_k=10, threshold=None, row_filter=None, keys=None):
+        """
+        Return up to ``top_k`` ``(key, score)`` pairs, best first.
+
+        Args:
+            query: Query vector (normalized internally)
+            top_k (int): Maximum number of results
+            threshold (float): Optional minimum score
+            row_filter (callable): Optional ``key -> bool`` predicate
+            keys (iterable): Optional subset of keys to score exactly instead
+                of probing the inverted lists
+        """
+        if len(self) == 0 or top_k <= 0:
+            return []
+        query = normalize(query)[0]
+
+        if keys is not None:
+            rows = sorted(self._rows[key] for key in keys if key in self._rows)
+            candidate_sets = [np.asarray(rows, dtype=np.int64)]
+        elif self.trained:
+            probes = np.argsort(-(self._centroids @ query))[:self.nprobe]
+            candidate_sets = [self._list_array(int(c)) for c in probes]
+        else:
+            candidate_sets = [self._live_rows()]
+
+        # Per-list top-k with argpartition, merged through a bounded heap
+        heap = []
+        for rows in candidate_sets:
+            if len(rows) == 0:
+                continue
+            scores = self._vectors[rows] @ query
+            if threshold is not None:
+                keep = scores >= threshold
+                rows, scores = rows[keep], scores[keep]
+            if row_filter is not None:
+                keep = np.fromiter((row_filter(self._keys[row]) for row in rows), dtype=bool, count=len(rows))
+                rows, scores = rows[keep], scores[keep]
+            if len(rows) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                rows, scores = rows[best], scores[best]
+            for row, score in zip(rows, scores):
+                item = (float(score), -int(row))
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+        return [(self._keys[-row], score) for score, row in sorted(heap, reverse=True)]
+
+    def vector(self, key):
+        """
+        Return the stored unit vector for ``key``.
+        """
+        return self._vectors[self._rows[key]]
+
+    def _live_rows(self):
+        return np.fromiter(sorted(self._rows.values()), dtype=np.int64, count=len(self._rows))
+
+    def _list_array(self, c):
+        rows = self._list_arrays.get(c)
+        if rows is None:
+            rows = np.fromiter(sorted(self._lists[c]), dtype=np.int64, count=len(self._lists[c]))
+            self._list_arrays[c] = rows
+        return rows
+
+    def _reserve(self, capacity):
+        if capacity <= len(self._vectors):
+            return
+        grown = np.zeros((max(capacity, 2 * len(self._vectors), 64), self.dim), dtype=np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        self._vectors = grown
+
+    def _compact(self):
+        live = self._live_rows()
+        keys = [self._keys[row] for row in live]
+        self._vectors = self._vectors[live].copy()
+        self._size = len(live)
+        self._keys = keys
+        self._rows = {key: row for row, key in enumerate(keys)}
+        if self.trained:
+            self._assignment = self._assignment[live]
+            self._lists = [set() for _ in range(len(self._centroids))]
+            for row, c in enumerate(self._assignment):
+                self._lists[c].add(row)
+            self._list_arrays = {}
@@ -4,15 +4,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
+import json
 import logging
-from flask import Flask, render_template, request, jsonify
+import tempfile
+from datetime import datetime
+from flask import Flask, Response, abort, render_template, request, jsonify
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 # shared SQLAlchemy object
-from db import db
+from db import db, query_count
 
 # ─── Logging ──────────────────────────────────────────────────────────────────
-logging.basicConfig(level=logging.DEBUG)
+# LOG_LEVEL=DEBUG for verbose output; request timings are exported at /metrics
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 # ─── Flask App setup ─────────────────────────────────────────────────────────
 app = Flask(__name__)
@@ -35,13 +39,72 @@ app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 # initialize db with app
 db.init_app(app)
 
-# now import your models and create tables
-with app.app_context():
-    from models import Survey, Question, Option, AuditLog
-    db.create_all()
+from models import Survey, Question, Option, QuestionCluster, Job
+from nlp_search import invalidate_search_cache
+import corpus_generation
+from fulltext import ensure_fulltext_schema
+from bulk_import import (
+    DEFAULT_BATCH_SIZE, ImportFormatError, detect_format, import_survey, read_questions
+)
+from survey_diff import apply_survey_diff
+from survey_compare import compare_surveys as diff_surveys
+from question_clusters import cluster_members, list_clusters
+from conditional import survey_response
+from snapshots import delete_snapshot, get_snapshot, refresh_snapshot
+from read_models import comparison_view, next_survey_cursor, survey_row, survey_summaries
+from versions import delete_versions, ensure_history, list_versions, reconstruct, record_version
+import fastjson
+from jobs import JOB_UPLOAD_DIR, UnknownJobKind, enqueue, job_summary
+import audit
+import metrics
+from pagination import (
+    after_id, decode_position_cursor, encode_cursor, ndjson_response, page_limit, set_next_cursor, wants_ndjson
+)
+
+# ─── Startup hooks ───────────────────────────────────────────────────────────
+# By default tables are created on import. With LAZY_STARTUP=true nothing
+# heavy runs at import time; call init_db() (or `flask --app app init-db`)
+# and warm_up_nlp() from your process manager's startup hooks instead.
+LAZY_STARTUP = os.environ.get("LAZY_STARTUP", "false").lower() == "true"
+NLP_WARMUP = os.environ.get("NLP_WARMUP", "false").lower() == "true"
+
+
+def init_db():
+    """Create any missing tables and full-text indexes."""
+    with app.app_context():
+        db.create_all()
+        ensure_fulltext_schema()
+        audit.ensure_audit_indexes()
+        corpus_generation.ensure_generation_row()
+
+
+def warm_up_nlp(background=True):
+    """Load the embedding model and index before the first search."""
+    import nlp_search
+    return nlp_search.warm_up(app, background=background)
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    init_db()
+
+
+audit.init_app(app)
+metrics.init_app(app)
+
+if not LAZY_STARTUP:
+    init_db()
+    if NLP_WARMUP:
+        warm_up_nlp()
 
 # ─── Routes & API ─────────────────────────────────────────────────────────────
 
+@app.after_request
+def add_query_count(response):
+    response.headers['X-Query-Count'] = str(query_count())
+    return response
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -52,20 +115,48 @@ def compare_page():
     return render_template('compare.html')
 
 
+def wants_async():
+    return request.args.get('async', 'false').lower() == 'true'
+
+
+def job_accepted(job):
+    """
+    202 response pointing at the status endpoint of a queued job.
+    """
+    response = jsonify(job_summary(job))
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response
+
+
 @app.route('/api/surveys', methods=['GET'])
 def get_surveys():
-    surveys = Survey.query.all()
-    return jsonify([{
-        'id': s.id,
-        'name': s.name,
-        'created_at': s.created_at.isoformat(),
-        'updated_at': s.updated_at and s.updated_at.isoformat()
-    } for s in surveys])
+    try:
+        limit = page_limit()
+        after = after_id()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # keyset pagination on the primary key
+    if wants_ndjson():
+        # the cursor goes in the headers, which are sent before the rows
+        return set_next_cursor(ndjson_response(survey_summaries(after=after, limit=limit, stream=True)),
+                               next_survey_cursor(after, limit))
+
+    surveys = list(survey_summaries(after=after, limit=None if limit is None else limit + 1))
+    next_cursor = None
+    if limit is not None and len(surveys) > limit:
+        surveys = surveys[:limit]
+        next_cursor = surveys[-1]['id']
+    return set_next_cursor(jsonify(surveys), next_cursor)
 
 
 @app.route('/api/surveys', methods=['POST'])
 def create_survey():
     data = request.json or {}
+    if wants_async():
+        return job_accepted(enqueue('create_survey', data))
+
     survey = Survey(name=data.get('name', 'Unnamed Survey'))
     db.session.add(survey)
 
@@ -79,12 +170,13 @@ def create_survey():
         for opt in q.get('options', []):
             db.session.add(Option(question=question, text=opt))
 
-    db.session.add(AuditLog(
-        action="CREATE",
-        entity_type="Survey",
-        details=f"Created survey {survey.name}"
-    ))
+    db.session.flush()
+    refresh_snapshot(survey.id)
+    record_version(survey.id)
+    audit.record("CREATE", "Survey", survey.id, f"Created survey {survey.name}")
+    corpus_generation.bump([survey.id])
     db.session.commit()
+    invalidate_search_cache()
 
     return jsonify({
         'id': survey.id,
@@ -93,129 +185,316 @@ def create_survey():
     }), 201
 
 
+@app.route('/api/surveys/import', methods=['POST'])
+def import_survey_file():
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'Upload a file in the "file" field'}), 400
+
+    try:
+        file_format = request.form.get('format') or detect_format(upload.filename)
+        if wants_async():
+            # the worker reads the file; keep it until the job has run
+            os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+            fd, path = tempfile.mkstemp(suffix=f'.{file_format}', dir=JOB_UPLOAD_DIR)
+            with os.fdopen(fd, 'wb') as f:
+                upload.save(f)
+            return job_accepted(enqueue('import_survey', {
+                'path': path,
+                'format': file_format,
+                'name': request.form.get('name') or os.path.splitext(upload.filename or '')[0] or None,
+                'batch_size': request.form.get('batch_size', type=int)
+            }))
+        file_name, questions = read_questions(upload.stream, file_format)
+        name = (request.form.get('name') or file_name
+                or os.path.splitext(upload.filename or '')[0] or 'Unnamed Survey')
+        stats = import_survey(name, questions,
+                              batch_size=request.form.get('batch_size', DEFAULT_BATCH_SIZE, type=int))
+    except ImportFormatError as e:
+        return jsonify({'error': str(e)}), 400
+
+    invalidate_search_cache()
+    return jsonify(stats), 201
+
+
 @app.route('/api/surveys/<int:survey_id>', methods=['GET'])
 def get_survey(survey_id):
-    survey = Survey.query.get_or_404(survey_id)
-    return jsonify({
-        'id': survey.id,
-        'name': survey.name,
-        'created_at': survey.created_at.isoformat(),
-        'updated_at': survey.updated_at and survey.updated_at.isoformat(),
-        'questions': [{
-            'id': q.id,
-            'question_number': q.question_number,
-            'text': q.text,
-            'options': [o.text for o in q.options]
-        } for q in survey.questions]
-    })
+    def build():
+        body = get_snapshot(survey_id)
+        if body is None:
+            abort(404)
+        return Response(body, mimetype='application/json')
+
+    return survey_response(build, survey_id)
 
 
 @app.route('/api/surveys/<int:survey_id>', methods=['PUT'])
 def update_survey(survey_id):
     data = request.json or {}
-    survey = Survey.query.get_or_404(survey_id)
+    # lock the survey row first, so concurrent updates append versions one at a time
+    survey = Survey.query.filter_by(id=survey_id).with_for_update().first_or_404()
+    ensure_history(survey.id)
 
     if 'name' in data:
         survey.name = data['name']
+    survey.updated_at = datetime.utcnow()
+    db.session.flush()
 
+    # only write the rows that actually changed
+    rows_touched = {'inserted': 0, 'updated': 0, 'deleted': 0}
     if 'questions' in data:
-        # delete old questions/options
-        for q in survey.questions:
-            for o in q.options:
-                db.session.delete(o)
-            db.session.delete(q)
-
-        # add new
-        for q in data['questions']:
-            question = Question(
-                survey=survey,
-                question_number=q.get('question_number', ''),
-                text=q.get('text', '')
-            )
-            db.session.add(question)
-            for opt in q.get('options', []):
-                db.session.add(Option(question=question, text=opt))
-
-    db.session.add(AuditLog(
-        action="UPDATE",
-        entity_type="Survey",
-        entity_id=survey.id,
-        details=f"Updated survey {survey.name}"
-    ))
+        rows_touched = apply_survey_diff(survey.id, data['questions'])
+    refresh_snapshot(survey.id)
+    version = record_version(survey.id)
+
+    audit.record("UPDATE", "Survey", survey.id, f"Updated survey {survey.name}")
+    corpus_generation.bump([survey.id])
     db.session.commit()
+    invalidate_search_cache()
 
     return jsonify({
         'id': survey.id,
         'name': survey.name,
-        'updated_at': survey.updated_at.isoformat()
+        'updated_at': survey.updated_at.isoformat(),
+        'version': version,
+        'rows_touched': rows_touched
     })
 
 
 @app.route('/api/surveys/<int:survey_id>', methods=['DELETE'])
 def delete_survey(survey_id):
     survey = Survey.query.get_or_404(survey_id)
-    db.session.add(AuditLog(
-        action="DELETE",
-        entity_type="Survey",
-        entity_id=survey.id,
-        details=f"Deleted survey {survey.name}"
-    ))
+    audit.record("DELETE", "Survey", survey.id, f"Deleted survey {survey.name}")
+    delete_snapshot(survey.id)
+    delete_versions(survey.id)
     db.session.delete(survey)
+    corpus_generation.bump([survey_id])
     db.session.commit()
+    invalidate_search_cache()
     return ('', 204)
 
 
+@app.route('/api/surveys/<int:survey_id>/versions', methods=['GET'])
+def get_survey_versions(survey_id):
+    try:
+        limit = page_limit()
+        after = after_id()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if survey_row(survey_id) is None:
+        abort(404)
+
+    found = list_versions(survey_id, after=after, limit=None if limit is None else limit + 1)
+    next_cursor = None
+    if limit is not None and len(found) > limit:
+        found = found[:limit]
+        next_cursor = found[-1]['version']
+    return set_next_cursor(jsonify(found), next_cursor)
+
+
+@app.route('/api/surveys/<int:survey_id>/versions/<int:version>', methods=['GET'])
+def get_survey_version(survey_id, version):
+    state = reconstruct(survey_id, version)
+    if state is None:
+        abort(404)
+    return Response(fastjson.dumps(state), mimetype='application/json')
+
+
 @app.route('/api/surveys/compare', methods=['GET'])
 def compare_surveys():
     s1 = request.args.get('survey1_id', type=int)
     s2 = request.args.get('survey2_id', type=int)
     if not s1 or not s2:
         return jsonify({'error': 'Both IDs required'}), 400
-
-    survey1 = Survey.query.get_or_404(s1)
-    survey2 = Survey.query.get_or_404(s2)
-
-    def to_dict(s):
-        return {
-            'id': s.id,
-            'name': s.name,
-            'created_at': s.created_at.isoformat(),
-            'updated_at': s.updated_at and s.updated_at.isoformat(),
-            'questions': [{
-                'question_number': q.question_number,
-                'text': q.text,
-                'options': [o.text for o in q.options]
-            } for q in s.questions]
-        }
-
+    v1 = request.args.get('survey1_version', type=int)
+    v2 = request.args.get('survey2_version', type=int)
+    if any(request.args.get(f'survey{n}_version') is not None and v is None
+           for n, v in ((1, v1), (2, v2))):
+        return jsonify({'error': 'Versions must be integers'}), 400
+
+    def survey_state(survey_id, version):
+        # current state from the snapshot, past versions from the history
+        if version is None:
+            body = get_snapshot(survey_id)
+            return None if body is None else json.loads(body)
+        return reconstruct(survey_id, version)
+
+    def build():
+        survey1 = survey_state(s1, v1)
+        survey2 = survey_state(s2, v2)
+        if survey1 is None or survey2 is None:
+            abort(404)
+        return jsonify({'survey1': comparison_view(survey1), 'survey2': comparison_view(survey2)})
+
+    return survey_response(build, s1, s2)
+
+
+@app.route('/api/surveys/compare/diff', methods=['GET'])
+def compare_surveys_diff():
+    s1 = request.args.get('survey1_id', type=int)
+    s2 = request.args.get('survey2_id', type=int)
+    if not s1 or not s2:
+        return jsonify({'error': 'Both IDs required'}), 400
+    if wants_async():
+        return job_accepted(enqueue('compare_surveys', {'survey1_id': s1, 'survey2_id': s2}))
+
+    def build():
+        survey1 = survey_row(s1)
+        survey2 = survey_row(s2)
+        if survey1 is None or survey2 is None:
+            abort(404)
+        return jsonify(diff_surveys(survey1, survey2))
+
+    return survey_response(build, s1, s2)
+
+
+@app.route('/api/clusters', methods=['GET'])
+def get_clusters():
+    try:
+        limit = page_limit()
+        after = after_id()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    min_size = request.args.get('min_size', default=2, type=int)
+
+    clusters = list_clusters(min_size, None if limit is None else limit + 1, after)
+    next_cursor = None
+    if limit is not None and len(clusters) > limit:
+        clusters = clusters[:limit]
+        next_cursor = clusters[-1]['cluster_id']
+    return set_next_cursor(jsonify(clusters), next_cursor)
+
+
+@app.route('/api/questions/<int:question_id>/cluster', methods=['GET'])
+def get_question_cluster(question_id):
+    entry = QuestionCluster.query.get_or_404(question_id)
+    questions = cluster_members([entry.cluster_id])[entry.cluster_id]
     return jsonify({
-        'survey1': to_dict(survey1),
-        'survey2': to_dict(survey2)
+        'cluster_id': entry.cluster_id,
+        'size': len(questions),
+        'questions': questions
     })
 
 
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    data = request.json or {}
+    try:
+        job = enqueue(data.get('kind'), data.get('payload') or {},
+                      max_attempts=int(data.get('max_attempts', 3)))
+    except (UnknownJobKind, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return job_accepted(job)
+
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    try:
+        limit = page_limit()
+        after = after_id()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    status = request.args.get('status')
+
+    # newest first, keyset pagination on the primary key
+    query = Job.query.order_by(Job.id.desc())
+    if status:
+        query = query.filter(Job.status == status)
+    if after is not None:
+        query = query.filter(Job.id < after)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    jobs = [job_summary(job) for job in query]
+    next_cursor = None
+    if limit is not None and len(jobs) > limit:
+        jobs = jobs[:limit]
+        next_cursor = jobs[-1]['id']
+    return set_next_cursor(jsonify(jobs), next_cursor)
+
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    return jsonify(job_summary(Job.query.get_or_404(job_id)))
+
+
+@app.route('/api/audit', methods=['GET'])
+def get_audit_log():
+    try:
+        limit = page_limit() or audit.DEFAULT_PAGE_SIZE
+        events, next_cursor = audit.list_events(
+            entity_type=request.args.get('entity_type'),
+            entity_id=request.args.get('entity_id', type=int),
+            action=request.args.get('action'),
+            since=audit.parse_time(request.args.get('since')),
+            until=audit.parse_time(request.args.get('until')),
+            limit=limit,
+            after=request.args.get('after')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return set_next_cursor(jsonify(events), next_cursor)
+
+
 @app.route('/api/search', methods=['GET'])
 def search_questions():
-    from nlp_search import semantic_search, keyword_search
+    from nlp_search import SEARCH_MODES, search
 
     q = request.args.get('q', '')
     use_nlp = request.args.get('use_nlp', 'true').lower() == 'true'
+    top_k = request.args.get('top_k', type=int)
     if not q:
         return jsonify({'error': 'Query required'}), 400
+    if top_k is not None and top_k < 1:
+        return jsonify({'error': 'top_k must be a positive integer'}), 400
+    survey_ids = request.args.getlist('survey_id', type=int) or None
+    if len(request.args.getlist('survey_id')) != len(survey_ids or []):
+        return jsonify({'error': 'survey_id must be an integer'}), 400
+    group = request.args.get('group')
+    if group not in (None, 'question'):
+        return jsonify({'error': "group must be 'question'"}), 400
+    mode = request.args.get('mode')
+    if mode not in (None,) + SEARCH_MODES:
+        return jsonify({'error': f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
+    try:
+        limit = page_limit()
+        after = decode_position_cursor(request.args['after']) if 'after' in request.args else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    timings = {}
+    results = search(q, use_nlp=use_nlp, top_k=top_k, survey_ids=survey_ids, group=group,
+                     mode=mode, timings=timings)
+
+    # results are ranked and cached, so a cursor is the last position served
+    # plus that result's identity, used to re-anchor if the ranking moved
+    start = 0
+    if after is not None:
+        start = after['pos'] + 1
+        if not 0 <= after['pos'] < len(results) or result_identity(results[after['pos']]) != after['id']:
+            start = next((i + 1 for i, r in enumerate(results) if result_identity(r) == after['id']), 0)
+    end = len(results) if limit is None else start + limit
+    page = results[start:end]
+
+    next_cursor = None
+    if end < len(results):
+        next_cursor = encode_cursor({'pos': end - 1, 'id': result_identity(results[end - 1])})
+    response = ndjson_response(page) if wants_ndjson() else jsonify(page)
+    return set_server_timing(set_next_cursor(response, next_cursor), timings)
+
+
+def set_server_timing(response, timings):
+    """
+    Report per-stage milliseconds in a Server-Timing header.
+    """
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(
+            f'{stage};dur={ms:.1f}' for stage, ms in timings.items()
+        )
+    return response
 
-    if use_nlp:
-        try:
-            results = semantic_search(q)
-        except Exception:
-            results = keyword_search(q)
-    else:
-        results = keyword_search(q)
-
-    # flag NLP usage
-    for r in results:
-        r['nlp_used'] = 'similarity' in r
 
-    return jsonify(results)
+def result_identity(result):
+    return [result['match_type'], result['question_id'], result.get('matched_option')]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,319 @@
+# audit.py
+"""
+Audit trail writes and queries.
+
+``record()`` is called by every write path instead of adding an
+``AuditLog`` row directly. What happens next depends on AUDIT_MODE:
+
+    sync   (default) the row is added to the current session and committed
+           with the change it describes; an audit row exists if and only
+           if the change does.
+    async  the row is held on the session until it commits, then handed to
+           a background writer that inserts events in batches of up to
+           AUDIT_BATCH_SIZE at least every AUDIT_FLUSH_INTERVAL seconds.
+           Rolled-back changes are never audited, but events still queued
+           when the process is killed are lost (a clean exit flushes them).
+
+Reads go through ``list_events()``, which pages newest first with a
+keyset cursor on (timestamp, id) so every page is an index range scan
+regardless of table size.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event, tuple_
+from sqlalchemy.orm import Session
+
+from db import db
+from models import AuditLog
+from pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+AUDIT_MODE = os.environ.get("AUDIT_MODE", "sync").lower()
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_QUEUE_SIZE = int(os.environ.get("AUDIT_QUEUE_SIZE", "10000"))
+
+# Page size for /api/audit when no ?limit= is given
+DEFAULT_PAGE_SIZE = 100
+
+_audit_table = AuditLog.__table__
+_PENDING = 'pending_audit_events'
+_STOP = object()
+
+_app = None
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class AuditWriter(threading.Thread):
+    """
+    Background thread that inserts queued audit events in batches.
+
+    ``submit()`` blocks when AUDIT_QUEUE_SIZE events are waiting, so a
+    stalled database slows writers down instead of dropping events.
+    """
+
+    def __init__(self, app, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL,
+                 queue_size=AUDIT_QUEUE_SIZE):
+        super().__init__(name="audit-writer", daemon=True)
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.pid = os.getpid()
+
+    def submit(self, rows):
+        for row in rows:
+            self.queue.put(row)
+
+    def flush(self):
+        """Block until every submitted event has been written (or given up on)."""
+        self.queue.join()
+
+    def close(self, timeout=10):
+        self.queue.put(_STOP)
+        self.join(timeout)
+
+    def _next_batch(self):
+        first = self.queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                row = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if row is _STOP:
+                # write what we have, then stop on the next get
+                self.queue.task_done()
+                self.queue.put(_STOP)
+                break
+            batch.append(row)
+        return batch
+
+    def _write(self, batch):
+        for attempt in range(3):
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(_audit_table.insert(), batch)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                logger.warning(f"Audit batch of {len(batch)} failed (attempt {attempt + 1}/3): {str(e)}")
+                time.sleep(0.5 * 2 ** attempt)
+        self.failed += len(batch)
+        for row in batch:
+            logger.error(f"Audit event lost: {row}")
+
+    def run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    self.queue.task_done()
+                    return
+                try:
+                    self._write(batch)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches
+        }
+
+
+def init_app(app):
+    """
+    Remember the app the background writer should use (async mode only).
+    """
+    global _app
+    _app = app
+
+
+def get_writer():
+    """
+    The writer for this process, started on first use (so forked workers get their own).
+    """
+    global _writer
+    if _app is None:
+        return None
+    with _writer_lock:
+        if _writer is None or _writer.pid != os.getpid():
+            _writer = AuditWriter(_app)
+            _writer.start()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def async_enabled():
+    return AUDIT_MODE == 'async' and _app is not None
+
+
+def record(action, entity_type, entity_id=None, details=None):
+    """
+    Audit a change made in the current session.
+
+    Args:
+        action (str): CREATE, UPDATE, DELETE, IMPORT, ...
+        entity_type (str): Survey, Question, ...
+        entity_id (int): Id of the changed entity
+        details (str): Human-readable description
+    """
+    row = {
+        'action': action,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'details': details,
+        'timestamp': datetime.utcnow()
+    }
+    if async_enabled():
+        # make sure a transaction is open, so its end is seen by the listeners below
+        db.session.connection()
+        db.session.info.setdefault(_PENDING, []).append(row)
+    else:
+        db.session.add(AuditLog(**row))
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_pending(session):
+    rows = session.info.pop(_PENDING, None)
+    if rows:
+        get_writer().submit(rows)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(session, transaction):
+    # runs after after_commit, so anything left belongs to a rolled back or closed transaction
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+def flush():
+    """
+    Wait until queued audit events are written (no-op in sync mode).
+    """
+    if _writer is not None and _writer.pid == os.getpid():
+        _writer.flush()
+
+
+def writer_stats():
+    if _writer is None or _writer.pid != os.getpid():
+        return None
+    return _writer.stats()
+
+
+def ensure_audit_indexes():
+    """
+    Create the audit_log indexes on databases created before they existed.
+
+    Must run inside an app context, after ``db.create_all()``.
+    """
+    for index in _audit_table.indexes:
+        try:
+            index.create(db.engine, checkfirst=True)
+        except Exception as e:
+            logger.warning(f"Could not create index {index.name}: {str(e)}")
+
+
+def parse_time(value):
+    """
+    Parse an ISO 8601 timestamp into naive UTC (None passes through).
+
+    Raises:
+        ValueError: If the value is not ISO 8601
+    """
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"invalid timestamp {value!r}; expected ISO 8601")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def list_events(entity_type=None, entity_id=None, action=None, since=None, until=None,
+                limit=DEFAULT_PAGE_SIZE, after=None):
+    """
+    One page of audit events, newest first.
+
+    Args:
+        entity_type (str): Only events for this entity type
+        entity_id (int): Only events for this entity id
+        action (str): Only this action
+        since (datetime): Only events at or after this time
+        until (datetime): Only events before this time
+        limit (int): Page size
+        after (str): Cursor returned for the previous page
+
+    Returns:
+        tuple: (list of event dicts, cursor for the next page or None)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    query = db.session.query(
+        AuditLog.id, AuditLog.action, AuditLog.entity_type, AuditLog.entity_id,
+        AuditLog.details, AuditLog.timestamp
+    ).order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+
+    if entity_type is not None:
+        query = query.filter(AuditLog.entity_type == entity_type)
+    if entity_id is not None:
+        query = query.filter(AuditLog.entity_id == entity_id)
+    if action is not None:
+        query = query.filter(AuditLog.action == action)
+    if since is not None:
+        query = query.filter(AuditLog.timestamp >= since)
+    if until is not None:
+        query = query.filter(AuditLog.timestamp < until)
+    if after is not None:
+        try:
+            timestamp, last_id = decode_cursor(after)
+            timestamp = datetime.fromisoformat(timestamp)
+        except (TypeError, ValueError):
+            raise ValueError('invalid cursor')
+        if not isinstance(last_id, int) or isinstance(last_id, bool):
+            raise ValueError('invalid cursor')
+        query = query.filter(tuple_(AuditLog.timestamp, AuditLog.id) < (timestamp, last_id))
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].timestamp.isoformat(), rows[-1].id])
+    events = [
+        {
+            'id': row.id,
+            'action': row.action,
+            'entity_type': row.entity_type,
+            'entity_id': row.entity_id,
+            'details': row.details,
+            'timestamp': row.timestamp.isoformat()
+        }
+        for row in rows
+    ]
+    return events, next_cursor
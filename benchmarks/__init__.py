@@ -0,0 +1,14 @@
+# benchmarks/__init__.py
+"""
+Reproducible performance benchmarks.
+
+    python -m benchmarks.run                                  # 50 x 40 x 5 corpus, SQLite
+    python -m benchmarks.run --surveys 200 --questions 80 --requests 500
+    python -m benchmarks.run --database postgresql://localhost/bench --reset
+    python -m benchmarks.compare results/before.json results/after.json
+
+``corpus`` generates a seeded synthetic corpus with realistic question
+text and near-duplicates, ``encoder`` is a dependency-free stand-in for the
+embedding model, ``run`` loads the corpus and drives the API through the
+Flask test client, and ``compare`` diffs two JSON reports.
+"""
@@ -0,0 +1,95 @@
+# benchmarks/compare.py
+"""
+Diff two benchmark reports written by ``benchmarks.run``.
+
+    python -m benchmarks.compare before.json after.json
+    python -m benchmarks.compare before.json after.json --threshold 10 --fail-on-regression
+
+For each scenario in both reports, prints p50, p99 and throughput with the
+relative change. A latency increase or throughput drop larger than
+``--threshold`` percent is marked as a regression. Reports generated with
+different corpus parameters are compared anyway, with a warning.
+"""
+
+import argparse
+import json
+import sys
+
+# (metric, True if bigger is better)
+METRICS = (('p50_ms', False), ('p99_ms', False), ('throughput_rps', True), ('mean_queries', False))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("before", help="baseline report")
+    parser.add_argument("after", help="candidate report")
+    parser.add_argument("--threshold", type=float, default=5.0,
+                        help="percent change that counts as a regression (default: %(default)s)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="exit with status 1 if any metric regressed")
+    return parser.parse_args(argv)
+
+
+def change(before, after):
+    """
+    Percent change from ``before`` to ``after`` (None when undefined).
+    """
+    if before is None or after is None or before == 0:
+        return None
+    return (after - before) / before * 100
+
+
+def compare_reports(before, after, threshold):
+    """
+    Per-scenario, per-metric comparison rows.
+
+    Returns:
+        list: ``{'scenario', 'metric', 'before', 'after', 'change', 'regression'}`` dicts
+    """
+    rows = []
+    for scenario in sorted(set(before['scenarios']) & set(after['scenarios'])):
+        old, new = before['scenarios'][scenario], after['scenarios'][scenario]
+        for metric, higher_is_better in METRICS:
+            pct = change(old.get(metric), new.get(metric))
+            worse = pct is not None and (-pct if higher_is_better else pct) > threshold
+            rows.append({
+                'scenario': scenario,
+                'metric': metric,
+                'before': old.get(metric),
+                'after': new.get(metric),
+                'change': pct,
+                'regression': worse
+            })
+    return rows
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"before: {before['meta'].get('commit')} ({before['meta'].get('created_at')})")
+    print(f"after:  {after['meta'].get('commit')} ({after['meta'].get('created_at')})")
+    if before.get('corpus') != after.get('corpus') or before['meta'].get('database') != after['meta'].get('database'):
+        print("warning: reports use different corpora or databases; numbers are not directly comparable")
+    only = set(before['scenarios']) ^ set(after['scenarios'])
+    if only:
+        print(f"skipped (in one report only): {', '.join(sorted(only))}")
+    print()
+
+    rows = compare_reports(before, after, args.threshold)
+    print(f"{'scenario':<24} {'metric':<15} {'before':>12} {'after':>12} {'change':>9}")
+    for row in rows:
+        pct = '' if row['change'] is None else f"{row['change']:+.1f}%"
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['scenario']:<24} {row['metric']:<15} {row['before']!s:>12} {row['after']!s:>12} {pct:>9}{flag}")
+
+    regressions = sum(row['regression'] for row in rows)
+    print(f"\n{regressions} regression(s) beyond {args.threshold:g}%")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# benchmarks/corpus.py
+"""
+Seeded synthetic survey corpora.
+
+Question text is built from templates over a vocabulary of topics,
+products and activities, with answer scales that match the question type
+(Likert, frequency, yes/no, demographics). A share of the questions are
+near-duplicates of earlier ones, the way trackers re-field questions with
+small edits: changed case or punctuation, a swapped synonym, a dropped
+filler word. Identical arguments always produce the identical corpus.
+"""
+
+import random
+
+TOPICS = (
+    'customer service', 'product quality', 'delivery speed', 'pricing', 'the checkout process',
+    'our mobile app', 'the website', 'store cleanliness', 'staff friendliness', 'wait times',
+    'the loyalty programme', 'billing', 'returns and refunds', 'the onboarding experience',
+    'technical support', 'product selection', 'opening hours', 'parking', 'packaging',
+    'online chat support', 'the subscription plan', 'account security', 'email newsletters',
+)
+ACTIVITIES = (
+    'shop online', 'visit our stores', 'contact customer support', 'use the mobile app',
+    'read product reviews', 'compare prices', 'buy gifts', 'subscribe to services',
+    'recommend brands to friends', 'return a purchase', 'use coupons', 'pay by card',
+)
+CHANNELS = ('email', 'phone', 'social media', 'live chat', 'in store', 'text message')
+
+TEMPLATES = (
+    ('likert', 'How satisfied are you with {topic}?'),
+    ('likert', 'Overall, how would you rate {topic}?'),
+    ('likert', 'To what extent do you agree that {topic} meets your needs?'),
+    ('likert', 'How likely are you to recommend us based on {topic}?'),
+    ('frequency', 'How often do you {activity}?'),
+    ('frequency', 'In the past month, how often did you {activity}?'),
+    ('yesno', 'Have you ever had a problem with {topic}?'),
+    ('yesno', 'Did you {activity} in the last 12 months?'),
+    ('channel', 'Which channel do you prefer when you {activity}?'),
+    ('open', 'What one thing would most improve {topic}?'),
+    ('age', 'What is your age group?'),
+    ('region', 'Which region do you live in?'),
+)
+SCALES = {
+    'likert': ('Very satisfied', 'Satisfied', 'Neutral', 'Dissatisfied', 'Very dissatisfied',
+               'Not applicable', "Don't know"),
+    'frequency': ('Daily', 'Weekly', 'Monthly', 'A few times a year', 'Never', 'Prefer not to say'),
+    'yesno': ('Yes', 'No', "Don't remember"),
+    'channel': CHANNELS,
+    'open': ('Other (please specify)',),
+    'age': ('18-24', '25-34', '35-44', '45-54', '55-64', '65+', 'Prefer not to say'),
+    'region': ('North', 'South', 'East', 'West', 'Central', 'Overseas'),
+}
+SYNONYMS = {
+    'satisfied': 'happy', 'rate': 'score', 'often': 'frequently', 'problem': 'issue',
+    'improve': 'make better', 'recommend': 'suggest', 'prefer': 'like best', 'past': 'last',
+}
+FILLERS = ('Overall, ', 'In general, ', 'Thinking about your last visit, ', '')
+
+
+def _perturb(rng, text):
+    """A near-duplicate of ``text``."""
+    edit = rng.randrange(4)
+    if edit == 0:
+        return text.lower() if rng.random() < 0.5 else text.upper()
+    if edit == 1:
+        return text.rstrip('?') + rng.choice(('', ' ?', '??', '.'))
+    if edit == 2:
+        words = text.split()
+        swappable = [i for i, w in enumerate(words) if w.lower().strip('?,') in SYNONYMS]
+        if swappable:
+            i = rng.choice(swappable)
+            stripped = words[i].lower().strip('?,')
+            words[i] = words[i].lower().replace(stripped, SYNONYMS[stripped])
+            return ' '.join(words)
+    return rng.choice(FILLERS) + text[0].lower() + text[1:]
+
+
+def _question(rng):
+    kind, template = rng.choice(TEMPLATES)
+    text = template.format(topic=rng.choice(TOPICS), activity=rng.choice(ACTIVITIES))
+    return kind, text
+
+
+def generate_corpus(surveys=50, questions=40, options=5, duplicate_rate=0.2, seed=42):
+    """
+    Yield survey dicts shaped like ``bulk_import.import_survey`` input.
+
+    Args:
+        surveys (int): Number of surveys
+        questions (int): Questions per survey
+        options (int): Maximum options per question (scales are truncated to it)
+        duplicate_rate (float): Share of questions that re-use an earlier question
+        seed (int): Random seed
+
+    Returns:
+        generator: ``{'name': str, 'questions': [{'question_number', 'text', 'options'}]}``
+    """
+    rng = random.Random(seed)
+    seen = []
+    for s in range(surveys):
+        wave = f"Wave {s // 4 + 1}"
+        survey_questions = []
+        for q in range(questions):
+            if seen and rng.random() < duplicate_rate:
+                kind, text = rng.choice(seen)
+                if rng.random() < 0.7:
+                    text = _perturb(rng, text)
+            else:
+                kind, text = _question(rng)
+                seen.append((kind, text))
+            survey_questions.append({
+                'question_number': f"Q{q + 1}",
+                'text': text,
+                'options': list(SCALES[kind][:options])
+            })
+        yield {'name': f"Customer Tracker {wave} - Panel {s % 4 + 1} #{s + 1}", 'questions': survey_questions}
+
+
+def sample_queries(count=200, seed=7):
+    """
+    Search strings resembling what users type: topics, phrases, question codes.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        pick = rng.random()
+        if pick < 0.4:
+            queries.append(rng.choice(TOPICS))
+        elif pick < 0.7:
+            queries.append(f"{rng.choice(('satisfied with', 'how often', 'problem with', 'rate'))} "
+                           f"{rng.choice(TOPICS).split()[-1]}")
+        elif pick < 0.85:
+            queries.append(rng.choice(ACTIVITIES))
+        else:
+            queries.append(f"Q{rng.randrange(1, 41)}")
+    return queries
@@ -0,0 +1,43 @@
+# benchmarks/encoder.py
+"""
+Stand-in sentence encoder for benchmarks.
+
+Hashes lower-cased words and character trigrams into a fixed number of
+signed buckets and L2-normalizes the result. Texts that share words land
+close together, which is enough to exercise the semantic and hybrid search
+paths (index, fusion, scoring) without torch or a model download. The
+hashes are stable across processes, so runs are reproducible.
+"""
+
+import re
+import zlib
+
+import numpy as np
+
+
+class HashingEncoder:
+    """
+    ``encoder(texts) -> float32 matrix`` for ``nlp_search.use_encoder``.
+    """
+
+    def __init__(self, dim=128):
+        self.dim = dim
+        self.name = f"benchmark-hashing-{dim}"
+
+    def _features(self, text):
+        words = re.findall(r'\w+', text.lower())
+        for word in words:
+            yield word
+            padded = f' {word} '
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+
+    def __call__(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode('utf-8'))
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
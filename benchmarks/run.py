@@ -0,0 +1,263 @@
+# benchmarks/run.py
+"""
+Load a synthetic corpus and measure API latency and throughput.
+
+    python -m benchmarks.run --surveys 100 --questions 60 --requests 300
+    python -m benchmarks.run --scenarios search_keyword,search_hybrid --cold-cache
+    python -m benchmarks.run --database postgresql://localhost/bench --reset
+
+Every scenario sends ``--warmup`` untimed requests and then ``--requests``
+timed ones through the Flask test client, so numbers cover routing, SQL
+and serialization but not the network or a WSGI server. Semantic and
+hybrid search use the stand-in encoder from benchmarks/encoder.py.
+
+The JSON report (default benchmarks/results/<timestamp>-<commit>.json)
+holds the environment, the corpus parameters, setup timings and per
+scenario latency percentiles, throughput and mean SQL statements per
+request. Compare two reports with ``python -m benchmarks.compare``.
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+import numpy as np
+
+logger = logging.getLogger("benchmarks")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+SCENARIOS = (
+    'list_surveys', 'get_survey', 'get_survey_revalidate', 'compare', 'compare_diff',
+    'search_keyword', 'search_semantic', 'search_hybrid',
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the survey API on a synthetic corpus")
+    parser.add_argument("--surveys", type=int, default=50, help="surveys to generate (default: %(default)s)")
+    parser.add_argument("--questions", type=int, default=40, help="questions per survey (default: %(default)s)")
+    parser.add_argument("--options", type=int, default=5, help="max options per question (default: %(default)s)")
+    parser.add_argument("--duplicates", type=float, default=0.2,
+                        help="share of near-duplicate questions (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (default: %(default)s)")
+    parser.add_argument("--database", help="SQLAlchemy URL (default: a fresh temporary SQLite file)")
+    parser.add_argument("--reset", action="store_true",
+                        help="drop and recreate every table in --database first")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="timed requests per scenario (default: %(default)s)")
+    parser.add_argument("--warmup", type=int, default=20,
+                        help="untimed requests per scenario (default: %(default)s)")
+    parser.add_argument("--scenarios", default=','.join(SCENARIOS),
+                        help="comma-separated subset of: " + ', '.join(SCENARIOS))
+    parser.add_argument("--cold-cache", action="store_true",
+                        help="clear search and comparison caches before every request")
+    parser.add_argument("--dim", type=int, default=128, help="stand-in encoder dimensions (default: %(default)s)")
+    parser.add_argument("--output", help="report path (default: benchmarks/results/<timestamp>-<commit>.json)")
+    return parser.parse_args(argv)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(latencies, query_counts, errors, elapsed):
+    """
+    Latency percentiles (ms), throughput and SQL statements for one scenario.
+    """
+    ms = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 4),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p90_ms': round(float(np.percentile(ms, 90)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+        'mean_queries': round(float(np.mean(query_counts)), 2) if query_counts else None
+    }
+
+
+def run_scenario(client, make_request, count, warmup, reset=None):
+    """
+    Send ``warmup`` + ``count`` requests built by ``make_request(i)``.
+
+    ``make_request`` returns ``(url, headers)``; ``reset`` runs before each request.
+    """
+    for i in range(warmup):
+        url, headers = make_request(i)
+        client.get(url, headers=headers).close()
+
+    latencies, query_counts, errors = [], [], 0
+    started = time.perf_counter()
+    for i in range(count):
+        url, headers = make_request(warmup + i)
+        if reset is not None:
+            reset()
+        t0 = time.perf_counter()
+        response = client.get(url, headers=headers)
+        response.get_data()
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code >= 400:
+            errors += 1
+        if 'X-Query-Count' in response.headers:
+            query_counts.append(int(response.headers['X-Query-Count']))
+        response.close()
+    return summarize(latencies, query_counts, errors, time.perf_counter() - started)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        logger.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        return 2
+
+    database = args.database or 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix="survey-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = database
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["LAZY_STARTUP"] = "true"
+    sys.path.insert(0, ROOT)
+
+    from app import app, init_db
+    from bulk_import import import_survey
+    from db import db
+    from models import Survey
+    import nlp_search
+    import survey_compare
+    from benchmarks.corpus import generate_corpus, sample_queries
+    from benchmarks.encoder import HashingEncoder
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    setup = {}
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        init_db()
+        if db.session.query(Survey.id).first() is not None:
+            logger.error("Database already has surveys; pass --reset to start from an empty schema")
+            return 2
+
+        logger.info(f"Generating {args.surveys} x {args.questions} x {args.options} corpus")
+        started = time.perf_counter()
+        survey_ids = []
+        for survey in generate_corpus(args.surveys, args.questions, args.options, args.duplicates, args.seed):
+            survey_ids.append(import_survey(survey['name'], survey['questions'])['id'])
+        setup['load_seconds'] = round(time.perf_counter() - started, 3)
+
+        encoder = HashingEncoder(args.dim)
+        nlp_search.use_encoder(encoder, encoder.name)
+        started = time.perf_counter()
+        nlp_search.sync_embeddings()
+        nlp_search.get_corpus()
+        nlp_search.train_index()
+        setup['index_seconds'] = round(time.perf_counter() - started, 3)
+
+    client = app.test_client()
+    queries = sample_queries(seed=args.seed)
+    etags = {}
+
+    # Builders are called as fn(rng, i) with the scenario's own RNG, so a
+    # scenario sends the same requests whichever scenarios ran before it
+    def random_survey(rng, i):
+        return f'/api/surveys/{rng.choice(survey_ids)}', None
+
+    def revalidate(rng, i):
+        survey_id = survey_ids[i % len(survey_ids)]
+        url = f'/api/surveys/{survey_id}'
+        if url not in etags:
+            etags[url] = client.get(url).headers.get('ETag')
+        return url, {'If-None-Match': etags[url]}
+
+    def random_pair(path):
+        def make(rng, i):
+            first, second = rng.sample(survey_ids, 2)
+            return f'{path}?survey1_id={first}&survey2_id={second}', None
+        return make
+
+    def search(mode):
+        def make(rng, i):
+            params = {'q': queries[i % len(queries)], 'mode': mode,
+                      'use_nlp': 'false' if mode == 'keyword' else 'true'}
+            return f'/api/search?{urlencode(params)}', None
+        return make
+
+    builders = {
+        'list_surveys': lambda rng, i: ('/api/surveys?limit=50', None),
+        'get_survey': random_survey,
+        'get_survey_revalidate': revalidate,
+        'compare': random_pair('/api/surveys/compare'),
+        'compare_diff': random_pair('/api/surveys/compare/diff'),
+        'search_keyword': search('keyword'),
+        'search_semantic': search('semantic'),
+        'search_hybrid': search('hybrid'),
+    }
+
+    def clear_caches():
+        nlp_search.search_result_cache.clear()
+        nlp_search.query_embedding_cache.clear()
+        survey_compare.comparison_cache.clear()
+
+    results = {}
+    for name in scenarios:
+        make_request = functools.partial(builders[name], random.Random(f"{args.seed}:{name}"))
+        results[name] = run_scenario(client, make_request, args.requests, args.warmup,
+                                     reset=clear_caches if args.cold_cache else None)
+        logger.info(f"{name:<24} p50 {results[name]['p50_ms']:>9.2f} ms  "
+                    f"p99 {results[name]['p99_ms']:>9.2f} ms  {results[name]['throughput_rps']:>9.1f} req/s")
+
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'created_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': database.split(':', 1)[0],
+            'cold_cache': args.cold_cache
+        },
+        'corpus': {
+            'surveys': args.surveys,
+            'questions': args.questions,
+            'options': args.options,
+            'duplicates': args.duplicates,
+            'seed': args.seed,
+            'encoder': encoder.name
+        },
+        'setup': setup,
+        'scenarios': results
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{commit or 'nocommit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    logger.info(f"Report written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
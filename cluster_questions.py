@@ -0,0 +1,64 @@
+# cluster_questions.py
+"""
+Batch job that groups near-duplicate questions across all surveys.
+
+    python cluster_questions.py             # re-cluster new or changed questions only
+    python cluster_questions.py --full      # re-cluster every question
+    python cluster_questions.py --workers 16 --vector-threshold 0.9
+
+Semantic matching uses the stored question embeddings; run reindex.py
+first (or pass --sync-embeddings) so new questions have one. Results are
+served by /api/clusters and /api/questions/<id>/cluster.
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+logger = logging.getLogger("cluster_questions")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate questions")
+    parser.add_argument("--full", action="store_true",
+                        help="re-cluster every question (needed after changing a threshold)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="threads for the similarity join (default: all cores)")
+    parser.add_argument("--vector-threshold", type=float,
+                        help="minimum embedding cosine similarity (default: CLUSTER_VECTOR_THRESHOLD)")
+    parser.add_argument("--text-threshold", type=float,
+                        help="minimum word Jaccard similarity (default: CLUSTER_TEXT_THRESHOLD)")
+    parser.add_argument("--sync-embeddings", action="store_true",
+                        help="embed new or changed rows before clustering")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from app import app
+    import nlp_search
+    import question_clusters
+
+    with app.app_context():
+        if args.sync_embeddings:
+            if nlp_search.load_nlp_dependencies() and nlp_search.initialize_model():
+                nlp_search.sync_embeddings()
+            else:
+                logger.warning("NLP model unavailable; clustering on text only")
+
+        stats = question_clusters.cluster_questions(
+            full=args.full,
+            workers=args.workers,
+            vector_threshold=args.vector_threshold,
+            text_threshold=args.text_threshold
+        )
+
+    logger.info(f"Done: {stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
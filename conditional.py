@@ -0,0 +1,84 @@
+# conditional.py
+"""
+Conditional GET support for survey reads.
+
+Survey representations only change when the survey row's ``updated_at``
+(or, for never-edited surveys, ``created_at``) changes, so a strong ETag
+can be derived from those timestamps without loading any questions.
+Handlers look up the versions with one narrow query, and a request whose
+``If-None-Match`` (or ``If-Modified-Since``) still matches gets an empty
+304 before the survey body is ever built.
+
+Last-Modified has one-second resolution, so two edits within one second
+would share it. ``If-Modified-Since`` is therefore only honoured for
+timestamps on a whole second; otherwise only the ETag can produce a 304.
+
+Responses carry ``Cache-Control: private, no-cache``: browsers may keep a
+copy but must revalidate it on every use.
+"""
+
+import hashlib
+
+from flask import Response, abort, request
+from werkzeug.http import is_resource_modified
+
+from db import db
+from models import Survey
+from read_models import last_modified
+
+# Bump when the JSON shape of a cached endpoint changes
+REPRESENTATION_VERSION = 3
+
+
+def survey_versions(*survey_ids):
+    """
+    Last-modified time of each survey, in argument order (404 if one is missing).
+    """
+    rows = db.session.query(Survey.id, Survey.created_at, Survey.updated_at).filter(
+        Survey.id.in_(survey_ids)).all()
+    versions = {row.id: last_modified(row) for row in rows}
+    if any(survey_id not in versions for survey_id in survey_ids):
+        abort(404)
+    return [versions[survey_id] for survey_id in survey_ids]
+
+
+def make_etag(*parts):
+    """
+    Strong ETag for a representation identified by ``parts``.
+    """
+    key = repr((REPRESENTATION_VERSION, request.endpoint) + parts)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def conditional_response(etag, last_modified, build):
+    """
+    Answer 304 when the client's copy is current, otherwise ``build()``.
+
+    Args:
+        etag (str): Strong entity tag of the current representation
+        last_modified (datetime): Naive UTC modification time
+        build (callable): Returns the full response; only called on a miss
+
+    Returns:
+        Response: With ETag, Last-Modified and Cache-Control set
+    """
+    # a sub-second timestamp cannot be told apart from an earlier edit in the same second
+    whole_second = last_modified if last_modified.microsecond == 0 else None
+    if is_resource_modified(request.environ, etag=etag, last_modified=whole_second):
+        response = build()
+    else:
+        response = Response(status=304)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def survey_response(build, *survey_ids):
+    """
+    Conditional response for a representation of the given surveys.
+    """
+    versions = survey_versions(*survey_ids)
+    etag = make_etag(*zip(survey_ids, versions))
+    return conditional_response(etag, max(versions), build)
@@ -0,0 +1,129 @@
+# corpus_generation.py
+"""
+Database-side generation counter of the searchable corpus.
+
+Every transaction that changes questions, options or stored embeddings
+calls ``bump()`` before it commits, which increments the single row of
+``corpus_generation``. Anything derived from the corpus (the in-memory
+embedding index, cached search results) remembers the generation it was
+built at and is current while ``current()`` still returns it. That is one
+primary-key lookup, and it sees writes made by every process, including
+background workers and command-line imports.
+
+Writers pass the surveys they changed to ``bump()``, which logs them in
+``corpus_change``. The embedding sync reads that log from the generation it
+last synced to (``synced()``), so it only looks at surveys that changed.
+One process at a time syncs, holding a lease on the counter row.
+
+On Postgres the bump holds the counter row's lock until commit, so
+generations are handed out in commit order.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select
+
+from db import db
+from models import CorpusChange, CorpusGeneration
+
+_table = CorpusGeneration.__table__
+_change_table = CorpusChange.__table__
+
+
+def ensure_generation_row():
+    """
+    Create the counter row if it is missing (called by init_db).
+    """
+    if db.session.execute(select(_table.c.id).where(_table.c.id == 1)).first() is None:
+        db.session.execute(_table.insert().values(id=1, value=0))
+        db.session.commit()
+
+
+def current():
+    """
+    The latest committed generation (0 before the first write).
+    """
+    return db.session.execute(select(_table.c.value).where(_table.c.id == 1)).scalar() or 0
+
+
+def bump(survey_ids=()):
+    """
+    Advance the generation in the current transaction.
+
+    Args:
+        survey_ids (iterable): Surveys whose questions or options this
+            transaction changed (created, edited or deleted)
+
+    Returns:
+        int: The new generation, visible to others once the transaction commits
+    """
+    updated = db.session.execute(_table.update().where(_table.c.id == 1).values(value=_table.c.value + 1))
+    if updated.rowcount == 0:
+        db.session.execute(_table.insert().values(id=1, value=1))
+        generation = 1
+    else:
+        generation = current()
+    changes = [{'survey_id': survey_id, 'generation': generation} for survey_id in set(survey_ids)]
+    if changes:
+        db.session.execute(_change_table.insert(), changes)
+    return generation
+
+
+def synced():
+    """
+    The generation embeddings were last synced to (0 if never).
+    """
+    return db.session.execute(select(_table.c.synced).where(_table.c.id == 1)).scalar() or 0
+
+
+def changed_surveys(since):
+    """
+    Surveys changed after generation ``since``.
+
+    Returns:
+        tuple: ``(survey_ids, generation)``, the ids and the latest
+        generation among them (``since`` if nothing changed)
+    """
+    rows = db.session.execute(
+        select(_change_table.c.survey_id, _change_table.c.generation).where(_change_table.c.generation > since)
+    ).all()
+    return {row.survey_id for row in rows}, max((row.generation for row in rows), default=since)
+
+
+def mark_synced(generation):
+    """
+    Record in the current transaction that embeddings are synced up to
+    ``generation``, and forget the changes that covers.
+    """
+    db.session.execute(_table.update().where(_table.c.id == 1).values(synced=generation))
+    db.session.execute(_change_table.delete().where(_change_table.c.generation <= generation))
+
+
+def acquire_sync_lease(owner, seconds):
+    """
+    Take (or renew) the embedding sync lease in the current transaction.
+
+    The lease is free when nobody holds it or the holder let it expire.
+
+    Returns:
+        bool: Whether ``owner`` now holds it
+    """
+    now = datetime.utcnow()
+    until = now + timedelta(seconds=seconds)
+    taken = db.session.execute(_table.update().where(
+        _table.c.id == 1,
+        or_(_table.c.sync_owner.is_(None), _table.c.sync_owner == owner, _table.c.sync_lease_until < now)
+    ).values(sync_owner=owner, sync_lease_until=until)).rowcount
+    if not taken and db.session.execute(select(_table.c.id).where(_table.c.id == 1)).first() is None:
+        db.session.execute(_table.insert().values(id=1, value=0, sync_owner=owner, sync_lease_until=until))
+        taken = 1
+    return bool(taken)
+
+
+def release_sync_lease(owner):
+    """
+    Give up the embedding sync lease, if ``owner`` holds it, in the current transaction.
+    """
+    db.session.execute(_table.update().where(_table.c.id == 1, _table.c.sync_owner == owner).values(
+        sync_owner=None, sync_lease_until=None
+    ))
@@ -1,5 +1,20 @@
 # db.py
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 # our single, shared SQLAlchemy object
 db = SQLAlchemy()
+
+
+# count SQL statements per request so N+1 patterns show up in responses
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get("query_count", 0) + 1
+
+
+def query_count():
+    """Number of SQL statements executed so far in the current request."""
+    return g.get("query_count", 0) if has_request_context() else 0
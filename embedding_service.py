@@ -0,0 +1,230 @@
+# embedding_service.py
+"""
+Local embedding server shared by all web workers.
+
+One process owns the sentence-transformer model and serves encode requests
+over a Unix socket. Requests that arrive together (from any number of
+workers) are coalesced into a single batched forward pass.
+
+    python embedding_service.py --socket /tmp/survey_embeddings.sock
+
+Workers use it when EMBEDDING_SOCKET points at the socket, and fall back to
+in-process inference when it is not reachable.
+
+Wire format: every frame is a 4-byte big-endian header length, a JSON
+header, and (for responses) ``rows * dim`` float32 values.
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger("embedding_service")
+
+DEFAULT_SOCKET = os.environ.get("EMBEDDING_SOCKET", "/tmp/survey_embeddings.sock")
+
+_HEADER = struct.Struct(">I")
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_frame(sock, header, payload=b""):
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data + payload)
+
+
+def recv_header(sock):
+    size, = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+class EmbeddingClient:
+    """
+    Thread-safe client; keeps one connection per thread and reconnects on failure.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def encode(self, texts):
+        """
+        Embed ``texts`` on the server; returns a float32 matrix in input order.
+
+        Raises:
+            OSError: If the service is unreachable or the connection fails
+            RuntimeError: If the server reports an encoding error
+        """
+        for attempt in (0, 1):
+            sock = getattr(self._local, "sock", None)
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                send_frame(sock, {"texts": list(texts)})
+                header = recv_header(sock)
+                if "error" in header:
+                    raise RuntimeError(header["error"])
+                rows, dim = header["shape"]
+                payload = _recv_exact(sock, rows * dim * 4)
+                return np.frombuffer(payload, dtype=np.float32).reshape(rows, dim)
+            except (OSError, ConnectionError):
+                self.close()
+                # A kept-alive connection may have been dropped by a server
+                # restart; retry once on a fresh one.
+                if attempt or sock is None:
+                    raise
+
+
+class Batcher:
+    """
+    Collects pending requests and encodes them together.
+
+    A batch is flushed when it reaches ``max_batch`` texts or the oldest
+    request has waited ``max_wait`` seconds.
+    """
+
+    def __init__(self, encode, max_batch=256, max_wait=0.005):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            total = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while total < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                total += len(item[0])
+
+            texts = [text for item_texts, _ in pending for text in item_texts]
+            try:
+                vectors = self.encode(texts) if texts else np.zeros((0, 0), dtype=np.float32)
+            except Exception as e:
+                logger.error(f"Batch of {len(texts)} texts failed: {str(e)}")
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            logger.debug(f"Encoded {len(texts)} texts from {len(pending)} requests")
+            start = 0
+            for item_texts, future in pending:
+                future.set_result(vectors[start:start + len(item_texts)])
+                start += len(item_texts)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        sock = self.request
+        while True:
+            try:
+                header = recv_header(sock)
+            except (ConnectionError, OSError):
+                return
+            try:
+                vectors = self.server.batcher.submit(header.get("texts", [])).result()
+            except Exception as e:
+                send_frame(sock, {"error": str(e)})
+                continue
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            if vectors.ndim != 2:
+                vectors = vectors.reshape(len(header.get("texts", [])), -1)
+            send_frame(sock, {"shape": list(vectors.shape)}, vectors.tobytes())
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, batcher):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _Handler)
+        self.batcher = batcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve sentence embeddings over a Unix socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="socket path (default: %(default)s)")
+    parser.add_argument("--max-batch", type=int, default=256, help="texts per forward pass")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="how long to wait for more requests before encoding")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="torch intra-op threads")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    import nlp_search
+
+    if not nlp_search.load_nlp_dependencies():
+        logger.error("NLP dependencies are not installed")
+        return 1
+    nlp_search.torch.set_num_threads(args.threads)
+    if not nlp_search.initialize_model():
+        return 1
+
+    batcher = Batcher(
+        lambda texts: nlp_search.encode_batch_local(texts, batch_size=args.max_batch),
+        max_batch=args.max_batch,
+        max_wait=args.max_wait_ms / 1000.0
+    )
+    server = EmbeddingServer(args.socket, batcher)
+    logger.info(f"Serving embeddings on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
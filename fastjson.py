@@ -0,0 +1,66 @@
+# fastjson.py
+"""
+JSON encoding for responses: orjson when installed, the stdlib otherwise.
+
+Both paths produce compact, key-sorted UTF-8 bytes that parse to the same
+values as Flask's default ``jsonify`` output. They differ only in byte
+details: orjson writes non-ASCII characters as UTF-8 rather than ``\\u``
+escapes, and spells some floats differently (``1e16`` for ``1e+16``).
+Datetimes are still sent through Flask's default hook (HTTP dates), so
+every field keeps its current format.
+"""
+
+import json
+
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _ORJSON_OPTIONS = (
+        orjson.OPT_SORT_KEYS
+        | orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_SERIALIZE_NUMPY
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+
+def dumps(obj, default=_default):
+    """
+    Compact, key-sorted JSON bytes.
+
+    Args:
+        obj: Value to encode
+        default (callable): Converts values JSON does not support natively
+
+    Returns:
+        bytes: UTF-8 JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=default, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def backend():
+    return 'orjson' if orjson is not None else 'json'
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider whose ``jsonify`` responses are encoded by ``dumps``.
+
+    Debug mode (or ``compact = False``) keeps Flask's indented stdlib output.
+    """
+
+    def encode(self, obj):
+        return dumps(obj, default=self.default)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj) + b'\n', mimetype=self.mimetype)
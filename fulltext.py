@@ -0,0 +1,157 @@
+# fulltext.py
+"""
+Indexed full-text search over question and option text.
+
+Two backends share one interface:
+
+    postgresql  a generated ``text_tsv`` tsvector column with a GIN index on
+                each table, ranked with ts_rank
+    sqlite      FTS5 external-content tables kept in sync by triggers,
+                ranked with bm25
+
+Every query term is matched as a prefix, so "satisf" finds "satisfied".
+On any other database (or SQLite without FTS5) ``search_ids`` returns None
+and callers fall back to ILIKE scans.
+"""
+
+import logging
+import re
+
+from sqlalchemy import bindparam, text
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+TABLES = ('question', 'option')
+
+# Survey scope per table: joins and the column holding the survey id
+_SCOPES = {
+    'question': ('', 't.survey_id'),
+    'option': ('JOIN question q ON q.id = t.question_id ', 'q.survey_id'),
+}
+
+# Per-engine backend name, or None when full-text search is unavailable
+_backends = {}
+
+_POSTGRES_SCHEMA = [
+    'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS text_tsv tsvector '
+    "GENERATED ALWAYS AS (to_tsvector('english', text)) STORED",
+    'CREATE INDEX IF NOT EXISTS ix_{table}_text_tsv ON "{table}" USING gin (text_tsv)',
+]
+
+_SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE {table}_fts USING fts5(text, content='{table}', content_rowid='id')",
+    "CREATE TRIGGER {table}_fts_ai AFTER INSERT ON \"{table}\" BEGIN "
+    "INSERT INTO {table}_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER {table}_fts_ad AFTER DELETE ON \"{table}\" BEGIN "
+    "INSERT INTO {table}_fts({table}_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER {table}_fts_au AFTER UPDATE OF text ON \"{table}\" BEGIN "
+    "INSERT INTO {table}_fts({table}_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO {table}_fts(rowid, text) VALUES (new.id, new.text); END",
+    "INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+]
+
+
+def ensure_fulltext_schema():
+    """
+    Create the full-text columns, indexes or virtual tables if missing.
+
+    Must run inside an app context, after ``db.create_all()``.
+    """
+    engine = db.engine
+    dialect = engine.dialect.name
+    backend = None
+
+    try:
+        with engine.begin() as conn:
+            if dialect == 'postgresql':
+                for table in TABLES:
+                    for statement in _POSTGRES_SCHEMA:
+                        conn.execute(text(statement.format(table=table)))
+                backend = 'postgresql'
+            elif dialect == 'sqlite':
+                for table in TABLES:
+                    exists = conn.execute(
+                        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                        {'name': f'{table}_fts'}
+                    ).first()
+                    if not exists:
+                        for statement in _SQLITE_SCHEMA:
+                            conn.execute(text(statement.format(table=table)))
+                backend = 'sqlite'
+    except Exception as e:
+        logger.warning(f"Full-text search unavailable, using ILIKE scans: {str(e)}")
+        backend = None
+
+    _backends[engine.url] = backend
+    return backend
+
+
+def fulltext_backend():
+    """
+    Name of the active full-text backend for the current engine, or None.
+    """
+    engine = db.engine
+    if engine.url not in _backends:
+        return ensure_fulltext_schema()
+    return _backends[engine.url]
+
+
+def query_terms(query):
+    """
+    Split a search string into lower-case word terms.
+    """
+    return re.findall(r'\w+', query.lower())
+
+
+def search_ids(table, query, limit, survey_ids=None):
+    """
+    Ids of ``table`` rows matching every term of ``query``, best first.
+
+    Args:
+        table (str): 'question' or 'option'
+        query (str): Free-text search string
+        limit (int): Maximum number of ids
+        survey_ids (list): Only rows belonging to these surveys
+
+    Returns:
+        list: Matching ids, or None if no full-text backend is available
+    """
+    backend = fulltext_backend()
+    if backend is None:
+        return None
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    join, survey_column = _SCOPES[table]
+    scope = ''
+    if survey_ids is not None:
+        scope = f"AND {survey_column} IN :survey_ids "
+    else:
+        join = ''
+
+    if backend == 'postgresql':
+        statement = text(
+            f'SELECT t.id FROM "{table}" t {join}'
+            f"WHERE t.text_tsv @@ to_tsquery('english', :q) {scope}"
+            "ORDER BY ts_rank(t.text_tsv, to_tsquery('english', :q)) DESC, t.id "
+            "LIMIT :limit"
+        )
+        params = {'q': ' & '.join(f'{term}:*' for term in terms), 'limit': limit}
+    else:
+        # FTS5 tables cannot be aliased in MATCH/bm25, so they keep their name
+        if scope:
+            join = f'JOIN "{table}" t ON t.id = {table}_fts.rowid {join}'
+        statement = text(
+            f"SELECT {table}_fts.rowid FROM {table}_fts {join}"
+            f"WHERE {table}_fts MATCH :q {scope}"
+            f"ORDER BY bm25({table}_fts), {table}_fts.rowid LIMIT :limit"
+        )
+        params = {'q': ' '.join(f'"{term}"*' for term in terms), 'limit': limit}
+
+    if survey_ids is not None:
+        statement = statement.bindparams(bindparam('survey_ids', expanding=True))
+        params['survey_ids'] = list(survey_ids)
+    return [row[0] for row in db.session.execute(statement, params)]
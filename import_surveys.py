@@ -0,0 +1,69 @@
+# import_surveys.py
+"""
+Bulk-import survey files from the command line.
+
+    python import_surveys.py wave1.csv wave2.xlsx --batch-size 2000
+    python import_surveys.py tracker.json --name "Tracker 2024 Q3"
+
+See bulk_import.py for the accepted file layouts. Semantic search picks up
+the new questions once they are embedded: pass --sync-embeddings, or run
+reindex.py afterwards.
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+logger = logging.getLogger("import_surveys")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-import surveys from JSON, JSON Lines, CSV or XLSX")
+    parser.add_argument("paths", nargs="+", help="files to import, one survey per file")
+    parser.add_argument("--name", help="survey name (default: name in the file, or the file name)")
+    parser.add_argument("--format", help="file format (default: from the extension)")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="questions per batch of INSERT statements (default: %(default)s)")
+    parser.add_argument("--sync-embeddings", action="store_true",
+                        help="embed the imported questions and options for semantic search")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from app import app
+    from bulk_import import ImportFormatError, detect_format, import_survey, read_questions
+    import nlp_search
+
+    status = 0
+    with app.app_context():
+        for path in args.paths:
+            try:
+                file_format = args.format or detect_format(path)
+                with open(path, "rb") as stream:
+                    file_name, questions = read_questions(stream, file_format)
+                    name = args.name or file_name or os.path.splitext(os.path.basename(path))[0]
+                    stats = import_survey(name, questions, batch_size=args.batch_size)
+            except (OSError, ImportFormatError) as e:
+                logger.error(f"{path}: {str(e)}")
+                status = 1
+                continue
+            logger.info(
+                f"{path}: survey {stats['id']} with {stats['questions']} questions and "
+                f"{stats['options']} options ({stats['rows_per_second']} rows/s)"
+            )
+
+        if args.sync_embeddings:
+            if nlp_search.encoder_ready():
+                encoded = nlp_search.sync_embeddings()
+                logger.info(f"Embedded {encoded} rows")
+            else:
+                logger.warning("No embedding model or service available; run reindex.py later")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,416 @@
+# jobs.py
+"""
+Database-backed background jobs.
+
+Heavy work (reindexing, big imports and creates, comparisons, clustering)
+is stored as a row in the ``job`` table and executed by ``worker.py``
+processes instead of inside an HTTP request. There is no broker: workers
+poll the table and claim a job with a conditional UPDATE (``SELECT ... FOR
+UPDATE SKIP LOCKED`` on Postgres), so any number of workers can share one
+database.
+
+A failed job is retried with exponential backoff until ``max_attempts`` is
+reached. Running jobs send a heartbeat; a job whose worker died is picked
+up again once its heartbeat is older than JOB_STALE_AFTER seconds, and
+failed once it has used up its attempts, so a job that kills its worker
+cannot take down every worker in turn. SQLite cannot write heartbeats
+while a handler holds the write lock, so there the job is considered stale
+only after JOB_STALE_AFTER_SQLITE seconds.
+
+Handlers are registered with ``@handler('kind')`` and called as
+``fn(payload, progress)``; ``progress(fraction, message)`` records how far
+they got. Their return value is stored as the job's JSON result. An
+``on_failure(payload)`` hook runs once a job has failed for good, e.g. to
+remove files it would have consumed.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+from db import db
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+JOB_HEARTBEAT = float(os.environ.get("JOB_HEARTBEAT", "10"))
+JOB_STALE_AFTER = float(os.environ.get("JOB_STALE_AFTER", "120"))
+JOB_STALE_AFTER_SQLITE = float(os.environ.get("JOB_STALE_AFTER_SQLITE", "3600"))
+JOB_RETRY_DELAY = float(os.environ.get("JOB_RETRY_DELAY", "5"))
+JOB_UPLOAD_DIR = os.environ.get("JOB_UPLOAD_DIR", os.path.join(os.getcwd(), "instance", "uploads"))
+
+HANDLERS = {}
+FAILURE_HOOKS = {}
+
+_job_table = Job.__table__
+
+
+class UnknownJobKind(ValueError):
+    """Raised when enqueuing a kind no handler is registered for."""
+
+
+class JobFailed(Exception):
+    """Raise from a handler to fail the job without retrying it."""
+
+
+def handler(kind, on_failure=None):
+    """
+    Register ``fn(payload, progress)`` as the handler for ``kind``, and
+    ``on_failure(payload)`` to run when a job of that kind fails for good.
+    """
+    def register(fn):
+        HANDLERS[kind] = fn
+        if on_failure is not None:
+            FAILURE_HOOKS[kind] = on_failure
+        return fn
+    return register
+
+
+def enqueue(kind, payload=None, max_attempts=3):
+    """
+    Store a new job and commit it.
+
+    Returns:
+        Job: The queued job
+
+    Raises:
+        UnknownJobKind: If no handler is registered for ``kind``
+    """
+    if kind not in HANDLERS:
+        raise UnknownJobKind(f"Unknown job kind {kind!r}; expected one of {', '.join(sorted(HANDLERS))}")
+    job = Job(kind=kind, payload=json.dumps(payload or {}), max_attempts=max_attempts)
+    db.session.add(job)
+    db.session.commit()
+    logger.info(f"Queued job {job.id} ({kind})")
+    return job
+
+
+def job_summary(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'progress': job.progress,
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'created_at': job.created_at and job.created_at.isoformat(),
+        'started_at': job.started_at and job.started_at.isoformat(),
+        'finished_at': job.finished_at and job.finished_at.isoformat()
+    }
+
+
+def stale_after():
+    """
+    Seconds without a heartbeat after which a running job's worker is presumed dead.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return max(JOB_STALE_AFTER, JOB_STALE_AFTER_SQLITE)
+    return JOB_STALE_AFTER
+
+
+def _stale(now):
+    return and_(Job.status == 'running', Job.heartbeat_at < now - timedelta(seconds=stale_after()))
+
+
+def _ready(now):
+    """
+    Jobs that may be claimed: queued and due, or running with a dead worker
+    and attempts left.
+    """
+    return or_(
+        and_(Job.status == 'queued', Job.run_after <= now),
+        and_(_stale(now), Job.attempts < Job.max_attempts)
+    )
+
+
+def fail_abandoned(now=None):
+    """
+    Fail running jobs whose worker died on their last attempt.
+
+    Returns:
+        int: Number of jobs failed
+    """
+    now = now or datetime.utcnow()
+    abandoned = [
+        (job_id, kind, payload) for job_id, kind, payload in db.session.query(Job.id, Job.kind, Job.payload).filter(
+            _stale(now), Job.attempts >= Job.max_attempts)
+    ]
+    failed = 0
+    for job_id, kind, payload in abandoned:
+        # conditional, so two workers never both fail (and clean up) a job
+        failed_now = db.session.execute(
+            _job_table.update().where(Job.id == job_id).where(_stale(now)).values(
+                status='failed',
+                error='Worker stopped responding on the last attempt',
+                finished_at=now
+            )
+        ).rowcount
+        db.session.commit()
+        if failed_now:
+            logger.error(f"Job {job_id} ({kind}) failed: its worker stopped responding on the last attempt")
+            _on_failure(job_id, kind, json.loads(payload or '{}'))
+            failed += 1
+    return failed
+
+
+def _on_failure(job_id, kind, payload):
+    hook = FAILURE_HOOKS.get(kind)
+    if hook is None:
+        return
+    try:
+        hook(payload)
+    except Exception as e:
+        logger.warning(f"Cleaning up after job {job_id} ({kind}) failed: {str(e)}")
+
+
+def claim_job(worker_id):
+    """
+    Atomically take the oldest runnable job.
+
+    Returns:
+        int: The claimed job id, or None if there is nothing to do
+    """
+    now = datetime.utcnow()
+    fail_abandoned(now)
+    candidate = db.session.query(Job.id).filter(_ready(now)).order_by(Job.id).limit(1)
+    if db.engine.dialect.name == 'postgresql':
+        candidate = candidate.with_for_update(skip_locked=True)
+    job_id = candidate.scalar()
+    if job_id is None:
+        db.session.rollback()
+        return None
+
+    # The status condition is re-checked, so two workers never both win
+    claimed = db.session.execute(
+        _job_table.update().where(Job.id == job_id).where(_ready(now)).values(
+            status='running',
+            worker=worker_id,
+            attempts=Job.attempts + 1,
+            started_at=now,
+            heartbeat_at=now
+        )
+    ).rowcount
+    db.session.commit()
+    return job_id if claimed else None
+
+
+def _update(job_id, **values):
+    """
+    Write job fields on a separate connection, outside the handler's transaction.
+    """
+    with db.engine.begin() as conn:
+        conn.execute(_job_table.update().where(_job_table.c.id == job_id).values(**values))
+
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, app, job_id):
+        super().__init__(name=f"job-{job_id}-heartbeat", daemon=True)
+        self.app = app
+        self.job_id = job_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        with self.app.app_context():
+            last_beat = time.monotonic()
+            while not self.stopped.wait(JOB_HEARTBEAT):
+                try:
+                    _update(self.job_id, heartbeat_at=datetime.utcnow())
+                    last_beat = time.monotonic()
+                except Exception as e:
+                    missed = time.monotonic() - last_beat
+                    if missed >= stale_after():
+                        logger.error(f"Heartbeat for job {self.job_id} failing for {missed:.0f}s; "
+                                     f"another worker may run it again: {str(e)}")
+                    else:
+                        logger.warning(f"Heartbeat for job {self.job_id} failed: {str(e)}")
+
+
+def run_job(job_id):
+    """
+    Execute a claimed job and record its outcome (retrying on failure).
+    """
+    from flask import current_app
+
+    job = db.session.get(Job, job_id)
+    kind, attempts, max_attempts = job.kind, job.attempts, job.max_attempts
+    payload = json.loads(job.payload or '{}')
+    db.session.commit()
+
+    last_report = [0.0]
+
+    def progress(fraction, message=None):
+        now = time.monotonic()
+        if fraction < 1 and now - last_report[0] < 1.0:
+            return
+        last_report[0] = now
+        try:
+            _update(job_id, progress=max(0.0, min(1.0, float(fraction))), message=message,
+                    heartbeat_at=datetime.utcnow())
+        except Exception as e:
+            # e.g. SQLite while the handler holds the write lock; never fail the job for it
+            logger.warning(f"Progress update for job {job_id} failed: {str(e)}")
+
+    heartbeat = _Heartbeat(current_app._get_current_object(), job_id)
+    heartbeat.start()
+    started = time.perf_counter()
+    try:
+        fn = HANDLERS.get(kind)
+        if fn is None:
+            raise JobFailed(f"No handler for job kind {kind!r}")
+        result = fn(payload, progress)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f"Job {job_id} ({kind}) failed on attempt {attempts}/{max_attempts}")
+        if attempts < max_attempts and not isinstance(e, JobFailed):
+            _update(job_id, status='queued', error=str(e),
+                    run_after=datetime.utcnow() + timedelta(seconds=JOB_RETRY_DELAY * 2 ** (attempts - 1)))
+        else:
+            _update(job_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+            _on_failure(job_id, kind, payload)
+        return False
+    finally:
+        heartbeat.stopped.set()
+
+    _update(job_id, status='succeeded', progress=1.0, error=None,
+            result=json.dumps(result, default=str), finished_at=datetime.utcnow())
+    logger.info(f"Job {job_id} ({kind}) finished in {time.perf_counter() - started:.1f}s")
+    return True
+
+
+def work(worker_id, stop=None, poll_interval=JOB_POLL_INTERVAL, drain=False):
+    """
+    Claim and run jobs until ``stop`` is set (or, with ``drain``, until idle).
+
+    Must run inside an app context.
+
+    Returns:
+        int: Number of jobs run
+    """
+    stop = stop or threading.Event()
+    count = 0
+    while not stop.is_set():
+        try:
+            job_id = claim_job(worker_id)
+            if job_id is None:
+                if drain:
+                    break
+                stop.wait(poll_interval)
+                continue
+            run_job(job_id)
+            count += 1
+        except Exception as e:
+            # e.g. the database went away; the job's heartbeat lapses and it is retried
+            db.session.rollback()
+            logger.exception(f"Worker {worker_id} loop failed: {str(e)}")
+            if drain:
+                raise
+            stop.wait(poll_interval)
+    return count
+
+
+# ─── Handlers ────────────────────────────────────────────────────────────────
+
+@handler('reindex')
+def reindex_job(payload, progress):
+    """
+    Sync stored embeddings; payload: full (bool), export (path), dtype.
+    """
+    import nlp_search
+
+    if not nlp_search.encoder_ready():
+        raise RuntimeError("No embedding model or service available")
+    encoded = nlp_search.sync_embeddings(
+        progress=lambda done, total: progress(done / total if total else 1.0, f"{done}/{total} rows embedded"),
+        force=bool(payload.get('full'))
+    )
+    result = {'encoded': encoded}
+    if payload.get('export'):
+        result['exported'] = nlp_search.export_embeddings(payload['export'], dtype=payload.get('dtype', 'int8'))
+    return result
+
+
+@handler('create_survey')
+def create_survey_job(payload, progress):
+    """
+    Create a survey from a POST /api/surveys body with set-based inserts.
+
+    Searching processes see the new survey through the corpus generation;
+    its embeddings are synced in the background of this worker.
+    """
+    from bulk_import import import_survey
+    import nlp_search
+
+    questions = [
+        {
+            'question_number': q.get('question_number', ''),
+            'text': q.get('text', ''),
+            'options': list(q.get('options', []))
+        }
+        for q in payload.get('questions', [])
+    ]
+    stats = import_survey(payload.get('name', 'Unnamed Survey'), questions, action="CREATE")
+    nlp_search.request_sync()
+    return stats
+
+
+def _remove_upload(payload):
+    if os.path.exists(payload['path']):
+        os.remove(payload['path'])
+
+
+@handler('import_survey', on_failure=_remove_upload)
+def import_survey_job(payload, progress):
+    """
+    Import an uploaded file saved under JOB_UPLOAD_DIR; payload: path, format, name, batch_size.
+
+    The file is removed once the import succeeds or has failed for good.
+    """
+    from bulk_import import DEFAULT_BATCH_SIZE, ImportFormatError, import_survey, read_questions
+    import nlp_search
+
+    path = payload['path']
+    try:
+        with open(path, 'rb') as stream:
+            file_name, questions = read_questions(stream, payload['format'])
+            stats = import_survey(payload.get('name') or file_name or 'Unnamed Survey', questions,
+                                  batch_size=payload.get('batch_size') or DEFAULT_BATCH_SIZE)
+    except ImportFormatError as e:
+        raise JobFailed(str(e))
+    os.remove(path)
+    nlp_search.request_sync()
+    return stats
+
+
+@handler('compare_surveys')
+def compare_surveys_job(payload, progress):
+    """
+    Question-level diff of two surveys; payload: survey1_id, survey2_id.
+    """
+    from models import Survey
+    from survey_compare import compare_surveys
+
+    survey1 = db.session.get(Survey, payload['survey1_id'])
+    survey2 = db.session.get(Survey, payload['survey2_id'])
+    if survey1 is None or survey2 is None:
+        raise JobFailed("Survey not found")
+    return compare_surveys(survey1, survey2)
+
+
+@handler('cluster_questions')
+def cluster_questions_job(payload, progress):
+    """
+    Recompute near-duplicate question clusters; payload: full (bool).
+    """
+    from question_clusters import cluster_questions
+
+    return cluster_questions(full=bool(payload.get('full')))
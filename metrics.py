@@ -0,0 +1,415 @@
+# metrics.py
+"""
+In-process metrics in the Prometheus text format, plus an opt-in sampling
+profiler for slow requests.
+
+``init_app(app)`` instruments every request:
+
+    http_request_duration_seconds   latency per route, method and status
+    http_request_db_queries         SQL statements per request, per route
+    http_request_db_seconds         time spent in SQL per request, per route
+    db_query_duration_seconds       every SQL statement (SQLAlchemy events)
+    json_encode_seconds             time spent serializing JSON responses
+
+Other modules record into the same registry: nlp_search observes
+embedding batch sizes, inference time and model load time, and caches
+registered with ``register_cache`` are reported as hit/miss/eviction
+counters. ``GET /metrics`` renders everything.
+
+Metrics are per process. Under a multi-process server each worker keeps
+its own registry, so scrape the workers individually.
+
+With PROFILE_SLOW_MS set, a sampler thread records the Python stack of
+every in-flight request each PROFILE_INTERVAL_MS. Requests slower than the
+threshold are written to PROFILE_DIR in the collapsed-stack format read by
+flamegraph.pl and speedscope.
+"""
+
+import bisect
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from datetime import datetime
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from fastjson import FastJSONProvider
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.getcwd(), "instance", "profiles"))
+
+# Prometheus client defaults, seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a running total kept elsewhere (e.g. a cache's hit counter)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self.set_total(value, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collect):
+        """
+        Register ``collect()``, called at scrape time to refresh gauges and counters.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {str(e)}")
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+REQUEST_DURATION = histogram(
+    'http_request_duration_seconds', 'Request latency.', ('route', 'method', 'status'))
+REQUEST_QUERIES = histogram(
+    'http_request_db_queries', 'SQL statements executed per request.', ('route',), COUNT_BUCKETS)
+REQUEST_DB_SECONDS = histogram(
+    'http_request_db_seconds', 'Time spent in SQL per request.', ('route',))
+QUERY_DURATION = histogram('db_query_duration_seconds', 'Duration of each SQL statement.')
+JSON_SECONDS = histogram('json_encode_seconds', 'Time spent serializing JSON responses.')
+EMBEDDING_BATCH_SIZE = histogram(
+    'embedding_batch_size', 'Texts per embedding call.', ('source',), BATCH_BUCKETS)
+EMBEDDING_SECONDS = histogram(
+    'embedding_inference_seconds', 'Time per embedding call.', ('source',))
+MODEL_LOAD_SECONDS = gauge('nlp_model_load_seconds', 'Time the embedding model took to load.')
+SLOW_PROFILES = counter(
+    'profiler_slow_requests_total', 'Slow requests whose stacks were written.', ('route',))
+
+CACHE_HITS = counter('cache_hits_total', 'Cache lookups that found a live entry.', ('cache',))
+CACHE_MISSES = counter('cache_misses_total', 'Cache lookups that missed.', ('cache',))
+CACHE_EVICTIONS = counter('cache_evictions_total', 'Entries evicted to stay under maxsize.', ('cache',))
+CACHE_SIZE = gauge('cache_entries', 'Entries currently cached.', ('cache',))
+
+_caches = {}
+
+
+def register_cache(name, cache):
+    """
+    Report a ``cache.TTLCache`` under ``cache="name"``.
+    """
+    _caches[name] = cache
+
+
+def _collect_caches():
+    for name, cache in _caches.items():
+        stats = cache.stats()
+        CACHE_HITS.set_total(stats['hits'], cache=name)
+        CACHE_MISSES.set_total(stats['misses'], cache=name)
+        CACHE_EVICTIONS.set_total(stats['evictions'], cache=name)
+        CACHE_SIZE.set(stats['size'], cache=name)
+
+
+REGISTRY.add_collector(_collect_caches)
+
+
+def observe_embedding(source, batch_size, seconds):
+    EMBEDDING_BATCH_SIZE.observe(batch_size, source=source)
+    EMBEDDING_SECONDS.observe(seconds, source=source)
+
+
+# ─── SQL timing ──────────────────────────────────────────────────────────────
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    QUERY_DURATION.observe(elapsed)
+    if has_request_context():
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+
+
+# ─── JSON timing ─────────────────────────────────────────────────────────────
+
+class TimedJSONProvider(FastJSONProvider):
+    """
+    The app's JSON provider, timing each encode into json_encode_seconds.
+    """
+
+    def encode(self, obj):
+        started = time.perf_counter()
+        try:
+            return super().encode(obj)
+        finally:
+            JSON_SECONDS.observe(time.perf_counter() - started)
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            JSON_SECONDS.observe(time.perf_counter() - started)
+
+
+# ─── Sampling profiler ───────────────────────────────────────────────────────
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class SamplingProfiler(threading.Thread):
+    """
+    Samples the stacks of registered threads every ``interval`` seconds.
+    """
+
+    def __init__(self, interval):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self._active = {}   # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def begin(self, thread_id):
+        with self._lock:
+            self._active[thread_id] = StackCounter()
+
+    def end(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self._active.items():
+                    frame = frames.get(thread_id)
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    if labels:
+                        stacks[';'.join(reversed(labels))] += 1
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    """
+    The profiler for this process, started on first use (None when disabled).
+    """
+    global _profiler
+    if PROFILE_SLOW_MS <= 0:
+        return None
+    with _profiler_lock:
+        if _profiler is None or _profiler.pid != os.getpid():
+            _profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000.0)
+            _profiler.start()
+        return _profiler
+
+
+def write_profile(route, method, elapsed_ms, stacks):
+    """
+    Write collapsed stacks ("frame;frame;frame count" per line) for one request.
+
+    Returns:
+        str: Path of the written file
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    path = os.path.join(PROFILE_DIR, f'{stamp}-{method}-{slug}-{elapsed_ms:.0f}ms.folded')
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
+
+
+# ─── Flask wiring ────────────────────────────────────────────────────────────
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.begin(threading.get_ident())
+
+
+def _after_request(response):
+    from db import query_count
+
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = _route()
+    REQUEST_DURATION.observe(elapsed, route=route, method=request.method, status=response.status_code)
+    REQUEST_QUERIES.observe(query_count(), route=route)
+    REQUEST_DB_SECONDS.observe(g.get('sql_seconds', 0.0), route=route)
+
+    profiler = _profiler if PROFILE_SLOW_MS > 0 else None
+    if profiler is not None:
+        stacks = profiler.end(threading.get_ident())
+        elapsed_ms = elapsed * 1000
+        if stacks and elapsed_ms >= PROFILE_SLOW_MS:
+            try:
+                path = write_profile(route, request.method, elapsed_ms, stacks)
+                SLOW_PROFILES.inc(route=route)
+                logger.info(f"Slow request {request.method} {request.path} ({elapsed_ms:.0f}ms): {path}")
+            except OSError as e:
+                logger.warning(f"Could not write profile: {str(e)}")
+    return response
+
+
+def metrics_response():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def init_app(app):
+    """
+    Instrument ``app`` and serve the registry at ``GET /metrics``.
+    """
+    app.json = TimedJSONProvider(app)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_response)
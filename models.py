@@ -13,7 +13,8 @@ class Survey(db.Model):
     questions = db.relationship(
         'Question',
         backref='survey',
-        cascade='all, delete-orphan'
+        cascade='all, delete-orphan',
+        order_by='Question.id'
     )
 
     def __repr__(self):
@@ -34,7 +35,8 @@ class Question(db.Model):
     options = db.relationship(
         'Option',
         backref='question',
-        cascade='all, delete-orphan'
+        cascade='all, delete-orphan',
+        order_by='Option.id'
     )
 
     def __repr__(self):
@@ -64,5 +66,133 @@ class AuditLog(db.Model):
     details     = db.Column(db.Text)
     timestamp   = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # created on existing databases by audit.ensure_audit_indexes()
+    __table_args__ = (
+        db.Index('ix_audit_log_entity', 'entity_type', 'entity_id', 'timestamp'),
+        db.Index('ix_audit_log_timestamp', 'timestamp'),
+    )
+
     def __repr__(self):
         return f'<AuditLog {self.action} {self.entity_type} {self.entity_id}>'
+
+
+class Embedding(db.Model):
+    __tablename__ = 'embedding'
+    id          = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)   # question, option
+    entity_id   = db.Column(db.Integer, nullable=False)
+    survey_id   = db.Column(db.Integer, index=True)          # survey of the question/option when embedded
+    text_hash   = db.Column(db.String(40), nullable=False)   # sha1 of the embedded text
+    model_name  = db.Column(db.String(255), nullable=False)
+    vector      = db.Column(db.LargeBinary, nullable=False)  # float32 bytes
+    generation  = db.Column(db.BigInteger, nullable=False, default=0, index=True)  # corpus generation of the write
+
+    __table_args__ = (
+        db.UniqueConstraint('entity_type', 'entity_id', name='uq_embedding_entity'),
+    )
+
+    def __repr__(self):
+        return f'<Embedding {self.entity_type} {self.entity_id}>'
+
+
+class EmbeddingRemoval(db.Model):
+    __tablename__ = 'embedding_removal'
+    id          = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)
+    entity_id   = db.Column(db.Integer, nullable=False)
+    generation  = db.Column(db.BigInteger, nullable=False, index=True)  # corpus generation of the delete
+    created_at  = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<EmbeddingRemoval {self.entity_type} {self.entity_id}>'
+
+
+class CorpusGeneration(db.Model):
+    __tablename__ = 'corpus_generation'
+    id    = db.Column(db.Integer, primary_key=True)                  # single row, id 1
+    value = db.Column(db.BigInteger, nullable=False, default=0)     # bumped by every corpus write
+    synced = db.Column(db.BigInteger, nullable=False, default=0)    # last generation embeddings were synced to
+    sync_owner = db.Column(db.String(100))                          # process holding the sync lease
+    sync_lease_until = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<CorpusGeneration {self.value}>'
+
+
+class CorpusChange(db.Model):
+    __tablename__ = 'corpus_change'
+    id         = db.Column(db.Integer, primary_key=True)
+    survey_id  = db.Column(db.Integer, nullable=False)              # survey whose questions/options changed
+    generation = db.Column(db.BigInteger, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<CorpusChange {self.survey_id} @ {self.generation}>'
+
+
+class QuestionCluster(db.Model):
+    __tablename__ = 'question_cluster'
+    question_id = db.Column(db.Integer, primary_key=True)
+    cluster_id  = db.Column(db.Integer, nullable=False, index=True)  # smallest question id in the cluster
+    text_hash   = db.Column(db.String(40), nullable=False)          # sha1 of the clustered text
+    updated_at  = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<QuestionCluster {self.question_id} -> {self.cluster_id}>'
+
+
+class SurveySnapshot(db.Model):
+    __tablename__ = 'survey_snapshot'
+    survey_id = db.Column(
+        db.Integer,
+        db.ForeignKey('survey.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    version   = db.Column(db.DateTime, nullable=False)     # survey updated_at/created_at it was built from
+    body      = db.Column(db.LargeBinary, nullable=False)  # serialized GET /api/surveys/<id> JSON
+
+    def __repr__(self):
+        return f'<SurveySnapshot {self.survey_id} @ {self.version}>'
+
+
+class SurveyVersion(db.Model):
+    __tablename__ = 'survey_version'
+    id          = db.Column(db.Integer, primary_key=True)
+    survey_id   = db.Column(
+        db.Integer,
+        db.ForeignKey('survey.id', ondelete='CASCADE'),
+        nullable=False
+    )
+    version     = db.Column(db.Integer, nullable=False)              # 1, 2, ... per survey
+    is_keyframe = db.Column(db.Boolean, nullable=False, default=False)
+    body        = db.Column(db.LargeBinary, nullable=False)          # zlib JSON: full survey or delta from previous
+    created_at  = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('survey_id', 'version', name='uq_survey_version'),
+    )
+
+    def __repr__(self):
+        return f'<SurveyVersion {self.survey_id} v{self.version}>'
+
+
+class Job(db.Model):
+    __tablename__ = 'job'
+    id           = db.Column(db.Integer, primary_key=True)
+    kind         = db.Column(db.String(50), nullable=False)      # see jobs.HANDLERS
+    payload      = db.Column(db.Text, nullable=False, default='{}')  # JSON arguments
+    status       = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, succeeded, failed
+    attempts     = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    progress     = db.Column(db.Float, nullable=False, default=0.0)  # 0..1
+    message      = db.Column(db.Text)
+    result       = db.Column(db.Text)                            # JSON, once succeeded
+    error        = db.Column(db.Text)
+    worker       = db.Column(db.String(100))
+    run_after    = db.Column(db.DateTime, default=datetime.utcnow)  # retry backoff
+    created_at   = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at   = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at  = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
@@ -0,0 +1,151 @@
+# nlp_backends.py
+"""
+Alternative CPU inference backends for the sentence-embedding model.
+
+Every backend is a callable with the same signature as the Hugging Face
+model (``backend(**encoded_input)[0]`` is the token embedding tensor), so
+``nlp_search.mean_pooling`` works unchanged:
+
+    torch       the original float32 model
+    torch-int8  dynamic int8 quantization of every Linear layer
+    onnx        ONNX Runtime on CPU, exported once and cached on disk
+
+Only torch and transformers are needed for the first two; onnx also needs
+``onnxruntime``. Callers are expected to check the backend against the
+float32 model with ``verify_backend`` before switching to it.
+"""
+
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'torch-int8', 'onnx')
+
+# Survey-like sentences used to check a backend against the float32 model
+CALIBRATION_TEXTS = [
+    "How satisfied are you with our service overall?",
+    "Very dissatisfied",
+    "What is your age?",
+    "25-34",
+    "Which of the following best describes your household income?",
+    "Would you recommend us to a friend or colleague?",
+    "Prefer not to say",
+    "How many times did you visit the store in the last month?",
+]
+
+
+def quantize_int8(model):
+    """
+    Return an int8 dynamically quantized copy of ``model``'s Linear layers.
+    """
+    import torch
+
+    # fbgemm is x86-only; ARM builds ship qnnpack instead
+    engines = torch.backends.quantized.supported_engines
+    if 'fbgemm' not in engines and 'qnnpack' in engines:
+        torch.backends.quantized.engine = 'qnnpack'
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxModel:
+    """
+    ONNX Runtime session wrapped to look like the Hugging Face model.
+    """
+
+    def __init__(self, path, threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, **encoded_input):
+        import torch
+
+        feeds = {
+            name: tensor.numpy().astype(np.int64)
+            for name, tensor in encoded_input.items()
+            if name in self.input_names
+        }
+        last_hidden_state, = self.session.run(['last_hidden_state'], feeds)
+        return (torch.from_numpy(last_hidden_state),)
+
+
+def export_onnx(model, tokenizer, path):
+    """
+    Export ``model`` to ONNX at ``path`` with dynamic batch and sequence axes.
+    """
+    import torch
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    sample = tokenizer(CALIBRATION_TEXTS[:2], padding=True, truncation=True, return_tensors='pt')
+    # Graph inputs follow the order of the model's forward() signature
+    input_names = [
+        name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample
+    ]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    tmp_path = path + '.tmp'
+    with torch.no_grad():
+        # A trailing dict in args is passed to forward() as keyword arguments
+        torch.onnx.export(
+            model,
+            ({name: sample[name] for name in input_names},),
+            tmp_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    os.replace(tmp_path, path)
+    logger.info(f"Exported ONNX model to {path}")
+
+
+def build_backend(name, model, tokenizer, onnx_path=None, threads=None):
+    """
+    Build the named backend from a loaded float32 ``model``.
+
+    Raises:
+        ValueError: For an unknown backend name
+        ImportError: If the backend's optional dependency is missing
+    """
+    if name == 'torch':
+        return model
+    if name == 'torch-int8':
+        return quantize_int8(model)
+    if name == 'onnx':
+        if not os.path.exists(onnx_path):
+            export_onnx(model, tokenizer, onnx_path)
+        return OnnxModel(onnx_path, threads=threads)
+    raise ValueError(f"Unknown NLP backend {name!r}; expected one of {', '.join(BACKENDS)}")
+
+
+def verify_backend(reference, candidate, tolerance):
+    """
+    Check that ``candidate`` embeds the calibration texts like ``reference``.
+
+    Both arguments map a list of texts to an embedding matrix. The backend
+    passes if every row's cosine similarity to the reference is at least
+    ``1 - tolerance``.
+
+    Returns:
+        float: The worst cosine similarity, so callers can log it
+    """
+    expected = np.asarray(reference(CALIBRATION_TEXTS), dtype=np.float32)
+    actual = np.asarray(candidate(CALIBRATION_TEXTS), dtype=np.float32)
+    cosine = np.sum(expected * actual, axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    )
+    worst = float(cosine.min())
+    if worst < 1.0 - tolerance:
+        raise ValueError(f"backend drifts from float32 model (min cosine {worst:.4f})")
+    return worst
@@ -1,50 +1,256 @@
+import hashlib
+import heapq
+import importlib.util
 import logging
+import os
+import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import numpy as np
-from models import Survey, Question, Option
+from sqlalchemy import bindparam, func
+from db import db
+from models import Survey, Question, Option, Embedding, EmbeddingRemoval
+import corpus_generation
+from ann_index import IVFIndex, kmeans
+from cache import TTLCache
+from singleflight import SingleFlight
+import metrics
+from vector_file import VectorFile, VectorFileWriter, key_codes
+import fulltext
 from flask import current_app
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Flag to track if NLP dependencies are available
-nlp_available = False
-
-# Try to import NLP dependencies
-try:
-    from transformers import AutoModel, AutoTokenizer
-    import torch
-    nlp_available = True
-    logger.info("Successfully imported NLP dependencies")
-except ImportError:
+# Flag to track if NLP dependencies are available. transformers and torch
+# are only imported when the model is first needed (see load_nlp_dependencies),
+# so importing this module stays cheap.
+nlp_available = (
+    importlib.util.find_spec("transformers") is not None
+    and importlib.util.find_spec("torch") is not None
+)
+if not nlp_available:
     logger.warning("NLP dependencies not available. Falling back to basic search.")
-    nlp_available = False
+
+AutoModel = AutoTokenizer = torch = None
+
+# Model used for all stored and query embeddings
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+_DEFAULT_MODEL_NAME = MODEL_NAME
+
+# In-process replacement for the model, set with use_encoder()
+_encoder_override = None
+
+# Texts per forward pass when embedding in bulk
+DEFAULT_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+
+# Inference backend (torch, torch-int8 or onnx; see nlp_backends.py) and the
+# largest allowed drift from the float32 model, as 1 - min cosine similarity
+NLP_BACKEND = os.environ.get("NLP_BACKEND", "torch")
+NLP_BACKEND_TOLERANCE = float(os.environ.get("NLP_BACKEND_TOLERANCE", "0.01"))
+ONNX_MODEL_PATH = os.environ.get(
+    "ONNX_MODEL_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "survey_tracker", "all-MiniLM-L6-v2.onnx")
+)
 
 # Global variables to store model and tokenizer
 model = None
 tokenizer = None
+_model_lock = threading.Lock()
+
+# Optional out-of-process encoder (see embedding_service.py). When the socket
+# is unreachable we retry after EMBEDDING_SERVICE_RETRY seconds and encode
+# in-process meanwhile.
+EMBEDDING_SOCKET = os.environ.get("EMBEDDING_SOCKET", "")
+EMBEDDING_SERVICE_RETRY = float(os.environ.get("EMBEDDING_SERVICE_RETRY", "30"))
+_service_client = None
+_service_down_until = 0.0
+
+# Default cap on the number of search results
+DEFAULT_TOP_K = int(os.environ.get("SEARCH_TOP_K", "100"))
+
+# Hybrid search: reciprocal-rank fusion constant, weight of the vector
+# ranking against each lexical ranking, and the weakest vector hit fused
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", "60"))
+HYBRID_VECTOR_WEIGHT = float(os.environ.get("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_MIN_SIMILARITY = float(os.environ.get("HYBRID_MIN_SIMILARITY", "0.3"))
+
+# Queries that look like a question code ("Q12", "S3b", "12.1") are looked
+# up by question_number before anything else
+QUESTION_CODE = re.compile(r'^[A-Za-z]{0,4}\d+[A-Za-z0-9_.-]*$')
+
+SEARCH_MODES = ('keyword', 'semantic', 'hybrid')
+
+# ANN index tuning: lists probed per query, and corpus size before partitioning
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "8"))
+ANN_MIN_TRAIN_SIZE = int(os.environ.get("ANN_MIN_TRAIN_SIZE", "4096"))
+
+# Query text -> embedding, and (query, use_nlp, filters) -> result list.
+# Result entries are dropped whenever the corpus generation changes, which
+# also catches writes made by other processes (workers, imports).
+query_embedding_cache = TTLCache(
+    maxsize=int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "2048")),
+    ttl=int(os.environ.get("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+)
+search_result_cache = TTLCache(
+    maxsize=int(os.environ.get("SEARCH_RESULT_CACHE_SIZE", "512")),
+    ttl=int(os.environ.get("SEARCH_RESULT_CACHE_TTL", "300"))
+)
+_result_cache_generation = None
+metrics.register_cache('query_embedding', query_embedding_cache)
+metrics.register_cache('search_result', search_result_cache)
+
+# Identical searches running at the same time are computed once. With
+# SINGLEFLIGHT_DIR set, worker processes on one host share the work too.
+search_flight = SingleFlight(
+    'search',
+    directory=os.environ.get("SINGLEFLIGHT_DIR") or None,
+    wait=float(os.environ.get("SINGLEFLIGHT_WAIT", "30"))
+)
+
+# Optional memory-mapped embedding file written by `reindex.py --export`;
+# shared through the page cache by every worker.
+EMBEDDING_FILE = os.environ.get("EMBEDDING_FILE", "")
+
+# Searchable corpus (mapped file plus in-memory ANN index), updated
+# incrementally whenever the corpus generation changes. Searches read it
+# without a lock, so it is never changed in place: updates build a new dict
+# around a copy of the index and publish it with one assignment.
+_corpus = None
+_corpus_lock = threading.Lock()
+_retrain_running = False
+
+# Removed embeddings are remembered this long (seconds) for incremental
+# index refreshes; a process whose index is older rebuilds it instead
+EMBEDDING_REMOVAL_RETENTION = float(os.environ.get("EMBEDDING_REMOVAL_RETENTION", "86400"))
+
+# Embeddings are synced off the request path by one background thread per
+# process; requests made while it runs are folded into one more pass. Across
+# processes a lease on the generation row (held for EMBEDDING_SYNC_LEASE
+# seconds, renewed as it goes) lets one sync at a time; the others poll
+# every EMBEDDING_SYNC_POLL seconds until it is free.
+EMBEDDING_SYNC_LEASE = float(os.environ.get("EMBEDDING_SYNC_LEASE", "300"))
+EMBEDDING_SYNC_POLL = float(os.environ.get("EMBEDDING_SYNC_POLL", "1.0"))
+_sync_lock = threading.Lock()
+_sync_wanted = False
+_sync_running = False
+
+def load_nlp_dependencies():
+    """
+    Import transformers and torch on first use.
+
+    Returns:
+        bool: Whether the NLP dependencies could be imported
+    """
+    global AutoModel, AutoTokenizer, torch, nlp_available
+
+    if torch is not None:
+        return True
+    try:
+        from transformers import AutoModel, AutoTokenizer
+        import torch
+        logger.info("Successfully imported NLP dependencies")
+        return True
+    except ImportError:
+        logger.warning("NLP dependencies not available. Falling back to basic search.")
+        nlp_available = False
+        return False
 
 def initialize_model():
     """
     Initialize the model and tokenizer for sentence embeddings.
     Uses a small, efficient model from Hugging Face for sentence similarity.
+
+    When NLP_BACKEND selects a faster backend it is checked against the
+    float32 model first, and the float32 model is kept if it drifts by more
+    than NLP_BACKEND_TOLERANCE.
     """
     global model, tokenizer
     
-    try:
-        logger.info("Initializing NLP model for semantic search...")
-        # Use a smaller, efficient model for sentence embeddings
-        model_name = "sentence-transformers/all-MiniLM-L6-v2"
-        
-        # Load tokenizer and model
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModel.from_pretrained(model_name)
-        
-        logger.info(f"Successfully loaded model: {model_name}")
+    with _model_lock:
+        if model is not None and tokenizer is not None:
+            return True
+        if not load_nlp_dependencies():
+            return False
+
+        try:
+            logger.info("Initializing NLP model for semantic search...")
+            load_started = time.perf_counter()
+            # Use a smaller, efficient model for sentence embeddings
+            model_name = MODEL_NAME
+            
+            # Load tokenizer and model
+            loaded_tokenizer = AutoTokenizer.from_pretrained(model_name)
+            loaded_model = AutoModel.from_pretrained(model_name)
+            loaded_model.eval()
+            
+            logger.info(f"Successfully loaded model: {model_name}")
+        except Exception as e:
+            logger.error(f"Failed to initialize NLP model: {str(e)}")
+            return False
+
+        if NLP_BACKEND != 'torch':
+            loaded_model = _select_backend(loaded_model, loaded_tokenizer)
+
+        tokenizer = loaded_tokenizer
+        model = loaded_model
+        metrics.MODEL_LOAD_SECONDS.set(time.perf_counter() - load_started)
         return True
+
+def _select_backend(reference_model, reference_tokenizer):
+    """
+    Build the configured backend, falling back to ``reference_model`` if it
+    cannot be built or does not match within NLP_BACKEND_TOLERANCE.
+    """
+    import nlp_backends
+
+    try:
+        backend = nlp_backends.build_backend(
+            NLP_BACKEND, reference_model, reference_tokenizer,
+            onnx_path=ONNX_MODEL_PATH, threads=torch.get_num_threads()
+        )
+        worst = nlp_backends.verify_backend(
+            lambda texts: _encode_with(reference_model, reference_tokenizer, texts, DEFAULT_BATCH_SIZE),
+            lambda texts: _encode_with(backend, reference_tokenizer, texts, DEFAULT_BATCH_SIZE),
+            NLP_BACKEND_TOLERANCE
+        )
     except Exception as e:
-        logger.error(f"Failed to initialize NLP model: {str(e)}")
-        return False
+        logger.error(f"NLP backend {NLP_BACKEND!r} unavailable, using float32 torch: {str(e)}")
+        return reference_model
+
+    logger.info(f"Using NLP backend {NLP_BACKEND!r} (min cosine vs float32: {worst:.4f})")
+    return backend
+
+def warm_up(app, background=True):
+    """
+    Load the model and the embedding index ahead of the first search.
+
+    Args:
+        app: Flask app whose database holds the corpus
+        background (bool): Run in a daemon thread and return it immediately
+    """
+    def run():
+        with app.app_context():
+            try:
+                if encoder_ready():
+                    sync_embeddings()
+                    get_corpus()
+                    train_index()
+                    logger.info("NLP warm-up complete")
+            except Exception as e:
+                logger.error(f"NLP warm-up failed: {str(e)}")
+                db.session.rollback()
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="nlp-warm-up", daemon=True)
+    thread.start()
+    return thread
 
 def mean_pooling(model_output, attention_mask):
     """
@@ -62,26 +268,153 @@ def mean_pooling(model_output, attention_mask):
     
     return sum_embeddings / sum_mask
 
+def get_service_client():
+    """
+    Return a client for the shared embedding service, or None if it is not
+    configured or was recently unreachable.
+    """
+    global _service_client
+
+    if not EMBEDDING_SOCKET or time.monotonic() < _service_down_until:
+        return None
+    if _service_client is None:
+        from embedding_service import EmbeddingClient
+        _service_client = EmbeddingClient(EMBEDDING_SOCKET)
+    return _service_client
+
+def _mark_service_down(error):
+    global _service_down_until
+    logger.warning(f"Embedding service unavailable, encoding in-process: {str(error)}")
+    _service_down_until = time.monotonic() + EMBEDDING_SERVICE_RETRY
+
+def use_encoder(encode, name=None):
+    """
+    Embed every text with ``encode(texts) -> float32 matrix`` instead of the model.
+
+    Lets benchmarks and development setups run semantic search without
+    downloading a model. Vectors are stored under ``name`` so they never mix
+    with the model's; ``use_encoder(None)`` switches back to the model.
+    """
+    global _encoder_override, MODEL_NAME, _corpus
+
+    with _corpus_lock:
+        _encoder_override = encode
+        if encode is None:
+            MODEL_NAME = _DEFAULT_MODEL_NAME
+        else:
+            MODEL_NAME = name or f"custom:{getattr(encode, '__name__', type(encode).__name__)}"
+        _corpus = None
+    query_embedding_cache.clear()
+    search_result_cache.clear()
+
+def encoder_ready():
+    """
+    Make sure texts can be encoded, via the shared service or a local model.
+
+    A configured service counts as available until a real encode call to it
+    fails (see ``encode_batch``), so this costs no round trip.
+
+    Returns:
+        bool: False if neither the service nor a local model is available
+    """
+    if _encoder_override is not None:
+        return True
+    if get_service_client() is not None:
+        return True
+
+    if not nlp_available:
+        return False
+    return initialize_model()
+
+def encode_batch(texts, batch_size=None):
+    """
+    Get embeddings for many texts, from the shared embedding service when it
+    is reachable and from the in-process model otherwise.
+    """
+    if _encoder_override is not None:
+        started = time.perf_counter()
+        embeddings = np.asarray(_encoder_override(texts), dtype=np.float32)
+        metrics.observe_embedding('override', len(texts), time.perf_counter() - started)
+        return embeddings
+
+    client = get_service_client()
+    if client is not None and texts:
+        try:
+            started = time.perf_counter()
+            embeddings = client.encode(texts)
+            metrics.observe_embedding('service', len(texts), time.perf_counter() - started)
+            return embeddings
+        except OSError as e:
+            _mark_service_down(e)
+
+    if not nlp_available or not initialize_model():
+        raise RuntimeError("No embedding model available")
+    started = time.perf_counter()
+    embeddings = encode_batch_local(texts, batch_size=batch_size)
+    metrics.observe_embedding('local', len(texts), time.perf_counter() - started)
+    return embeddings
+
+def encode_batch_local(texts, batch_size=None):
+    """
+    Get embeddings for many texts with batched forward passes.
+
+    Texts are sorted by length so each batch pads to a similar size, then
+    mean pooling runs on the whole batch at once.
+
+    Args:
+        texts (list): Strings to embed
+        batch_size (int): Texts per forward pass (defaults to EMBEDDING_BATCH_SIZE)
+
+    Returns:
+        np.ndarray: float32 matrix with one row per input text, in input order
+    """
+    if batch_size is None:
+        batch_size = DEFAULT_BATCH_SIZE
+    return _encode_with(model, tokenizer, texts, batch_size)
+
+def _encode_with(encoder, encoder_tokenizer, texts, batch_size):
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    embeddings = None
+
+    for start in range(0, len(order), batch_size):
+        batch_ids = order[start:start + batch_size]
+        encoded_input = encoder_tokenizer(
+            [texts[i] for i in batch_ids],
+            padding=True, truncation=True, return_tensors='pt'
+        )
+        with torch.no_grad():
+            model_output = encoder(**encoded_input)
+        batch = mean_pooling(model_output, encoded_input['attention_mask']).numpy()
+
+        if embeddings is None:
+            embeddings = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+        embeddings[batch_ids] = batch
+
+    if embeddings is None:
+        return np.zeros((0, 0), dtype=np.float32)
+    return embeddings
+
 def get_embedding(text):
     """
     Get embedding for a single text string.
     """
     try:
-        # Tokenize the text
-        encoded_input = tokenizer(text, padding=True, truncation=True, return_tensors='pt')
-        
-        # Get model output
-        with torch.no_grad():
-            model_output = model(**encoded_input)
-        
-        # Apply mean pooling to get sentence embedding
-        embedding = mean_pooling(model_output, encoded_input['attention_mask'])
-        
-        return embedding.squeeze().numpy()
+        return encode_batch([text])[0]
     except Exception as e:
         logger.error(f"Error generating embedding for text: {str(e)}")
         return None
 
+def get_query_embedding(query):
+    """
+    Get the embedding for a search query, reusing recently computed ones.
+    """
+    embedding = query_embedding_cache.get(query)
+    if embedding is None:
+        embedding = get_embedding(query)
+        if embedding is not None:
+            query_embedding_cache.set(query, embedding)
+    return embedding
+
 def compute_similarity(query_embedding, text_embedding):
     """
     Compute cosine similarity between query embedding and text embedding.
@@ -98,147 +431,882 @@ def compute_similarity(query_embedding, text_embedding):
     similarity = np.dot(query_embedding, text_embedding) / (query_norm * text_norm)
     return similarity
 
-def semantic_search(query, threshold=0.6):
+def text_hash(text):
+    """
+    Stable fingerprint of a text, used to detect stale stored embeddings.
+    """
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def sync_embeddings(batch_size=None, chunk_size=1024, progress=None, force=False):
+    """
+    Bring the embedding table in line with the question and option tables.
+
+    Only surveys logged as changed since the last sync are compared (see
+    ``corpus_generation.bump``); the first sync, a forced one, and one that
+    finds embeddings without a survey id compare everything. Only rows that are new, whose text changed, or that were
+    embedded with a different model are encoded. Embeddings of deleted rows
+    are removed and logged in ``embedding_removal``. Work is committed every
+    ``chunk_size`` rows, so an interrupted run picks up where it stopped.
+    Every commit bumps the corpus generation and stamps the rows it wrote
+    with it, so searching processes read only what changed (see
+    ``refresh_index``).
+
+    One process syncs at a time; others wait for its lease (renewed every
+    chunk, EMBEDDING_SYNC_LEASE seconds) to be released or to expire.
+
+    Args:
+        batch_size (int): Texts per forward pass
+        chunk_size (int): Rows encoded and committed per checkpoint
+        progress (callable): Called as ``progress(done, total)`` after each chunk
+        force (bool): Re-encode every row, e.g. after a model upgrade
+
+    Returns:
+        int: Number of rows that were (re-)encoded
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    while True:
+        acquired = corpus_generation.acquire_sync_lease(owner, EMBEDDING_SYNC_LEASE)
+        db.session.commit()
+        if acquired:
+            break
+        time.sleep(EMBEDDING_SYNC_POLL)
+
+    try:
+        return _sync(owner, batch_size, chunk_size, progress, force)
+    finally:
+        db.session.rollback()
+        corpus_generation.release_sync_lease(owner)
+        db.session.commit()
+
+def _sync(owner, batch_size, chunk_size, progress, force):
+    since = corpus_generation.synced()
+    # embeddings stored before they recorded their survey are only found by a full pass
+    unlabelled = db.session.query(Embedding.id).filter(Embedding.survey_id.is_(None)).first() is not None
+    if force or since == 0 or unlabelled:
+        survey_ids = None
+        target = corpus_generation.current()
+    else:
+        survey_ids, target = corpus_generation.changed_surveys(since)
+        if not survey_ids:
+            return 0
+
+    stored = _stored_embeddings(survey_ids)
+    pending, relabel = [], []
+    current = set()
+    for entity_type, entity_id, survey_id, text in _corpus_texts(survey_ids):
+        key = (entity_type, entity_id)
+        current.add(key)
+        digest = text_hash(text)
+        known = stored.get(key)
+        if force or known is None or known[:2] != (digest, MODEL_NAME):
+            pending.append((entity_type, entity_id, survey_id, text, digest))
+        elif known[2] != survey_id:
+            # stored before embeddings recorded their survey
+            relabel.append({'b_type': entity_type, 'b_id': entity_id, 'b_survey': survey_id})
+
+    orphans = [key for key in stored if key not in current]
+    if orphans:
+        generation = corpus_generation.bump()
+        _delete_embeddings(orphans)
+        db.session.execute(EmbeddingRemoval.__table__.insert(), [
+            {'entity_type': entity_type, 'entity_id': entity_id, 'generation': generation}
+            for entity_type, entity_id in orphans
+        ])
+    if relabel:
+        table = Embedding.__table__
+        db.session.execute(table.update().where(
+            table.c.entity_type == bindparam('b_type'), table.c.entity_id == bindparam('b_id')
+        ).values(survey_id=bindparam('b_survey')), relabel)
+    EmbeddingRemoval.query.filter(
+        EmbeddingRemoval.created_at < datetime.utcnow() - timedelta(seconds=EMBEDDING_REMOVAL_RETENTION)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        vectors = encode_batch([text for _, _, _, text, _ in chunk], batch_size=batch_size)
+
+        if not corpus_generation.acquire_sync_lease(owner, EMBEDDING_SYNC_LEASE):
+            raise RuntimeError("Lost the embedding sync lease to another process")
+        generation = corpus_generation.bump()
+        _delete_embeddings([(entity_type, entity_id) for entity_type, entity_id, _, _, _ in chunk])
+        db.session.execute(Embedding.__table__.insert(), [
+            {
+                'entity_type': entity_type,
+                'entity_id': entity_id,
+                'survey_id': survey_id,
+                'text_hash': digest,
+                'model_name': MODEL_NAME,
+                'vector': vector.tobytes(),
+                'generation': generation
+            }
+            for (entity_type, entity_id, survey_id, _, digest), vector in zip(chunk, vectors)
+        ])
+        db.session.commit()
+
+        if progress is not None:
+            progress(start + len(chunk), len(pending))
+
+    corpus_generation.mark_synced(target)
+    db.session.commit()
+    if pending or orphans:
+        logger.info(f"Synced embeddings: {len(pending)} encoded, {len(orphans)} removed")
+    return len(pending)
+
+def _stored_embeddings(survey_ids=None):
+    """
+    ``(entity_type, entity_id) -> (text_hash, model_name, survey_id)`` of
+    stored embeddings, all of them or those of the given surveys.
+    """
+    query = db.session.query(
+        Embedding.entity_type, Embedding.entity_id, Embedding.text_hash, Embedding.model_name, Embedding.survey_id
+    )
+    conditions = [None] if survey_ids is None else _in_chunks(Embedding.survey_id, survey_ids)
+    stored = {}
+    for condition in conditions:
+        rows = query if condition is None else query.filter(condition)
+        for entity_type, entity_id, digest, model_name, survey_id in rows:
+            stored[(entity_type, entity_id)] = (digest, model_name, survey_id)
+    return stored
+
+def _corpus_texts(survey_ids=None):
+    """
+    ``(entity_type, entity_id, survey_id, text)`` of every question and
+    option, or of those in the given surveys.
+    """
+    questions = db.session.query(Question.id, Question.survey_id, Question.text)
+    options = db.session.query(Option.id, Question.survey_id, Option.text).join(Question)
+    conditions = [None] if survey_ids is None else _in_chunks(Question.survey_id, survey_ids)
+    for condition in conditions:
+        for entity_type, query in (('question', questions), ('option', options)):
+            rows = query if condition is None else query.filter(condition)
+            for entity_id, survey_id, text in rows:
+                yield entity_type, entity_id, survey_id, text
+
+def request_sync(app=None):
+    """
+    Sync the embedding table in a background thread of this process.
+
+    Called after survey writes, so new and edited texts are embedded
+    without making the writer or the next search wait for the model.
+    Requests made while a sync runs are coalesced into one more pass.
+
+    Args:
+        app: Flask app to sync for (defaults to the current app)
+    """
+    global _sync_wanted, _sync_running
+
+    if _encoder_override is None and not nlp_available and not EMBEDDING_SOCKET:
+        return
+    app = app or current_app._get_current_object()
+    with _sync_lock:
+        _sync_wanted = True
+        if _sync_running:
+            return
+        _sync_running = True
+    threading.Thread(target=_sync_loop, args=(app,), name="embedding-sync", daemon=True).start()
+
+def _sync_loop(app):
+    global _sync_wanted, _sync_running
+
+    with app.app_context():
+        while True:
+            with _sync_lock:
+                if not _sync_wanted:
+                    _sync_running = False
+                    return
+                _sync_wanted = False
+            try:
+                if encoder_ready():
+                    sync_embeddings()
+            except Exception as e:
+                logger.error(f"Background embedding sync failed: {str(e)}")
+                db.session.rollback()
+
+def _delete_embeddings(keys):
+    """
+    Delete stored embeddings for a list of (entity_type, entity_id) keys.
+    """
+    for entity_type in ('question', 'option'):
+        ids = [entity_id for key_type, entity_id in keys if key_type == entity_type]
+        for start in range(0, len(ids), 500):
+            Embedding.query.filter(
+                Embedding.entity_type == entity_type,
+                Embedding.entity_id.in_(ids[start:start + 500])
+            ).delete(synchronize_session=False)
+
+def refresh_index(corpus, since=None):
+    """
+    Apply stored embedding changes to an in-memory corpus.
+
+    Rows of the mapped base file (if any) stay valid while their text hash
+    still matches the embedding table; everything else lives in the
+    incremental ANN index, whose ``hashes`` map each indexed key to the text
+    hash it was built from.
+
+    With ``since`` (the corpus generation the corpus was last refreshed at)
+    only embeddings written or removed after it are read, so a refresh
+    costs as much as the change. Without it the stored embeddings are
+    matched against the base file in batches, which is how a new corpus
+    is built; only keys the file does not cover are kept in Python.
+    """
+    if since is not None:
+        _apply_changes(corpus, since)
+        return
+
+    base = corpus['base']
+    if base is not None and base.model_name != MODEL_NAME:
+        logger.warning(f"Ignoring {base.path}: its vectors come from {base.model_name or 'an unknown model'}, "
+                       f"not {MODEL_NAME}; re-export it with reindex.py --export")
+        corpus['base'] = base = None
+    index, hashes = corpus['index'], corpus['hashes']
+
+    stored = db.session.query(
+        Embedding.entity_type, Embedding.entity_id, Embedding.text_hash
+    ).filter(Embedding.model_name == MODEL_NAME).execution_options(yield_per=10000)
+    alive = np.zeros(len(base), dtype=bool) if base is not None else None
+    missing = {}
+    batch = []
+    for row in stored:
+        batch.append(row)
+        if len(batch) >= 10000:
+            missing.update(_cover(base, alive, batch))
+            batch = []
+    missing.update(_cover(base, alive, batch))
+    if base is not None:
+        corpus['base_alive'] = alive
+
+    stale = [key for key, digest in hashes.items() if missing.get(key) != digest]
+    index.remove(stale)
+    for key in stale:
+        del hashes[key]
+    missing = {key for key in missing if key not in hashes}
+    if not missing:
+        return
+
+    rows = db.session.query(
+        Embedding.entity_type, Embedding.entity_id, Embedding.text_hash, Embedding.vector
+    ).filter(Embedding.model_name == MODEL_NAME).order_by(
+        Embedding.entity_type.desc(), Embedding.entity_id
+    )
+    if len(missing) < 500:
+        for entity_type in ('question', 'option'):
+            ids = [entity_id for key_type, entity_id in missing if key_type == entity_type]
+            if ids:
+                _add_rows(index, hashes, rows.filter(
+                    Embedding.entity_type == entity_type, Embedding.entity_id.in_(ids)
+                ), missing)
+    else:
+        _add_rows(index, hashes, rows.execution_options(yield_per=10000), missing)
+
+def _cover(base, alive, rows):
+    """
+    Mark base file rows whose stored text hash matches as alive.
+
+    Returns:
+        dict: Key -> text hash of the ``(entity_type, entity_id, text_hash)``
+        rows the file does not cover
+    """
+    if not rows:
+        return {}
+    keys = [(entity_type, entity_id) for entity_type, entity_id, _ in rows]
+    if base is None:
+        return {key: digest for key, (_, _, digest) in zip(keys, rows)}
+    found = base.lookup(key_codes(keys))
+    digests = np.array([digest.encode('ascii') for _, _, digest in rows], dtype=base.index.dtype['text_hash'])
+    covered = found >= 0
+    covered[covered] = base.index['text_hash'][found[covered]] == digests[covered]
+    alive[found[covered]] = True
+    return {key: digest for key, (_, _, digest), hit in zip(keys, rows, covered) if not hit}
+
+def _apply_changes(corpus, since):
+    """
+    Apply embeddings written and removed after generation ``since``.
+    """
+    index, hashes, base = corpus['index'], corpus['hashes'], corpus['base']
+    removed = db.session.query(EmbeddingRemoval.entity_type, EmbeddingRemoval.entity_id).filter(
+        EmbeddingRemoval.generation > since).all()
+    written = db.session.query(
+        Embedding.entity_type, Embedding.entity_id, Embedding.text_hash, Embedding.model_name, Embedding.vector
+    ).filter(Embedding.generation > since).all()
+
+    # drop every touched key first; rows still stored are added back below
+    touched = {(entity_type, entity_id) for entity_type, entity_id in removed}
+    touched.update((row.entity_type, row.entity_id) for row in written)
+    index.remove(touched)
+    for key in touched:
+        hashes.pop(key, None)
+
+    alive = None
+    if base is not None:
+        # searches may be reading the current mask; swap in a new one
+        alive = corpus['base_alive'].copy()
+        for key in touched:
+            row = base.row(key)
+            if row is not None:
+                alive[row] = False
+
+    keys, vectors = [], []
+    for entity_type, entity_id, digest, model_name, vector in written:
+        if model_name != MODEL_NAME:
+            continue
+        key = (entity_type, entity_id)
+        row = base.row(key) if base is not None else None
+        if row is not None and base.index['text_hash'][row].decode('ascii') == digest:
+            alive[row] = True
+            continue
+        keys.append(key)
+        vectors.append(np.frombuffer(vector, dtype=np.float32))
+        hashes[key] = digest
+    if keys:
+        index.add(keys, np.vstack(vectors))
+    if alive is not None:
+        corpus['base_alive'] = alive
+
+def _add_rows(index, hashes, rows, wanted, chunk_size=10000):
+    keys, vectors = [], []
+    for entity_type, entity_id, digest, vector in rows:
+        key = (entity_type, entity_id)
+        if key not in wanted:
+            continue
+        keys.append(key)
+        vectors.append(np.frombuffer(vector, dtype=np.float32))
+        hashes[key] = digest
+        if len(keys) >= chunk_size:
+            index.add(keys, np.vstack(vectors))
+            keys, vectors = [], []
+    if keys:
+        index.add(keys, np.vstack(vectors))
+
+def _embedding_file_version():
+    try:
+        return os.stat(EMBEDDING_FILE).st_mtime_ns if EMBEDDING_FILE else None
+    except OSError:
+        return None
+
+def get_corpus():
+    """
+    Return the searchable corpus: the mapped EMBEDDING_FILE (if configured)
+    plus an in-memory ANN index over stored embeddings it does not cover.
+
+    When the corpus generation moved since the last refresh, only the
+    embeddings written or removed since then are applied, to a copy that
+    replaces the corpus once it is complete; the corpus is
+    rebuilt when the file is replaced or it was not checked for longer than
+    half of EMBEDDING_REMOVAL_RETENTION. Searches never encode the corpus
+    themselves: writers request a background sync (see ``request_sync``),
+    and the first build in a process requests one too, for rows written
+    without one (e.g. by import_surveys.py).
+    """
+    global _corpus
+
+    signature = (corpus_generation.current(), _embedding_file_version())
+    now = time.monotonic()
+    corpus = _corpus
+    if corpus is not None and corpus['signature'] == signature and _recently_checked(corpus, now):
+        corpus['checked_at'] = now
+        return corpus
+
+    with _corpus_lock:
+        corpus = _corpus
+        if corpus is None:
+            request_sync()
+        elif corpus['signature'] == signature and _recently_checked(corpus, now):
+            return corpus
+
+        if corpus is not None and corpus['signature'][1] == signature[1] and _recently_checked(corpus, now):
+            # searches may be reading the current one; change a copy
+            corpus = dict(corpus, index=corpus['index'].copy(), hashes=dict(corpus['hashes']))
+            refresh_index(corpus, since=corpus['signature'][0])
+        else:
+            corpus = {
+                'base': _open_embedding_file() if signature[1] is not None else None,
+                'base_alive': None,
+                'index': IVFIndex(nprobe=ANN_NPROBE, min_train_size=ANN_MIN_TRAIN_SIZE, auto_train=False),
+                'hashes': {},
+                'model_name': MODEL_NAME
+            }
+            refresh_index(corpus)
+            base_size = int(corpus['base_alive'].sum()) if corpus['base'] is not None else 0
+            logger.info(f"Embedding corpus holds {base_size} mapped and {len(corpus['index'])} indexed vectors")
+        corpus['signature'] = signature
+        corpus['checked_at'] = now
+        _corpus = corpus
+        if corpus['index'].needs_training:
+            _request_retrain()
+        return corpus
+
+def _request_retrain():
+    """
+    Partition the corpus index in a background thread (call with _corpus_lock held).
+
+    k-means runs on a sample taken from the published index without the
+    lock; the centroids are then applied to a copy of whatever index is
+    current by then, so searches and refreshes never wait for the fit.
+    """
+    global _retrain_running
+
+    if _retrain_running:
+        return
+    _retrain_running = True
+    threading.Thread(target=_retrain_loop, name="ann-retrain", daemon=True).start()
+
+def _retrain_loop():
+    global _retrain_running
+
+    try:
+        train_index()
+    except Exception as e:
+        logger.error(f"Training the ANN index failed: {str(e)}")
+    finally:
+        with _corpus_lock:
+            _retrain_running = False
+
+def train_index():
+    """
+    Partition the corpus index if it has grown enough, and publish the result.
+
+    Runs in the background after corpus refreshes; call it directly to have
+    a partitioned index before timing searches.
+    """
+    global _corpus
+
+    while True:
+        with _corpus_lock:
+            corpus = _corpus
+            if corpus is None or not corpus['index'].needs_training:
+                return
+            index = corpus['index']
+            sample = index.training_sample()
+        centroids = kmeans(sample[0], sample[1], index.iterations)
+
+        with _corpus_lock:
+            corpus = _corpus
+            if corpus is None or corpus['model_name'] != MODEL_NAME or corpus['index'].dim != centroids.shape[1]:
+                continue
+            index = corpus['index'].copy()
+            index.partition(centroids)
+            _corpus = dict(corpus, index=index)
+
+def _open_embedding_file():
+    try:
+        return VectorFile(EMBEDDING_FILE)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring EMBEDDING_FILE: {str(e)}")
+        return None
+
+def _recently_checked(corpus, now):
+    # removals older than the retention may be gone, so a refresh from
+    # that far back could miss some
+    return now - corpus['checked_at'] < EMBEDDING_REMOVAL_RETENTION / 2
+
+def search_corpus(corpus, query_embedding, top_k, threshold=None, keys=None):
+    """
+    Top-k ``(key, score)`` pairs across the mapped file and the ANN index.
+
+    With ``keys`` only those entries are scored (exactly), e.g. the rows of
+    a few surveys.
+    """
+    hits = corpus['index'].search(query_embedding, top_k=top_k, threshold=threshold, keys=keys)
+    if corpus['base'] is not None:
+        rows = corpus['base'].rows(keys) if keys is not None else None
+        hits += corpus['base'].search(
+            query_embedding, top_k=top_k, threshold=threshold, mask=corpus['base_alive'], rows=rows
+        )
+        hits = heapq.nlargest(top_k, hits, key=lambda hit: hit[1])
+    return hits
+
+def scope_keys(survey_ids):
+    """
+    Corpus keys of every question and option in the given surveys.
+    """
+    keys = {('question', question_id) for question_id, in db.session.query(Question.id).filter(
+        Question.survey_id.in_(survey_ids))}
+    keys.update(('option', option_id) for option_id, in db.session.query(Option.id).join(Question).filter(
+        Question.survey_id.in_(survey_ids)))
+    return keys
+
+def export_embeddings(path, dtype='int8', chunk_size=10000):
+    """
+    Write every stored embedding to a memory-mappable vector file.
+
+    Returns:
+        int: Number of vectors written
+    """
+    rows = db.session.query(
+        Embedding.entity_type, Embedding.entity_id, Embedding.text_hash, Embedding.vector
+    ).filter(Embedding.model_name == MODEL_NAME).order_by(
+        Embedding.entity_type.desc(), Embedding.entity_id
+    ).execution_options(yield_per=chunk_size)
+
+    writer = None
+    count = 0
+    keys, hashes, vectors = [], [], []
+    for entity_type, entity_id, digest, vector in rows:
+        keys.append((entity_type, entity_id))
+        hashes.append(digest)
+        vectors.append(np.frombuffer(vector, dtype=np.float32))
+        if len(keys) >= chunk_size:
+            writer = writer or VectorFileWriter(path, len(vectors[0]), dtype, model_name=MODEL_NAME)
+            writer.write(keys, hashes, np.vstack(vectors))
+            count += len(keys)
+            keys, hashes, vectors = [], [], []
+    if keys:
+        writer = writer or VectorFileWriter(path, len(vectors[0]), dtype, model_name=MODEL_NAME)
+        writer.write(keys, hashes, np.vstack(vectors))
+        count += len(keys)
+    if writer is None:
+        writer = VectorFileWriter(path, 0, dtype, model_name=MODEL_NAME)
+    writer.close()
+    return count
+
+def semantic_search(query, threshold=0.6, top_k=None, survey_ids=None):
     """
     Search for questions and options semantically similar to the query.
     
     Args:
         query (str): The natural language query to search for
         threshold (float): Similarity threshold (0-1) for matching
+        top_k (int): Maximum number of results (defaults to SEARCH_TOP_K)
+        survey_ids (list): Only search these surveys
         
     Returns:
         list: List of matching questions with similarity scores and metadata
     """
-    global model, tokenizer, nlp_available
-    
-    # Check if NLP dependencies are available
-    if not nlp_available:
-        logger.warning("NLP dependencies not available, using keyword search instead")
-        return keyword_search(query)
-    
-    # Initialize model if not already loaded
-    if model is None or tokenizer is None:
-        if not initialize_model():
-            logger.error("Failed to initialize NLP model for search")
-            # Fall back to keyword search if model initialization fails
-            return keyword_search(query)
+    # Use the shared embedding service, or load the model in-process
+    if not encoder_ready():
+        logger.warning("No embedding model available, using keyword search instead")
+        # Fall back to keyword search if neither is available
+        return keyword_search(query, top_k, survey_ids)
     
     try:
         logger.info(f"Performing semantic search for query: {query}")
         
         # Get embedding for query
-        query_embedding = get_embedding(query)
+        query_embedding = get_query_embedding(query)
         if query_embedding is None:
             logger.warning("Failed to generate embedding for query, falling back to keyword search")
-            return keyword_search(query)
-        
-        # Get all questions
-        questions = Question.query.all()
-        options = Option.query.all()
+            return keyword_search(query, top_k, survey_ids)
         
-        results = []
-        
-        # Process questions
-        for question in questions:
-            # Get question embedding
-            question_text = question.text
-            question_embedding = get_embedding(question_text)
-            
-            if question_embedding is not None:
-                # Compute similarity
-                similarity = compute_similarity(query_embedding, question_embedding)
-                
-                # If similarity is above threshold, add to results
-                if similarity >= threshold:
-                    results.append({
-                        'survey_id': question.survey_id,
-                        'survey_name': question.survey.name,
-                        'question_id': question.id,
-                        'question_number': question.question_number,
-                        'text': question.text,
-                        'options': [option.text for option in question.options],
-                        'match_type': 'question',
-                        'similarity': float(similarity)
-                    })
+        if top_k is None:
+            top_k = DEFAULT_TOP_K
         
-        # Process options
-        for option in options:
-            # Get option embedding
-            option_text = option.text
-            option_embedding = get_embedding(option_text)
-            
-            if option_embedding is not None:
-                # Compute similarity
-                similarity = compute_similarity(query_embedding, option_embedding)
-                
-                # If similarity is above threshold, add to results
-                if similarity >= threshold:
-                    results.append({
-                        'survey_id': option.question.survey_id,
-                        'survey_name': option.question.survey.name,
-                        'question_id': option.question_id,
-                        'question_number': option.question.question_number,
-                        'text': option.question.text,
-                        'options': [opt.text for opt in option.question.options],
-                        'match_type': 'option',
-                        'matched_option': option.text,
-                        'similarity': float(similarity)
-                    })
+        # Approximate top-k over the preloaded corpus, highest first
+        keys = scope_keys(survey_ids) if survey_ids is not None else None
+        hits = search_corpus(get_corpus(), query_embedding, top_k, threshold=threshold, keys=keys)
         
-        # Sort results by similarity score (highest first)
-        results.sort(key=lambda x: x['similarity'], reverse=True)
+        results = hydrate_results(
+            [(entity_type, entity_id, similarity) for (entity_type, entity_id), similarity in hits]
+        )
         
         logger.info(f"Semantic search found {len(results)} results")
         return results
     
     except Exception as e:
         logger.error(f"Error in semantic search: {str(e)}")
+        db.session.rollback()
         logger.info("Falling back to keyword search")
-        return keyword_search(query)
+        return keyword_search(query, top_k, survey_ids)
+
+@contextmanager
+def timed(timings, stage):
+    """
+    Add the wall time of the block, in milliseconds, to ``timings[stage]``.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - started) * 1000
+
+def hybrid_search(query, top_k=None, survey_ids=None, timings=None):
+    """
+    Fuse lexical and vector candidates into one ranking in a single pass.
+
+    Question-code queries that match a question_number are answered from
+    the database alone, without model inference. Otherwise the full-text
+    question and option rankings and the vector ranking are merged with
+    weighted reciprocal-rank fusion; if the vector side fails, the lexical
+    candidates are still used.
+
+    Args:
+        query (str): The search query
+        top_k (int): Maximum number of results (defaults to SEARCH_TOP_K)
+        survey_ids (list): Only search these surveys
+        timings (dict): Optional; receives per-stage milliseconds
+
+    Returns:
+        list: Result dicts, best first
+    """
+    if top_k is None:
+        top_k = DEFAULT_TOP_K
+
+    if QUESTION_CODE.match(query.strip()):
+        with timed(timings, 'lexical'):
+            codes = db.session.query(Question.id).filter(
+                func.lower(Question.question_number) == query.strip().lower())
+            if survey_ids is not None:
+                codes = codes.filter(Question.survey_id.in_(survey_ids))
+            code_ids = [row.id for row in codes.order_by(Question.id).limit(top_k)]
+        if code_ids:
+            with timed(timings, 'hydrate'):
+                return hydrate_results([('question', question_id, None) for question_id in code_ids])
+
+    with timed(timings, 'lexical'):
+        question_ids, option_ids = lexical_ids(query, top_k, survey_ids)
+
+    vector_hits = []
+    if encoder_ready():
+        try:
+            with timed(timings, 'encode'):
+                query_embedding = get_query_embedding(query)
+            if query_embedding is not None:
+                with timed(timings, 'vector'):
+                    keys = scope_keys(survey_ids) if survey_ids is not None else None
+                    vector_hits = search_corpus(
+                        get_corpus(), query_embedding, top_k, threshold=HYBRID_MIN_SIMILARITY, keys=keys
+                    )
+        except Exception as e:
+            logger.error(f"Vector side of hybrid search failed, using lexical candidates only: {str(e)}")
+            db.session.rollback()
+
+    with timed(timings, 'fuse'):
+        rankings = [
+            ([('question', question_id) for question_id in question_ids], 1.0),
+            ([('option', option_id) for option_id in option_ids], 1.0),
+            ([key for key, _ in vector_hits], HYBRID_VECTOR_WEIGHT),
+        ]
+        fused = {}
+        for ranking, weight in rankings:
+            for rank, key in enumerate(ranking, 1):
+                fused[key] = fused.get(key, 0.0) + weight / (HYBRID_RRF_K + rank)
+        similarity = dict(vector_hits)
+        best = heapq.nlargest(top_k, fused, key=lambda key: (fused[key], similarity.get(key, 0.0)))
+
+    with timed(timings, 'hydrate'):
+        return hydrate_results([(entity_type, entity_id, similarity.get((entity_type, entity_id)))
+                                for entity_type, entity_id in best])
+
+def search(query, use_nlp=True, top_k=None, survey_ids=None, group=None, mode=None, timings=None):
+    """
+    Run a semantic, keyword or hybrid search, serving repeated queries from cache.
+
+    Args:
+        query (str): The search query
+        use_nlp (bool): Try semantic search first, falling back to keywords
+            (ignored when ``mode`` is given)
+        top_k (int): Maximum number of results (defaults to SEARCH_TOP_K)
+        survey_ids (list): Only search these surveys
+        group (str): 'question' to keep only the best hit per question
+        mode (str): One of SEARCH_MODES
+        timings (dict): Optional; receives per-stage milliseconds
+
+    Returns:
+        list: Result dicts flagged with ``nlp_used``; treat as read-only
+    """
+    if mode is None:
+        mode = 'semantic' if use_nlp else 'keyword'
+    if survey_ids is not None:
+        survey_ids = tuple(sorted(set(survey_ids)))
+    key = (query, mode, top_k, survey_ids, group)
+    with timed(timings, 'cache'):
+        follow_corpus_generation()
+        # read before searching: results computed across a clear are not cached
+        generation = search_result_cache.generation
+        results = search_result_cache.get(key)
+    if results is not None:
+        return results
+
+    def run():
+        if mode == 'hybrid':
+            results = hybrid_search(query, top_k=top_k, survey_ids=survey_ids, timings=timings)
+        elif mode == 'semantic':
+            try:
+                with timed(timings, 'semantic'):
+                    results = semantic_search(query, top_k=top_k, survey_ids=survey_ids)
+            except Exception:
+                with timed(timings, 'lexical'):
+                    results = keyword_search(query, top_k=top_k, survey_ids=survey_ids)
+        else:
+            with timed(timings, 'lexical'):
+                results = keyword_search(query, top_k=top_k, survey_ids=survey_ids)
+
+        if group == 'question':
+            results = group_by_question(results)
+
+        # flag NLP usage
+        for r in results:
+            r['nlp_used'] = 'similarity' in r
+        return results
+
+    # concurrent duplicates wait for the first caller instead of searching again
+    started = time.perf_counter()
+    results, shared = search_flight.do(key, run)
+    if shared and timings is not None:
+        timings['coalesced'] = (time.perf_counter() - started) * 1000
+
+    search_result_cache.set(key, results, generation=generation)
+    return results
+
+def group_by_question(results):
+    """
+    Keep the first (best ranked) result per question.
+    """
+    seen = set()
+    grouped = []
+    for result in results:
+        if result['question_id'] not in seen:
+            seen.add(result['question_id'])
+            grouped.append(result)
+    return grouped
+
+def follow_corpus_generation():
+    """
+    Drop cached search results if the corpus changed since they were cached,
+    in this process or any other.
+    """
+    global _result_cache_generation
+
+    current = corpus_generation.current()
+    if current != _result_cache_generation:
+        search_result_cache.clear()
+        _result_cache_generation = current
+
+def invalidate_search_cache():
+    """
+    Drop cached search results and request an embedding sync; call after any
+    survey is created, updated or deleted (and committed).
+    """
+    search_result_cache.clear()
+    request_sync()
 
-def keyword_search(query):
+def keyword_search(query, top_k=None, survey_ids=None):
     """
     Fallback function for keyword-based search when NLP model is not available.
     
+    Uses the ranked full-text index (see fulltext.py) and falls back to
+    ILIKE scans on databases without one.
+    
     Args:
         query (str): The search query
+        top_k (int): Maximum number of results (defaults to SEARCH_TOP_K)
+        survey_ids (list): Only search these surveys
         
     Returns:
         list: List of matching questions based on keyword search
     """
     logger.info(f"Performing keyword search for query: {query}")
     
-    # Simple search implementation with ILIKE
-    query_pattern = f"%{query}%"
-    questions = Question.query.filter(Question.text.ilike(query_pattern)).all()
-    options = Option.query.filter(Option.text.ilike(query_pattern)).all()
+    if top_k is None:
+        top_k = DEFAULT_TOP_K
     
-    results = []
+    question_ids, option_ids = lexical_ids(query, top_k, survey_ids)
     
-    # Add question matches
-    for question in questions:
-        results.append({
+    # Question matches first, then option matches
+    results = hydrate_results(
+        [('question', question_id, None) for question_id in question_ids]
+        + [('option', option_id, None) for option_id in option_ids]
+    )
+    
+    results = results[:top_k]
+    logger.info(f"Keyword search found {len(results)} results")
+    return results
+
+def lexical_ids(query, top_k, survey_ids=None):
+    """
+    Ranked ids of matching questions and of matching options.
+
+    Returns:
+        tuple: ``(question_ids, option_ids)``, each best first
+    """
+    # Ranked full-text search when the database supports it
+    question_ids = fulltext.search_ids('question', query, top_k, survey_ids)
+    option_ids = fulltext.search_ids('option', query, top_k, survey_ids)
+    if question_ids is None or option_ids is None:
+        # Simple search implementation with ILIKE
+        query_pattern = f"%{query}%"
+        questions = db.session.query(Question.id).filter(Question.text.ilike(query_pattern))
+        options = db.session.query(Option.id).filter(Option.text.ilike(query_pattern))
+        if survey_ids is not None:
+            questions = questions.filter(Question.survey_id.in_(survey_ids))
+            options = options.join(Question).filter(Question.survey_id.in_(survey_ids))
+        question_ids = [row.id for row in questions.limit(top_k)]
+        option_ids = [row.id for row in options.limit(top_k)]
+    return question_ids, option_ids
+
+def _in_chunks(column, ids, size=500):
+    """
+    Split an IN filter into chunks so huge id lists stay within driver limits.
+    """
+    ids = list(ids)
+    return [column.in_(ids[start:start + size]) for start in range(0, len(ids), size)]
+
+def hydrate_results(hits):
+    """
+    Build result dicts for a list of search hits in a constant number of queries.
+
+    Questions, their surveys and all their options are loaded with one
+    batched, column-only SELECT per table instead of lazy-loading
+    relationships per hit.
+
+    Args:
+        hits (list): ``(match_type, entity_id, similarity)`` tuples, where
+            match_type is 'question' or 'option' and similarity may be None
+
+    Returns:
+        list: Result dicts in hit order; hits whose rows no longer exist are dropped
+    """
+    option_ids = {entity_id for match_type, entity_id, _ in hits if match_type == 'option'}
+    matched_options = {}
+    for condition in _in_chunks(Option.id, option_ids):
+        for option_id, question_id, option_text in db.session.query(
+                Option.id, Option.question_id, Option.text).filter(condition):
+            matched_options[option_id] = (question_id, option_text)
+
+    question_ids = {entity_id for match_type, entity_id, _ in hits if match_type == 'question'}
+    question_ids.update(question_id for question_id, _ in matched_options.values())
+    questions = {}
+    for condition in _in_chunks(Question.id, question_ids):
+        for row in db.session.query(
+                Question.id, Question.survey_id, Question.question_number, Question.text).filter(condition):
+            questions[row.id] = row
+
+    survey_names = {}
+    for condition in _in_chunks(Survey.id, {q.survey_id for q in questions.values()}):
+        survey_names.update(db.session.query(Survey.id, Survey.name).filter(condition))
+
+    question_options = {question_id: [] for question_id in questions}
+    for condition in _in_chunks(Option.question_id, questions):
+        for question_id, option_text in db.session.query(
+                Option.question_id, Option.text).filter(condition).order_by(Option.id):
+            question_options[question_id].append(option_text)
+
+    results = []
+    for match_type, entity_id, similarity in hits:
+        if match_type == 'option':
+            if entity_id not in matched_options:
+                continue
+            question_id, matched_option = matched_options[entity_id]
+        else:
+            question_id = entity_id
+        question = questions.get(question_id)
+        if question is None:
+            continue
+
+        result = {
             'survey_id': question.survey_id,
-            'survey_name': question.survey.name,
+            'survey_name': survey_names.get(question.survey_id),
             'question_id': question.id,
             'question_number': question.question_number,
             'text': question.text,
-            'options': [option.text for option in question.options],
-            'match_type': 'question'
-        })
-    
-    # Add option matches
-    for option in options:
-        results.append({
-            'survey_id': option.question.survey_id,
-            'survey_name': option.question.survey.name,
-            'question_id': option.question_id,
-            'question_number': option.question.question_number,
-            'text': option.question.text,
-            'options': [opt.text for opt in option.question.options],
-            'match_type': 'option',
-            'matched_option': option.text
-        })
-    
-    logger.info(f"Keyword search found {len(results)} results")
-    return results
\ No newline at end of file
+            'options': list(question_options[question.id]),
+            'match_type': match_type
+        }
+        if match_type == 'option':
+            result['matched_option'] = matched_option
+        if similarity is not None:
+            result['similarity'] = float(similarity)
+        results.append(result)
+
+    return results
@@ -0,0 +1,130 @@
+# pagination.py
+"""
+Helpers for cursor-paginated and NDJSON-streamed list endpoints.
+
+Lists are paged with ``limit`` and ``after`` query parameters; when more
+rows follow, the response carries the cursor for the next page in an
+``X-Next-Cursor`` header and a ``Link: <...>; rel="next"`` header, so JSON
+bodies keep their existing shape.
+
+Clients that send ``Accept: application/x-ndjson`` (or ``?format=ndjson``)
+get one JSON document per line, written as rows are produced; the next
+cursor is in the same headers.
+"""
+
+import base64
+import json
+from urllib.parse import urlencode
+
+from flask import Response, request, stream_with_context
+
+import fastjson
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Upper bound for ?limit=
+MAX_PAGE_SIZE = 1000
+
+
+def wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def ndjson_response(rows):
+    """
+    Stream an iterable of JSON-serializable rows, one per line.
+
+    The iterable is consumed lazily inside the request context, so it can be
+    backed by a server-side database cursor.
+    """
+    def generate():
+        for row in rows:
+            yield fastjson.dumps(row, default=str) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def encode_cursor(value):
+    """
+    Opaque, URL-safe cursor for any JSON-serializable position.
+    """
+    raw = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Inverse of ``encode_cursor``.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError('invalid cursor') from e
+
+
+def decode_position_cursor(cursor):
+    """
+    Decode a ``{'pos': int, 'id': list}`` cursor of a ranked, cached list.
+
+    Raises:
+        ValueError: If the cursor is malformed or has another shape
+    """
+    value = decode_cursor(cursor)
+    pos = value.get('pos') if isinstance(value, dict) else None
+    if not isinstance(pos, int) or isinstance(pos, bool) or pos < 0 or not isinstance(value.get('id'), list):
+        raise ValueError('invalid cursor')
+    return value
+
+
+def page_limit():
+    """
+    Parse ``?limit=``; returns None when absent.
+
+    Raises:
+        ValueError: If the limit is not a positive integer
+    """
+    limit = request.args.get('limit')
+    if limit is None:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError('limit must be a positive integer')
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def after_id():
+    """
+    Parse an integer keyset ``?after=``; returns None when absent.
+
+    Raises:
+        ValueError: If after is not an integer
+    """
+    after = request.args.get('after')
+    if after is None:
+        return None
+    try:
+        return int(after)
+    except ValueError:
+        raise ValueError('after must be an integer')
+
+
+def set_next_cursor(response, cursor):
+    """
+    Advertise the next page on ``response`` (no-op when ``cursor`` is None).
+    """
+    if cursor is None:
+        return response
+    args = request.args.to_dict()
+    args['after'] = cursor
+    response.headers['X-Next-Cursor'] = str(cursor)
+    response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response
@@ -0,0 +1,448 @@
+# question_clusters.py
+"""
+Corpus-wide near-duplicate question detection.
+
+Every question gets a cluster id (the smallest question id in its cluster)
+in the ``question_cluster`` table. Two questions are linked when
+
+    - their normalized text is identical,
+    - their word MinHash signatures agree on at least TEXT_THRESHOLD of
+      positions (LSH banding, so only colliding pairs are scored), or
+    - their stored embeddings have a cosine similarity of at least
+      VECTOR_THRESHOLD,
+
+and clusters are the connected components of those links.
+
+Identical texts are collapsed first, so the similarity joins only run over
+distinct texts. The embedding join is blocked: vectors are partitioned with
+k-means, every vector joins its ``probes`` nearest partitions, and rows are
+scored against the other members of their partitions, one matrix product per chunk
+on a thread pool (NumPy releases the GIL). Below BLOCK_MIN_SIZE distinct
+texts the join is exact.
+
+Incremental runs only score new or changed questions, plus the other
+members of clusters that a changed or deleted question belonged to; every
+other question keeps its stored cluster. Changing a threshold needs a full
+run.
+"""
+
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import bindparam, func
+
+from ann_index import kmeans, normalize
+from db import db
+from models import Survey, Question, Embedding, QuestionCluster
+import nlp_search
+from nlp_search import text_hash
+from survey_compare import normalize_text
+
+logger = logging.getLogger(__name__)
+
+VECTOR_THRESHOLD = float(os.environ.get("CLUSTER_VECTOR_THRESHOLD", "0.92"))
+TEXT_THRESHOLD = float(os.environ.get("CLUSTER_TEXT_THRESHOLD", "0.8"))
+
+# Distinct texts below which the embedding join is a single exact block
+BLOCK_MIN_SIZE = 20000
+# Query rows scored per matrix product
+JOIN_CHUNK = 2048
+
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+# Rows sharing an LSH bucket are only paired with this many neighbours in
+# sort order; larger buckets stay connected through chains of neighbours.
+MAX_BUCKET_SPAN = 64
+# Universal hashing modulus; products of two values below it fit in 64 bits
+_MERSENNE_PRIME = (1 << 31) - 1
+
+_NO_PAIRS = np.zeros((0, 2), dtype=np.int64)
+
+
+def connected_components(size, edges):
+    """
+    Label every node with the smallest node of its component.
+
+    Args:
+        size (int): Number of nodes
+        edges (ndarray): (m, 2) array of node pairs
+
+    Returns:
+        ndarray: Component label per node
+    """
+    labels = np.arange(size, dtype=np.int64)
+    if len(edges) == 0:
+        return labels
+    a, b = edges[:, 0], edges[:, 1]
+    while True:
+        before = labels.copy()
+        low = np.minimum(labels[a], labels[b])
+        np.minimum.at(labels, a, low)
+        np.minimum.at(labels, b, low)
+        labels = labels[labels]
+        if np.array_equal(labels, before):
+            return labels
+
+
+def minhash_signatures(texts, permutations=MINHASH_PERMUTATIONS, chunk_size=20000, seed=0):
+    """
+    MinHash signatures over the word sets of ``texts``.
+
+    Returns:
+        ndarray: (len(texts), permutations) uint64 matrix
+    """
+    rng = np.random.default_rng(seed)
+    mult = rng.integers(1, _MERSENNE_PRIME, size=permutations, dtype=np.uint64)
+    add = rng.integers(0, _MERSENNE_PRIME, size=permutations, dtype=np.uint64)
+    vocabulary = {}
+    signatures = np.empty((len(texts), permutations), dtype=np.uint64)
+
+    for start in range(0, len(texts), chunk_size):
+        token_ids, offsets = [], []
+        for i, value in enumerate(texts[start:start + chunk_size], start):
+            # Texts without words get a token of their own so they never collide
+            words = set(value.split()) or {f'\0{i}'}
+            offsets.append(len(token_ids))
+            token_ids.extend(vocabulary.setdefault(word, len(vocabulary)) for word in words)
+        tokens = np.asarray(token_ids, dtype=np.uint64)
+        hashed = (tokens[:, None] * mult + add) % _MERSENNE_PRIME
+        signatures[start:start + len(offsets)] = np.minimum.reduceat(hashed, offsets, axis=0)
+    return signatures
+
+
+def minhash_pairs(signatures, query, threshold=TEXT_THRESHOLD, bands=MINHASH_BANDS):
+    """
+    Pairs of rows whose estimated word Jaccard similarity reaches ``threshold``.
+
+    Args:
+        signatures (ndarray): Output of ``minhash_signatures``
+        query (ndarray): Boolean mask; only pairs touching a query row are returned
+        threshold (float): Minimum fraction of agreeing signature positions
+        bands (int): LSH bands
+
+    Returns:
+        ndarray: (m, 2) array of row pairs
+    """
+    count, permutations = signatures.shape
+    if count < 2 or not query.any():
+        return _NO_PAIRS
+    rows_per_band = permutations // bands
+    mixer = np.random.default_rng(1).integers(1, 1 << 63, size=rows_per_band, dtype=np.uint64)
+
+    candidates = []
+    for band in range(bands):
+        columns = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        keys = (columns * mixer).sum(axis=1)    # wraps modulo 2**64
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        for span in range(1, min(MAX_BUCKET_SPAN, count - 1) + 1):
+            same = sorted_keys[:-span] == sorted_keys[span:]
+            if not same.any():
+                break
+            a, b = order[:-span][same], order[span:][same]
+            wanted = query[a] | query[b]
+            candidates.append(np.stack([a[wanted], b[wanted]], axis=1))
+
+    if not candidates:
+        return _NO_PAIRS
+    pairs = np.concatenate(candidates)
+    pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+    agreement = np.concatenate([
+        (signatures[pairs[start:start + 100000, 0]] == signatures[pairs[start:start + 100000, 1]]).mean(axis=1)
+        for start in range(0, len(pairs), 100000)
+    ]) if len(pairs) else np.zeros(0)
+    return pairs[agreement >= threshold]
+
+
+def _blocks(vectors, query_rows, probes):
+    """
+    Yield ``(query rows, candidate rows)`` per k-means partition.
+    """
+    count = len(vectors)
+    cells = max(1, int(math.sqrt(count)))
+    rng = np.random.default_rng(0)
+    sample = vectors[rng.choice(count, size=min(count, cells * 32), replace=False)]
+    centroids = kmeans(sample, cells, iterations=5)
+
+    nearest = np.empty((count, probes), dtype=np.int64)
+    for start in range(0, count, 65536):
+        scores = vectors[start:start + 65536] @ centroids.T
+        nearest[start:start + 65536] = np.argpartition(-scores, probes - 1, axis=1)[:, :probes]
+
+    cell_of = nearest.ravel()
+    members = np.repeat(np.arange(count), probes)
+    order = np.argsort(cell_of, kind='stable')
+    bounds = np.searchsorted(cell_of[order], np.arange(cells + 1))
+
+    # Query rows are probed in all of their nearest partitions too, so a
+    # pair is found when their partition lists overlap at all
+    query_cells = nearest[query_rows].ravel()
+    query_members = np.repeat(query_rows, probes)
+    query_order = np.argsort(query_cells, kind='stable')
+    query_bounds = np.searchsorted(query_cells[query_order], np.arange(cells + 1))
+
+    for cell in range(cells):
+        rows = query_members[query_order[query_bounds[cell]:query_bounds[cell + 1]]]
+        if len(rows):
+            yield rows, members[order[bounds[cell]:bounds[cell + 1]]]
+
+
+def vector_pairs(vectors, query, threshold=VECTOR_THRESHOLD, workers=None, probes=2):
+    """
+    Pairs of rows whose cosine similarity reaches ``threshold``.
+
+    Args:
+        vectors (ndarray): Unit-normalized float32 rows
+        query (ndarray): Boolean mask; only pairs touching a query row are returned
+        threshold (float): Minimum cosine similarity
+        workers (int): Threads scoring blocks (default: all cores)
+        probes (int): Partitions each vector is a candidate in
+
+    Returns:
+        ndarray: (m, 2) array of row pairs
+    """
+    query_rows = np.nonzero(query)[0]
+    if len(vectors) < 2 or not len(query_rows):
+        return _NO_PAIRS
+
+    if len(vectors) < BLOCK_MIN_SIZE:
+        blocks = [(query_rows, None)]
+    else:
+        blocks = _blocks(vectors, query_rows, min(probes, int(math.sqrt(len(vectors)))))
+    tasks = [
+        (rows[start:start + JOIN_CHUNK], candidates)
+        for rows, candidates in blocks
+        for start in range(0, len(rows), JOIN_CHUNK)
+    ]
+
+    def join(task):
+        rows, candidates = task
+        if candidates is None:
+            scores = vectors[rows] @ vectors.T
+            candidates = np.arange(len(vectors))
+        else:
+            scores = vectors[rows] @ vectors[candidates].T
+        a, b = np.nonzero(scores >= threshold)
+        a, b = rows[a], candidates[b]
+        keep = a != b
+        return np.stack([a[keep], b[keep]], axis=1)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        found = list(pool.map(join, tasks))
+    return np.concatenate(found) if found else _NO_PAIRS
+
+
+def _load_vectors(position, hashes, rep_index, reps):
+    """
+    One current question embedding per representative, where one is stored.
+
+    Returns:
+        tuple: ``(matrix, filled)``; ``filled`` marks the rows that have a vector
+    """
+    slot_of = {int(row): slot for slot, row in enumerate(reps)}
+    filled = np.zeros(len(reps), dtype=bool)
+    matrix = None
+    rows = db.session.query(Embedding.entity_id, Embedding.text_hash, Embedding.vector).filter(
+        Embedding.entity_type == 'question',
+        Embedding.model_name == nlp_search.MODEL_NAME
+    ).execution_options(yield_per=10000)
+    for entity_id, digest, vector in rows:
+        i = position.get(entity_id)
+        if i is None or hashes[i] != digest:
+            continue
+        slot = slot_of[int(rep_index[i])]
+        if filled[slot]:
+            continue
+        vector = np.frombuffer(vector, dtype=np.float32)
+        if matrix is None:
+            matrix = np.zeros((len(reps), len(vector)), dtype=np.float32)
+        matrix[slot] = vector
+        filled[slot] = True
+    if matrix is None:
+        matrix = np.zeros((len(reps), 0), dtype=np.float32)
+    return matrix, filled
+
+
+def cluster_questions(full=False, workers=None, vector_threshold=None, text_threshold=None):
+    """
+    Recompute question clusters and store them in ``question_cluster``.
+
+    Args:
+        full (bool): Re-cluster every question instead of only changed ones
+        workers (int): Threads for the embedding join (default: all cores)
+        vector_threshold (float): Overrides VECTOR_THRESHOLD
+        text_threshold (float): Overrides TEXT_THRESHOLD
+
+    Returns:
+        dict: Row counts, pairs found, clusters and elapsed seconds
+    """
+    started = time.perf_counter()
+    questions = db.session.query(Question.id, Question.text).order_by(Question.id).all()
+    ids = np.array([q.id for q in questions], dtype=np.int64)
+    id_list = ids.tolist()
+    hashes = [text_hash(q.text) for q in questions]
+    position = {question_id: i for i, question_id in enumerate(id_list)}
+    count = len(questions)
+
+    stored = {}
+    if not full:
+        stored = {
+            row.question_id: (row.cluster_id, row.text_hash)
+            for row in db.session.query(
+                QuestionCluster.question_id, QuestionCluster.cluster_id, QuestionCluster.text_hash)
+        }
+
+    # Rows to (re)score; rows of untouched clusters keep their stored cluster
+    edges = []
+    removed = [question_id for question_id in stored if question_id not in position]
+    if full:
+        dirty = np.ones(count, dtype=bool)
+    else:
+        dirty = np.array([stored.get(question_id, (None, None))[1] != digest
+                          for question_id, digest in zip(id_list, hashes)], dtype=bool)
+        affected = {stored[question_id][0] for question_id in removed}
+        affected.update(stored[id_list[i]][0] for i in np.nonzero(dirty)[0] if id_list[i] in stored)
+        for i, question_id in enumerate(id_list):
+            entry = stored.get(question_id)
+            if entry is None or dirty[i]:
+                continue
+            if entry[0] in affected or entry[0] not in position:
+                dirty[i] = True
+            else:
+                edges.append((i, position[entry[0]]))
+
+    stats = {'questions': count, 'rescored': int(dirty.sum()), 'removed': len(removed)}
+    if not dirty.any() and not removed:
+        stats.update(text_pairs=0, vector_pairs=0, rows_written=0,
+                     seconds=round(time.perf_counter() - started, 3))
+        logger.info("Question clusters are up to date")
+        return stats
+
+    # Identical normalized texts share one representative row
+    keys = [normalize_text(q.text) for q in questions]
+    first = {}
+    rep_index = np.array([first.setdefault(key, i) for i, key in enumerate(keys)], dtype=np.int64)
+    reps = np.unique(rep_index)
+    same_text = np.nonzero(rep_index != np.arange(count))[0]
+    edge_sets = [np.asarray(edges, dtype=np.int64).reshape(-1, 2),
+                 np.stack([same_text, rep_index[same_text]], axis=1)]
+
+    touched = np.zeros(count, dtype=bool)
+    touched[rep_index[dirty]] = True
+    query = touched[reps]
+
+    signatures = minhash_signatures([keys[row] for row in reps])
+    text_pairs = minhash_pairs(signatures, query, TEXT_THRESHOLD if text_threshold is None else text_threshold)
+    edge_sets.append(reps[text_pairs])
+
+    matrix, filled = _load_vectors(position, hashes, rep_index, reps)
+    embedded = np.nonzero(filled)[0]
+    found = vector_pairs(normalize(matrix[embedded]), query[embedded],
+                         VECTOR_THRESHOLD if vector_threshold is None else vector_threshold, workers=workers)
+    edge_sets.append(reps[embedded[found]])
+    if len(embedded) < len(reps):
+        logger.info(f"{len(reps) - len(embedded)} distinct texts have no current embedding; "
+                    f"run reindex.py to cluster them semantically")
+
+    labels = connected_components(count, np.concatenate(edge_sets))
+    cluster_ids = ids[labels].tolist()
+    now = datetime.utcnow()
+
+    table = QuestionCluster.__table__
+    inserts, updates = [], []
+    for question_id, cluster_id, digest in zip(id_list, cluster_ids, hashes):
+        entry = stored.get(question_id)
+        if entry is None:
+            inserts.append({'question_id': question_id, 'cluster_id': cluster_id,
+                            'text_hash': digest, 'updated_at': now})
+        elif entry != (cluster_id, digest):
+            updates.append({'b_question_id': question_id, 'cluster_id': cluster_id,
+                            'text_hash': digest, 'updated_at': now})
+
+    try:
+        if full:
+            db.session.execute(table.delete())
+        for start in range(0, len(removed), 500):
+            db.session.execute(table.delete().where(table.c.question_id.in_(removed[start:start + 500])))
+        for start in range(0, len(inserts), 10000):
+            db.session.execute(table.insert(), inserts[start:start + 10000])
+        for start in range(0, len(updates), 10000):
+            db.session.execute(
+                table.update().where(table.c.question_id == bindparam('b_question_id')),
+                updates[start:start + 10000]
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    sizes = np.bincount(labels, minlength=count)
+    stats.update(
+        distinct_texts=len(reps),
+        embedded=len(embedded),
+        text_pairs=len(text_pairs),
+        vector_pairs=len(found),
+        clusters=int((sizes >= 2).sum()),
+        clustered_questions=int(sizes[sizes >= 2].sum()),
+        rows_written=len(inserts) + len(updates) + len(removed),
+        seconds=round(time.perf_counter() - started, 3)
+    )
+    logger.info(f"Clustered {count} questions: {stats['clusters']} clusters, "
+                f"{stats['rescored']} rescored in {stats['seconds']}s")
+    return stats
+
+
+def cluster_members(cluster_ids):
+    """
+    Questions of the given clusters, grouped by cluster id (question id order).
+    """
+    members = {cluster_id: [] for cluster_id in cluster_ids}
+    cluster_ids = list(cluster_ids)
+    for start in range(0, len(cluster_ids), 500):
+        rows = db.session.query(
+            QuestionCluster.cluster_id, Question.id, Question.survey_id, Survey.name,
+            Question.question_number, Question.text
+        ).join(Question, Question.id == QuestionCluster.question_id).join(
+            Survey, Survey.id == Question.survey_id
+        ).filter(QuestionCluster.cluster_id.in_(cluster_ids[start:start + 500])).order_by(Question.id)
+        for cluster_id, question_id, survey_id, survey_name, question_number, question_text in rows:
+            members[cluster_id].append({
+                'question_id': question_id,
+                'survey_id': survey_id,
+                'survey_name': survey_name,
+                'question_number': question_number,
+                'text': question_text
+            })
+    return members
+
+
+def list_clusters(min_size=2, limit=None, after=None):
+    """
+    Clusters with at least ``min_size`` questions, in cluster id order.
+
+    Args:
+        min_size (int): Smallest cluster to include
+        limit (int): Maximum number of clusters
+        after (int): Only clusters with a larger id (keyset pagination)
+
+    Returns:
+        list: Dicts with cluster_id, size and questions
+    """
+    size = func.count(QuestionCluster.question_id)
+    query = db.session.query(QuestionCluster.cluster_id, size).group_by(
+        QuestionCluster.cluster_id).having(size >= min_size).order_by(QuestionCluster.cluster_id)
+    if after is not None:
+        query = query.filter(QuestionCluster.cluster_id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    sizes = query.all()
+    members = cluster_members([cluster_id for cluster_id, _ in sizes])
+    return [
+        {'cluster_id': cluster_id, 'size': cluster_size, 'questions': members[cluster_id]}
+        for cluster_id, cluster_size in sizes
+    ]
@@ -0,0 +1,137 @@
+# read_models.py
+"""
+Column-only read queries for the survey endpoints.
+
+The list, detail and comparison reads select plain columns with
+SQLAlchemy Core and build their nested output in one pass over the rows,
+so no ORM objects are hydrated or tracked by the session. The dict shapes
+are exactly what the endpoints have always returned.
+"""
+
+from sqlalchemy import select
+
+from db import db
+from models import Survey, Question, Option
+
+_survey = Survey.__table__
+_question = Question.__table__
+_option = Option.__table__
+
+
+def _summary(row):
+    return {
+        'id': row.id,
+        'name': row.name,
+        'created_at': row.created_at.isoformat(),
+        'updated_at': row.updated_at and row.updated_at.isoformat()
+    }
+
+
+def survey_summaries(after=None, limit=None, stream=False):
+    """
+    Surveys in id order, as list-endpoint dicts.
+
+    Args:
+        after (int): Only surveys with a larger id (keyset cursor)
+        limit (int): Maximum number of surveys
+        stream (bool): Fetch from a server-side cursor in chunks
+
+    Returns:
+        generator: Summary dicts
+    """
+    stmt = select(_survey.c.id, _survey.c.name, _survey.c.created_at, _survey.c.updated_at) \
+        .order_by(_survey.c.id)
+    if after is not None:
+        stmt = stmt.where(_survey.c.id > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    if stream:
+        stmt = stmt.execution_options(yield_per=500)
+    return (_summary(row) for row in db.session.execute(stmt))
+
+
+def next_survey_cursor(after=None, limit=None):
+    """
+    Id of the last survey on the page ``survey_summaries(after, limit)``
+    returns, if more surveys follow it; otherwise None.
+
+    Reads at most two ids from the primary key index, so streamed pages can
+    advertise the next cursor before their rows are produced.
+    """
+    if limit is None:
+        return None
+    stmt = select(_survey.c.id).order_by(_survey.c.id).offset(limit - 1).limit(2)
+    if after is not None:
+        stmt = stmt.where(_survey.c.id > after)
+    ids = db.session.execute(stmt).scalars().all()
+    return ids[0] if len(ids) == 2 else None
+
+
+def last_modified(survey):
+    """
+    When a survey row (anything with created_at and updated_at) last changed.
+    """
+    return survey.updated_at or survey.created_at
+
+
+def survey_row(survey_id):
+    """
+    The survey's id, name, created_at and updated_at, or None if it does not exist.
+    """
+    return db.session.execute(
+        select(_survey.c.id, _survey.c.name, _survey.c.created_at, _survey.c.updated_at)
+        .where(_survey.c.id == survey_id)
+    ).first()
+
+
+def survey_questions(survey_id):
+    """
+    Questions of a survey (id order) with their option texts (id order).
+
+    One LEFT JOIN over question and option, grouped while it is read.
+
+    Returns:
+        list: ``{'id', 'question_number', 'text', 'options'}`` dicts
+    """
+    stmt = select(
+        _question.c.id, _question.c.question_number, _question.c.text, _option.c.text.label('option')
+    ).select_from(
+        _question.outerjoin(_option, _option.c.question_id == _question.c.id)
+    ).where(_question.c.survey_id == survey_id).order_by(_question.c.id, _option.c.id)
+
+    questions = []
+    current = None
+    for row in db.session.execute(stmt):
+        if current is None or current['id'] != row.id:
+            current = {'id': row.id, 'question_number': row.question_number, 'text': row.text, 'options': []}
+            questions.append(current)
+        if row.option is not None:
+            current['options'].append(row.option)
+    return questions
+
+
+def survey_detail(survey_id):
+    """
+    A survey with its questions, as returned by ``GET /api/surveys/<id>``.
+
+    Returns:
+        tuple: ``(version, dict)`` where version is updated_at or created_at,
+        or None if the survey does not exist
+    """
+    survey = survey_row(survey_id)
+    if survey is None:
+        return None
+    detail = _summary(survey)
+    detail['questions'] = survey_questions(survey_id)
+    return last_modified(survey), detail
+
+
+def comparison_view(survey):
+    """
+    A survey dict in the ``GET /api/surveys/compare`` shape, whose questions carry no ``id``.
+    """
+    view = dict(survey)
+    view['questions'] = [
+        {key: value for key, value in question.items() if key != 'id'} for question in survey['questions']
+    ]
+    return view
@@ -0,0 +1,85 @@
+# reindex.py
+"""
+Offline (re)build of the question/option embeddings used by semantic search.
+
+    python reindex.py                 # embed new or changed rows only
+    python reindex.py --full          # re-encode every row
+    python reindex.py --threads 16 --batch-size 128
+    python reindex.py --export embeddings.svec --dtype int8
+
+Progress is committed every --chunk-size rows. An interrupted incremental
+run resumes where it stopped when the command is run again, since rows it
+already embedded are up to date. A --full run keeps no checkpoint: run
+again, it re-encodes every row from the start. Rows an interrupted --full
+run did not reach keep their previous embedding meanwhile.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger("reindex")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild semantic search embeddings")
+    parser.add_argument("--full", action="store_true",
+                        help="re-encode every row, not only new or changed ones "
+                             "(an interrupted --full run starts over)")
+    parser.add_argument("--batch-size", type=int,
+                        default=int(os.environ.get("EMBEDDING_BATCH_SIZE", "64")),
+                        help="texts per forward pass (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=2048,
+                        help="rows committed per checkpoint (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(),
+                        help="torch intra-op threads (default: all cores)")
+    parser.add_argument("--export", metavar="PATH",
+                        help="also write a memory-mapped vector file (serve it via EMBEDDING_FILE)")
+    parser.add_argument("--dtype", choices=("int8", "float16"), default="int8",
+                        help="component type of the exported file (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from app import app
+    import nlp_search
+
+    if not nlp_search.load_nlp_dependencies():
+        logger.error("NLP dependencies are not installed; nothing to do")
+        return 1
+
+    nlp_search.torch.set_num_threads(args.threads)
+    if not nlp_search.initialize_model():
+        return 1
+
+    started = time.time()
+
+    def report(done, total):
+        elapsed = time.time() - started
+        rate = done / elapsed if elapsed else 0.0
+        eta = (total - done) / rate if rate else 0.0
+        logger.info(f"{done}/{total} rows embedded ({rate:.1f} rows/s, ETA {eta:.0f}s)")
+
+    with app.app_context():
+        encoded = nlp_search.sync_embeddings(
+            batch_size=args.batch_size,
+            chunk_size=args.chunk_size,
+            progress=report,
+            force=args.full
+        )
+
+        if args.export:
+            exported = nlp_search.export_embeddings(args.export, dtype=args.dtype)
+            logger.info(f"Exported {exported} vectors to {args.export}")
+
+    logger.info(f"Done: {encoded} rows embedded in {time.time() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+# singleflight.py
+"""
+Coalesce identical concurrent calls so only one of them does the work.
+
+``SingleFlight.do(key, fn)`` runs ``fn()`` for the first caller of a key;
+callers that arrive with the same key while it runs wait and get the same
+result (or the same exception). Nothing is cached once the call returns,
+that is the caller's job.
+
+With a ``directory`` (SINGLEFLIGHT_DIR for the search flight) the same
+coalescing also spans processes on one host: per key, the leader holds an
+``fcntl`` lock on a lock file and publishes its result to a pickle next to
+it, which waiting processes read once the lock is released. A process
+that waited longer than ``wait`` seconds, or found no fresh result because
+the leader failed, computes the value itself. The directory holds pickled
+results, so it must only be writable by the app user. Without ``fcntl``
+(Windows) coalescing is per process only.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FLIGHTS = metrics.counter(
+    'singleflight_calls_total', 'Calls by flight and role (leader, follower, remote).', ('flight', 'role'))
+
+# Age after which result and lock files are swept by later leaders
+RESULT_TTL = float(os.environ.get("SINGLEFLIGHT_RESULT_TTL", "5"))
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Per-key call coalescing across threads and, optionally, processes.
+
+    Args:
+        name (str): Label for the singleflight_calls_total metric
+        directory (str): Lock and result directory for cross-process coalescing
+        wait (float): Longest a process waits for another process's leader
+    """
+
+    def __init__(self, name, directory=None, wait=30.0):
+        self.name = name
+        self.directory = directory if directory and fcntl is not None else None
+        self.wait = wait
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        if self.directory:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    def do(self, key, fn):
+        """
+        Call ``fn()`` unless an identical call is in flight, then share its outcome.
+
+        Args:
+            key: Hashable identity of the call; must have a stable repr
+                when coalescing across processes
+            fn (callable): Computes the value
+
+        Returns:
+            tuple: (value, shared) where ``shared`` is True if another caller computed it
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            FLIGHTS.inc(flight=self.name, role='follower')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result[0], True
+
+        try:
+            if self.directory:
+                call.result = self._across_processes(key, fn)
+            else:
+                FLIGHTS.inc(flight=self.name, role='leader')
+                call.result = (fn(), False)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _paths(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, f'{self.name}-{digest}')
+        return base + '.lock', base + '.result'
+
+    def _across_processes(self, key, fn):
+        lock_path, result_path = self._paths(key)
+        started = time.time()
+        with open(lock_path, 'a+b') as lock_file:
+            waited = not self._try_lock(lock_file)
+            if waited and not self._lock_within(lock_file, self.wait):
+                # the other leader is taking too long; do the work without it
+                FLIGHTS.inc(flight=self.name, role='leader')
+                return fn(), False
+            try:
+                if waited:
+                    value = self._read_result(result_path, started)
+                    if value is not None:
+                        FLIGHTS.inc(flight=self.name, role='remote')
+                        return value[0], True
+                FLIGHTS.inc(flight=self.name, role='leader')
+                value = fn()
+                self._write_result(result_path, value)
+                return value, False
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self._sweep()
+
+    @staticmethod
+    def _try_lock(lock_file):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _lock_within(self, lock_file, timeout):
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while time.monotonic() < deadline:
+            if self._try_lock(lock_file):
+                return True
+            time.sleep(delay)
+            delay = min(delay * 2, 0.02)
+        return False
+
+    @staticmethod
+    def _read_result(result_path, since):
+        """
+        ``(value,)`` if a result was published at or after ``since``, else None.
+        """
+        try:
+            if os.path.getmtime(result_path) < since - 0.01:
+                return None
+            with open(result_path, 'rb') as f:
+                return (pickle.load(f),)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Could not read shared result {result_path}: {str(e)}")
+            return None
+
+    def _write_result(self, result_path, value):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, result_path)
+        except Exception as e:
+            logger.warning(f"Could not publish shared result {result_path}: {str(e)}")
+
+    def _sweep(self):
+        """
+        Remove expired files (at most once per RESULT_TTL per process).
+
+        A lock file removed while held only costs one duplicate computation.
+        """
+        now = time.time()
+        if now - self._last_sweep < RESULT_TTL:
+            return
+        self._last_sweep = now
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for entry in entries:
+            if not entry.name.endswith(('.result', '.lock', '.tmp')):
+                continue
+            try:
+                if now - entry.stat().st_mtime > RESULT_TTL:
+                    os.remove(entry.path)
+            except OSError:
+                pass
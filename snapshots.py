@@ -0,0 +1,92 @@
+# snapshots.py
+"""
+Materialized JSON snapshots of surveys.
+
+The body of ``GET /api/surveys/<id>`` is stored pre-serialized in the
+``survey_snapshot`` table, so reads return bytes without touching the
+question and option tables. Writers call ``refresh_snapshot`` inside their
+own transaction (after the survey row is flushed), so a snapshot commits or
+rolls back together with the change it reflects.
+
+Each snapshot records the survey version (``updated_at``, or ``created_at``
+for never-edited surveys) it was built from. A read only uses a snapshot
+whose version still matches the survey row; anything else (bulk imports,
+surveys created before this table existed, writes that bypassed the API) is
+rebuilt and stored on first read.
+"""
+
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import Survey, SurveySnapshot
+import fastjson
+from read_models import survey_detail
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_survey(survey_id):
+    """
+    JSON bytes for a survey and its questions, or None if it does not exist.
+
+    Returns:
+        tuple: ``(version, body)`` or None
+    """
+    detail = survey_detail(survey_id)
+    if detail is None:
+        return None
+    version, survey = detail
+    return version, fastjson.dumps(survey)
+
+
+def refresh_snapshot(survey_id):
+    """
+    Rebuild the stored snapshot of a survey in the current transaction.
+
+    Returns:
+        bytes: The new body, or None if the survey does not exist
+    """
+    delete_snapshot(survey_id)
+    serialized = serialize_survey(survey_id)
+    if serialized is None:
+        return None
+    version, body = serialized
+    db.session.execute(SurveySnapshot.__table__.insert().values(
+        survey_id=survey_id, version=version, body=body
+    ))
+    return body
+
+
+def delete_snapshot(survey_id):
+    db.session.execute(
+        SurveySnapshot.__table__.delete().where(SurveySnapshot.__table__.c.survey_id == survey_id)
+    )
+
+
+def get_snapshot(survey_id):
+    """
+    Current JSON body of a survey; builds and stores it if missing or stale.
+
+    Returns:
+        bytes: The body, or None if the survey does not exist
+    """
+    body = db.session.query(SurveySnapshot.body).join(
+        Survey, Survey.id == SurveySnapshot.survey_id
+    ).filter(
+        SurveySnapshot.survey_id == survey_id,
+        SurveySnapshot.version == func.coalesce(Survey.updated_at, Survey.created_at)
+    ).scalar()
+    if body is not None:
+        return body
+
+    body = refresh_snapshot(survey_id)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent read stored the same snapshot first
+        db.session.rollback()
+        logger.debug(f"Snapshot of survey {survey_id} was backfilled concurrently")
+    return body
@@ -29,6 +29,45 @@ const formatDate = (dateString) => {
   return date.toLocaleString();
 };
 
+// GET with ETag revalidation. The last response body per URL is kept in
+// sessionStorage (memory if unavailable), so a 304 reuses it across page loads.
+const etagMemory = {};
+
+const readEtagEntry = (url) => {
+  try {
+    const stored = sessionStorage.getItem(`etag:${url}`);
+    if (stored) return JSON.parse(stored);
+  } catch (e) {
+    // Storage disabled or full; fall back to memory
+  }
+  return etagMemory[url] || null;
+};
+
+const writeEtagEntry = (url, entry) => {
+  etagMemory[url] = entry;
+  try {
+    sessionStorage.setItem(`etag:${url}`, JSON.stringify(entry));
+  } catch (e) {
+    // Keep the in-memory copy only
+  }
+};
+
+const getWithEtag = async (url) => {
+  const cached = readEtagEntry(url);
+  const response = await axios.get(url, {
+    headers: cached ? { 'If-None-Match': cached.etag } : {},
+    validateStatus: status => (status >= 200 && status < 300) || (status === 304 && cached !== null)
+  });
+  if (response.status === 304) {
+    return cached.data;
+  }
+  const etag = response.headers.etag;
+  if (etag) {
+    writeEtagEntry(url, { etag, data: response.data });
+  }
+  return response.data;
+};
+
 // API service
 const SurveyService = {
   getAllSurveys: async () => {
@@ -43,8 +82,7 @@ const SurveyService = {
   
   getSurveyById: async (id) => {
     try {
-      const response = await axios.get(`/api/surveys/${id}`);
-      return response.data;
+      return await getWithEtag(`/api/surveys/${id}`);
     } catch (error) {
       console.error(`Error fetching survey ${id}:`, error);
       throw error;
@@ -53,14 +91,22 @@ const SurveyService = {
   
   compareSurveys: async (survey1Id, survey2Id) => {
     try {
-      const response = await axios.get(`/api/surveys/compare?survey1_id=${survey1Id}&survey2_id=${survey2Id}`);
-      return response.data;
+      return await getWithEtag(`/api/surveys/compare?survey1_id=${survey1Id}&survey2_id=${survey2Id}`);
     } catch (error) {
       console.error('Error comparing surveys:', error);
       throw error;
     }
   },
   
+  diffSurveys: async (survey1Id, survey2Id) => {
+    try {
+      return await getWithEtag(`/api/surveys/compare/diff?survey1_id=${survey1Id}&survey2_id=${survey2Id}`);
+    } catch (error) {
+      console.error('Error diffing surveys:', error);
+      throw error;
+    }
+  },
+  
   searchSurveyQuestions: async (surveyId, query, useNLP = true) => {
     try {
       // If query is empty, return all questions from the survey
@@ -69,12 +115,10 @@ const SurveyService = {
         return survey.questions;
       }
       
-      // Use the server-side search API with NLP
-      const response = await axios.get(`/api/search?q=${encodeURIComponent(query)}&use_nlp=${useNLP}`);
-      const searchResults = response.data;
-      
-      // Filter search results for this specific survey
-      const surveyResults = searchResults.filter(result => result.survey_id === surveyId);
+      // Scoped to this survey and grouped per question on the server
+      const params = new URLSearchParams({ q: query, use_nlp: useNLP, survey_id: surveyId, group: 'question' });
+      const response = await axios.get(`/api/search?${params}`);
+      const surveyResults = response.data;
       
       // If we got no results from the server or the server search failed, fall back to client-side search
       if (surveyResults.length === 0) {
@@ -93,7 +137,7 @@ const SurveyService = {
       }
       
       // Convert search results to question format
-      const questionResults = surveyResults.map(result => ({
+      return surveyResults.map(result => ({
         id: result.question_id,
         question_number: result.question_number,
         text: result.text,
@@ -101,17 +145,6 @@ const SurveyService = {
         // If the result has a similarity score, include it for potential highlighting
         similarity: result.similarity
       }));
-      
-      // Remove duplicates (same question might match multiple times)
-      const uniqueQuestions = questionResults.reduce((acc, current) => {
-        const isDuplicate = acc.find(item => item.id === current.id);
-        if (!isDuplicate) {
-          acc.push(current);
-        }
-        return acc;
-      }, []);
-      
-      return uniqueQuestions;
     } catch (error) {
       console.error('Error searching survey questions:', error);
       // Fall back to client-side search in case of error
@@ -177,6 +210,22 @@ const SurveySelector = ({ surveys, onSelectSurvey, selectedSurveyId }) => {
   );
 };
 
+// Probe NLP availability once per page; every SearchBar shares the result
+let nlpAvailablePromise = null;
+
+const checkNlpAvailable = () => {
+  if (!nlpAvailablePromise) {
+    // Make a small test query to see if NLP is working
+    nlpAvailablePromise = axios.get('/api/search?q=test&use_nlp=true&top_k=1')
+      .then(response => response.data.some(result => result.nlp_used === true))
+      .catch(error => {
+        console.error('Error checking NLP availability:', error);
+        return false;
+      });
+  }
+  return nlpAvailablePromise;
+};
+
 const SearchBar = ({ onSearch, placeholder }) => {
   const [query, setQuery] = React.useState('');
   const [useNLP, setUseNLP] = React.useState(true);
@@ -184,22 +233,8 @@ const SearchBar = ({ onSearch, placeholder }) => {
   
   // Check once if NLP is available
   React.useEffect(() => {
-    // Make a small test query to see if NLP is working
     if (nlpAvailable === null) {
-      const checkNlpAvailable = async () => {
-        try {
-          const response = await axios.get('/api/search?q=test&use_nlp=true');
-          const results = response.data;
-          // Check if any result has the nlp_used flag
-          const hasNlpResults = results.some(result => result.nlp_used === true);
-          setNlpAvailable(hasNlpResults);
-        } catch (error) {
-          console.error('Error checking NLP availability:', error);
-          setNlpAvailable(false);
-        }
-      };
-      
-      checkNlpAvailable();
+      checkNlpAvailable().then(setNlpAvailable);
     }
   }, [nlpAvailable]);
   
@@ -303,6 +338,16 @@ const SurveyComparisonPanel = React.forwardRef(({ surveys }, ref) => {
   const [survey2, setSurvey2] = React.useState(null);
   const [filteredQuestions1, setFilteredQuestions1] = React.useState(null);
   const [filteredQuestions2, setFilteredQuestions2] = React.useState(null);
+  const [diff, setDiff] = React.useState(null);
+  
+  // Server-side alignment summary whenever both surveys are selected
+  React.useEffect(() => {
+    setDiff(null);
+    if (!survey1Id || !survey2Id) return;
+    SurveyService.diffSurveys(survey1Id, survey2Id)
+      .then(setDiff)
+      .catch(() => setDiff(null));
+  }, [survey1Id, survey2Id]);
   
   const handleSelectSurvey1 = async (id) => {
     setSurvey1Id(id);
@@ -411,6 +456,15 @@ const SurveyComparisonPanel = React.forwardRef(({ surveys }, ref) => {
         </div>
       </div>
       
+      {diff && (
+        <div className="alert alert-info mb-4">
+          <strong>Differences:</strong>{' '}
+          {diff.added.length} added, {diff.removed.length} removed,{' '}
+          {diff.reworded.length} reworded, {diff.options_changed.length} with changed options,{' '}
+          {diff.unchanged} unchanged
+        </div>
+      )}
+      
       <div className="row">
         <div className="col-md-6">
           <div className="survey-panel card" style={{ minHeight: '600px', maxHeight: '80vh', overflowY: 'auto' }}>
@@ -32,10 +32,81 @@ const formatDate = (dateString) => {
   return date.toLocaleString();
 };
 
+// GET with ETag revalidation. The last response body per URL is kept in
+// sessionStorage (memory if unavailable), so a 304 reuses it across page loads.
+const etagMemory = {};
+
+const readEtagEntry = (url) => {
+  try {
+    const stored = sessionStorage.getItem(`etag:${url}`);
+    if (stored) return JSON.parse(stored);
+  } catch (e) {
+    // Storage disabled or full; fall back to memory
+  }
+  return etagMemory[url] || null;
+};
+
+const writeEtagEntry = (url, entry) => {
+  etagMemory[url] = entry;
+  try {
+    sessionStorage.setItem(`etag:${url}`, JSON.stringify(entry));
+  } catch (e) {
+    // Keep the in-memory copy only
+  }
+};
+
+const getWithEtag = async (url) => {
+  const cached = readEtagEntry(url);
+  const response = await axios.get(url, {
+    headers: cached ? { 'If-None-Match': cached.etag } : {},
+    validateStatus: status => (status >= 200 && status < 300) || (status === 304 && cached !== null)
+  });
+  if (response.status === 304) {
+    return cached.data;
+  }
+  const etag = response.headers.etag;
+  if (etag) {
+    writeEtagEntry(url, { etag, data: response.data });
+  }
+  return response.data;
+};
+
+// Read an application/x-ndjson response, calling onRows with all rows received so far
+const streamNdjson = async (url, onRows) => {
+  const response = await fetch(url, { headers: { Accept: 'application/x-ndjson' } });
+  if (!response.ok) {
+    throw new Error(`Request to ${url} failed with status ${response.status}`);
+  }
+  
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  const rows = [];
+  let buffer = '';
+  
+  while (true) {
+    const { done, value } = await reader.read();
+    buffer += done ? decoder.decode() : decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = done ? '' : lines.pop();
+    const received = lines.filter(line => line.trim()).map(line => JSON.parse(line));
+    if (received.length > 0) {
+      rows.push(...received);
+      if (onRows) onRows([...rows]);
+    }
+    if (done) break;
+  }
+  
+  return rows;
+};
+
 // API service
 const SurveyService = {
-  getAllSurveys: async () => {
+  getAllSurveys: async (onRows = null) => {
     try {
+      // Stream when the caller wants to render rows as they arrive
+      if (onRows) {
+        return await streamNdjson('/api/surveys', onRows);
+      }
       const response = await axios.get('/api/surveys');
       return response.data;
     } catch (error) {
@@ -46,8 +117,7 @@ const SurveyService = {
   
   getSurveyById: async (id) => {
     try {
-      const response = await axios.get(`/api/surveys/${id}`);
-      return response.data;
+      return await getWithEtag(`/api/surveys/${id}`);
     } catch (error) {
       console.error(`Error fetching survey ${id}:`, error);
       throw error;
@@ -86,17 +156,20 @@ const SurveyService = {
   
   compareSurveys: async (survey1Id, survey2Id) => {
     try {
-      const response = await axios.get(`/api/surveys/compare?survey1_id=${survey1Id}&survey2_id=${survey2Id}`);
-      return response.data;
+      return await getWithEtag(`/api/surveys/compare?survey1_id=${survey1Id}&survey2_id=${survey2Id}`);
     } catch (error) {
       console.error('Error comparing surveys:', error);
       throw error;
     }
   },
   
-  searchQuestions: async (query) => {
+  searchQuestions: async (query, onRows = null) => {
     try {
-      const response = await axios.get(`/api/search?q=${encodeURIComponent(query)}`);
+      const url = `/api/search?q=${encodeURIComponent(query)}`;
+      if (onRows) {
+        return await streamNdjson(url, onRows);
+      }
+      const response = await axios.get(url);
       return response.data;
     } catch (error) {
       console.error('Error searching questions:', error);
@@ -456,7 +529,7 @@ const App = () => {
   
   const loadSurveys = async () => {
     try {
-      const surveysData = await SurveyService.getAllSurveys();
+      const surveysData = await SurveyService.getAllSurveys(setSurveys);
       setSurveys(surveysData);
     } catch (error) {
       alert('Failed to load surveys. Please try again.');
@@ -562,7 +635,7 @@ const App = () => {
   
   const handleSearch = async (query) => {
     try {
-      const results = await SurveyService.searchQuestions(query);
+      const results = await SurveyService.searchQuestions(query, setSearchResults);
       setSearchResults(results);
     } catch (error) {
       alert('Failed to perform search. Please try again.');
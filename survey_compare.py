@@ -0,0 +1,169 @@
+# survey_compare.py
+"""
+Server-side question alignment between two surveys.
+
+Questions are matched in three passes, each only over questions the
+previous passes left unmatched:
+
+    1. identical question_number
+    2. identical normalized text (case, whitespace and punctuation ignored)
+    3. stored embeddings of the current model and text, when both questions
+       have one (cosine similarity at least EMBEDDING_MATCH_THRESHOLD, best
+       pairs first)
+
+The result is a compact diff (added, removed, reworded, options changed)
+instead of both full surveys. Diffs are cached per (survey1_id,
+survey2_id) and the pair of last-modified times, so repeat comparisons of
+unchanged surveys cost one timestamp lookup.
+"""
+
+import os
+import re
+
+import numpy as np
+
+from cache import TTLCache
+from db import db
+import metrics
+from models import Embedding
+import nlp_search
+from read_models import last_modified, survey_questions
+
+EMBEDDING_MATCH_THRESHOLD = float(os.environ.get("COMPARE_EMBEDDING_THRESHOLD", "0.85"))
+
+comparison_cache = TTLCache(
+    maxsize=int(os.environ.get("COMPARE_CACHE_SIZE", "256")),
+    ttl=int(os.environ.get("COMPARE_CACHE_TTL", "86400"))
+)
+metrics.register_cache('comparison', comparison_cache)
+
+
+def normalize_text(value):
+    """
+    Lower-case ``value`` and reduce it to single-spaced word characters.
+    """
+    return ' '.join(re.findall(r'\w+', (value or '').lower()))
+
+
+def _match_on(left, right, pairs, key, matched_by):
+    """
+    Pair unmatched questions whose ``key`` is equal, in order of appearance.
+    """
+    taken = {j for _, j, _ in pairs}
+    waiting = {}
+    for j, question in enumerate(right):
+        if j not in taken and key(question):
+            waiting.setdefault(key(question), []).append(j)
+    done = {i for i, _, _ in pairs}
+    for i, question in enumerate(left):
+        candidates = waiting.get(key(question)) if i not in done and key(question) else None
+        if candidates:
+            pairs.append((i, candidates.pop(0), {'matched_by': matched_by}))
+
+
+def _match_on_embeddings(left, right, pairs):
+    done_left = {i for i, _, _ in pairs}
+    done_right = {j for _, j, _ in pairs}
+    left_ids = [q['id'] for i, q in enumerate(left) if i not in done_left]
+    right_ids = [q['id'] for j, q in enumerate(right) if j not in done_right]
+    if not left_ids or not right_ids:
+        return
+
+    # only current embeddings of the current model; others may differ in
+    # dimensions and are not comparable anyway
+    texts = {q['id']: q['text'] for q in left + right}
+    vectors = {
+        entity_id: vector
+        for entity_id, digest, vector in db.session.query(
+            Embedding.entity_id, Embedding.text_hash, Embedding.vector
+        ).filter(
+            Embedding.entity_type == 'question',
+            Embedding.model_name == nlp_search.MODEL_NAME,
+            Embedding.entity_id.in_(left_ids + right_ids)
+        )
+        if digest == nlp_search.text_hash(texts[entity_id])
+    }
+    left_rows = [(i, q) for i, q in enumerate(left) if i not in done_left and q['id'] in vectors]
+    right_rows = [(j, q) for j, q in enumerate(right) if j not in done_right and q['id'] in vectors]
+    if not left_rows or not right_rows:
+        return
+
+    def unit(rows):
+        matrix = np.vstack([np.frombuffer(vectors[q['id']], dtype=np.float32) for _, q in rows])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    similarity = unit(left_rows) @ unit(right_rows).T
+    # Greedy: best remaining pair first
+    order = np.argsort(-similarity, axis=None)
+    used_left, used_right = set(), set()
+    for flat in order:
+        a, b = divmod(int(flat), similarity.shape[1])
+        score = float(similarity[a, b])
+        if score < EMBEDDING_MATCH_THRESHOLD:
+            break
+        if a in used_left or b in used_right:
+            continue
+        used_left.add(a)
+        used_right.add(b)
+        pairs.append((left_rows[a][0], right_rows[b][0], {'matched_by': 'embedding', 'similarity': score}))
+
+
+def _brief(question):
+    return {'question_number': question['question_number'], 'text': question['text']}
+
+
+def diff_questions(left, right):
+    """
+    Align two question lists and summarize the differences.
+    """
+    pairs = []
+    _match_on(left, right, pairs, lambda q: q['question_number'], 'question_number')
+    _match_on(left, right, pairs, lambda q: normalize_text(q['text']), 'text')
+    _match_on_embeddings(left, right, pairs)
+    pairs.sort(key=lambda pair: pair[1])
+
+    matched_left = {i for i, _, _ in pairs}
+    matched_right = {j for _, j, _ in pairs}
+    diff = {
+        'added': [_brief(q) for j, q in enumerate(right) if j not in matched_right],
+        'removed': [_brief(q) for i, q in enumerate(left) if i not in matched_left],
+        'reworded': [],
+        'options_changed': [],
+        'unchanged': 0
+    }
+
+    for i, j, match in pairs:
+        old, new = left[i], right[j]
+        changed = False
+        if normalize_text(old['text']) != normalize_text(new['text']):
+            diff['reworded'].append(dict(match, survey1=_brief(old), survey2=_brief(new)))
+            changed = True
+        if old['options'] != new['options']:
+            old_options, new_options = set(old['options']), set(new['options'])
+            diff['options_changed'].append({
+                'survey1': _brief(old),
+                'survey2': _brief(new),
+                'added_options': [o for o in new['options'] if o not in old_options],
+                'removed_options': [o for o in old['options'] if o not in new_options],
+                'reordered': old_options == new_options
+            })
+            changed = True
+        if not changed:
+            diff['unchanged'] += 1
+
+    return diff
+
+
+def compare_surveys(survey1, survey2):
+    """
+    Cached question-level diff between two surveys.
+    """
+    key = (survey1.id, survey2.id, last_modified(survey1), last_modified(survey2))
+    diff = comparison_cache.get(key)
+    if diff is None:
+        diff = diff_questions(survey_questions(survey1.id), survey_questions(survey2.id))
+        diff = dict(diff, survey1_id=survey1.id, survey2_id=survey2.id)
+        comparison_cache.set(key, diff)
+    return diff
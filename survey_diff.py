@@ -0,0 +1,175 @@
+# survey_diff.py
+"""
+Incremental survey updates.
+
+Instead of deleting every question and option of a survey and inserting
+the new payload, the stored rows are aligned with the payload and only the
+INSERT/UPDATE/DELETE statements needed to make them match are issued, so
+unchanged rows keep their ids.
+
+Question and option order is id order, so alignment must never put a new
+(higher) id in front of a kept row. Where an insertion lands in the middle,
+the rows after it are reused positionally (UPDATEs) instead.
+"""
+
+from difflib import SequenceMatcher
+
+from sqlalchemy import bindparam
+
+from db import db
+from models import Question, Option
+from bulk_import import allocate_ids
+
+
+def align(old_keys, new_keys):
+    """
+    Match stored rows to payload rows.
+
+    Args:
+        old_keys (list): Comparable keys of the stored rows, in id order
+        new_keys (list): Keys of the payload rows, in payload order
+
+    Returns:
+        tuple: ``(pairs, deleted)``; ``pairs`` lists ``(old_index, new_index)``
+        for every payload row in order (``old_index`` is None for rows to
+        insert) and ``deleted`` lists stored indexes to delete
+    """
+    pairs = []
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        # Equal runs and replaced runs are both reused position by position
+        for offset in range(max(i2 - i1, j2 - j1)):
+            old_index = i1 + offset if i1 + offset < i2 else None
+            new_index = j1 + offset if j1 + offset < j2 else None
+            if new_index is not None:
+                pairs.append((old_index, new_index))
+
+    # The first insertion that is followed by a kept row would sort after it;
+    # from there on reuse the remaining stored rows in order.
+    first_insert = next((p for p, (old_index, _) in enumerate(pairs) if old_index is None), None)
+    if first_insert is not None and any(old_index is not None for old_index, _ in pairs[first_insert:]):
+        kept_before = [old_index for old_index, _ in pairs[:first_insert]]
+        free = list(range(max(kept_before) + 1 if kept_before else 0, len(old_keys)))
+        tail = pairs[first_insert:]
+        pairs = pairs[:first_insert] + [
+            (free[k] if k < len(free) else None, new_index)
+            for k, (_, new_index) in enumerate(tail)
+        ]
+
+    kept = {old_index for old_index, _ in pairs if old_index is not None}
+    deleted = [i for i in range(len(old_keys)) if i not in kept]
+    return pairs, deleted
+
+
+def apply_survey_diff(survey_id, questions):
+    """
+    Make the stored questions/options of a survey match ``questions``.
+
+    Args:
+        survey_id (int): Survey to update
+        questions (list): Payload question dicts (question_number, text, options)
+
+    Returns:
+        dict: Number of question and option rows inserted, updated and deleted
+    """
+    touched = {'inserted': 0, 'updated': 0, 'deleted': 0}
+    new_questions = [
+        {
+            'question_number': q.get('question_number', ''),
+            'text': q.get('text', ''),
+            'options': list(q.get('options', []))
+        }
+        for q in questions
+    ]
+
+    old_questions = db.session.query(
+        Question.id, Question.question_number, Question.text
+    ).filter(Question.survey_id == survey_id).order_by(Question.id).all()
+    old_options = {q.id: [] for q in old_questions}
+    if old_questions:
+        for option_id, question_id, option_text in db.session.query(
+                Option.id, Option.question_id, Option.text).join(Question).filter(
+                Question.survey_id == survey_id).order_by(Option.id):
+            old_options[question_id].append((option_id, option_text))
+
+    pairs, deleted = align(
+        [(q.question_number, q.text) for q in old_questions],
+        [(q['question_number'], q['text']) for q in new_questions]
+    )
+
+    # Deleted questions, and their options (no ORM cascade on Core deletes)
+    deleted_ids = [old_questions[i].id for i in deleted]
+    if deleted_ids:
+        touched['deleted'] += db.session.query(Option).filter(
+            Option.question_id.in_(deleted_ids)).delete(synchronize_session=False)
+        touched['deleted'] += db.session.query(Question).filter(
+            Question.id.in_(deleted_ids)).delete(synchronize_session=False)
+
+    question_updates = []
+    option_changes = []   # (question_id, stored options, new option texts)
+    inserts = []
+    for old_index, new_index in pairs:
+        new = new_questions[new_index]
+        if old_index is None:
+            inserts.append(new)
+            continue
+        old = old_questions[old_index]
+        if (old.question_number, old.text) != (new['question_number'], new['text']):
+            question_updates.append({
+                'b_id': old.id, 'question_number': new['question_number'], 'text': new['text']
+            })
+        option_changes.append((old.id, old_options[old.id], new['options']))
+
+    if question_updates:
+        db.session.execute(
+            Question.__table__.update().where(Question.__table__.c.id == bindparam('b_id')),
+            question_updates
+        )
+        touched['updated'] += len(question_updates)
+
+    question_ids = allocate_ids(Question.__table__, len(inserts))
+    if inserts:
+        db.session.execute(Question.__table__.insert(), [
+            {
+                'id': question_id,
+                'survey_id': survey_id,
+                'question_number': q['question_number'],
+                'text': q['text']
+            }
+            for question_id, q in zip(question_ids, inserts)
+        ])
+        touched['inserted'] += len(inserts)
+    option_changes.extend((question_id, [], q['options']) for question_id, q in zip(question_ids, inserts))
+
+    _apply_option_changes(option_changes, touched)
+    return touched
+
+
+def _apply_option_changes(changes, touched):
+    updates, inserts, deleted_ids = [], [], []
+    for question_id, stored, new_texts in changes:
+        if [option_text for _, option_text in stored] == new_texts:
+            continue
+        pairs, deleted = align([option_text for _, option_text in stored], new_texts)
+        deleted_ids.extend(stored[i][0] for i in deleted)
+        for old_index, new_index in pairs:
+            if old_index is None:
+                inserts.append({'question_id': question_id, 'text': new_texts[new_index]})
+            elif stored[old_index][1] != new_texts[new_index]:
+                updates.append({'b_id': stored[old_index][0], 'text': new_texts[new_index]})
+
+    if deleted_ids:
+        for start in range(0, len(deleted_ids), 500):
+            touched['deleted'] += db.session.query(Option).filter(
+                Option.id.in_(deleted_ids[start:start + 500])).delete(synchronize_session=False)
+    if updates:
+        db.session.execute(
+            Option.__table__.update().where(Option.__table__.c.id == bindparam('b_id')),
+            updates
+        )
+        touched['updated'] += len(updates)
+    if inserts:
+        for option_id, row in zip(allocate_ids(Option.__table__, len(inserts)), inserts):
+            row['id'] = option_id
+        db.session.execute(Option.__table__.insert(), inserts)
+        touched['inserted'] += len(inserts)
@@ -0,0 +1,48 @@
+# tests/conftest.py
+"""
+Shared fixtures: the app on a throwaway SQLite database, emptied per test.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# configured before the app module is imported, since it reads them at import time
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="survey-tests-"), "test.db")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["LAZY_STARTUP"] = "false"
+os.environ["NLP_WARMUP"] = "false"
+
+from app import app as flask_app  # noqa: E402
+from db import db  # noqa: E402
+import nlp_search  # noqa: E402
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # keep tests independent of any installed model
+    monkeypatch.setattr(nlp_search, "request_sync", lambda app=None: None)
+    with flask_app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_survey(client):
+    def make(questions, name="Survey"):
+        response = client.post('/api/surveys', json={'name': name, 'questions': questions})
+        assert response.status_code == 201
+        return response.get_json()['id']
+    return make
@@ -0,0 +1,48 @@
+# tests/test_conditional.py
+"""
+Conditional GET of surveys: ETag and If-Modified-Since revalidation.
+"""
+
+from datetime import datetime
+
+from db import db
+from models import Survey
+
+
+def set_last_modified(app, survey_id, value):
+    with app.app_context():
+        db.session.execute(Survey.__table__.update().where(Survey.__table__.c.id == survey_id).values(
+            created_at=value, updated_at=value))
+        db.session.commit()
+
+
+def test_etag_revalidation(client, make_survey):
+    survey_id = make_survey([])
+    first = client.get(f'/api/surveys/{survey_id}')
+
+    assert client.get(f'/api/surveys/{survey_id}', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    client.put(f'/api/surveys/{survey_id}', json={'name': 'Renamed'})
+    again = client.get(f'/api/surveys/{survey_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 200
+    assert again.get_json()['name'] == 'Renamed'
+
+
+def test_if_modified_since_on_whole_second(app, client, make_survey):
+    survey_id = make_survey([])
+    set_last_modified(app, survey_id, datetime(2024, 5, 1, 12, 0, 0))
+    first = client.get(f'/api/surveys/{survey_id}')
+
+    response = client.get(f'/api/surveys/{survey_id}', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 304
+
+
+def test_if_modified_since_ignored_within_a_second(app, client, make_survey):
+    survey_id = make_survey([])
+    set_last_modified(app, survey_id, datetime(2024, 5, 1, 12, 0, 0, 300000))
+    first = client.get(f'/api/surveys/{survey_id}')
+
+    # a later edit in the same second has the same Last-Modified
+    set_last_modified(app, survey_id, datetime(2024, 5, 1, 12, 0, 0, 700000))
+    response = client.get(f'/api/surveys/{survey_id}', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 200
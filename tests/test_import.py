@@ -0,0 +1,47 @@
+# tests/test_import.py
+"""
+POST /api/surveys/import: malformed files are rejected with 400.
+"""
+
+import io
+
+import pytest
+
+
+def upload(client, filename, content):
+    return client.post('/api/surveys/import', data={'file': (io.BytesIO(content), filename)},
+                       content_type='multipart/form-data')
+
+
+@pytest.mark.parametrize('filename, content', [
+    ('s.json', b'[1, 2]'),
+    ('s.json', b'"questions"'),
+    ('s.json', b'{"questions": {"text": "x"}}'),
+    ('s.json', b'{"questions": [{"text": "x", "options": 3}]}'),
+    ('s.json', b'\xff\xfe{}'),
+    ('s.jsonl', b'{"text": "x"}\n[1]\n'),
+    ('s.jsonl', b'{"text": "x"}\n\xff\xfe\n'),
+    ('s.csv', b'\xff\xfequestion_number,text\n1,x\n'),
+    ('s.csv', b'question_number,text\n1,x\n2,\xff\n'),
+])
+def test_malformed_file(client, filename, content):
+    response = upload(client, filename, content)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_failed_import_writes_nothing(client):
+    assert upload(client, 's.jsonl', b'{"text": "x"}\n[1]\n').status_code == 400
+    assert client.get('/api/surveys').get_json() == []
+
+
+@pytest.mark.parametrize('filename, content', [
+    ('s.json', b'{"name": "Named", "questions": [{"question_number": "1", "text": "A", "options": ["y", "n"]}]}'),
+    ('s.jsonl', b'{"question_number": "1", "text": "A", "options": ["y", "n"]}\n'),
+    ('s.csv', b'question_number,text,options\n1,A,y|n\n'),
+])
+def test_import(client, filename, content):
+    response = upload(client, filename, content)
+    assert response.status_code == 201
+    survey = client.get(f"/api/surveys/{response.get_json()['id']}").get_json()
+    assert [(q['question_number'], q['text'], q['options']) for q in survey['questions']] == [('1', 'A', ['y', 'n'])]
@@ -0,0 +1,43 @@
+# tests/test_pagination.py
+"""
+Keyset pagination of GET /api/surveys, as JSON and as NDJSON.
+"""
+
+import json
+
+import pytest
+
+
+def pages(client, fmt, limit):
+    """Follow X-Next-Cursor from the first page; returns the ids of each page."""
+    seen = []
+    url = f'/api/surveys?limit={limit}&format={fmt}'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        if fmt == 'ndjson':
+            rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        else:
+            rows = response.get_json()
+        seen.append([row['id'] for row in rows])
+        cursor = response.headers.get('X-Next-Cursor')
+        url = cursor and f'/api/surveys?limit={limit}&format={fmt}&after={cursor}'
+    return seen
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson'])
+@pytest.mark.parametrize('limit', [1, 2, 5, 6])
+def test_follow_cursor(make_survey, client, fmt, limit):
+    ids = [make_survey([], name=f'S{n}') for n in range(5)]
+
+    seen = pages(client, fmt, limit)
+
+    assert [survey_id for page in seen for survey_id in page] == ids
+    assert all(len(page) == limit for page in seen[:-1])
+    assert 0 < len(seen[-1]) <= limit
+
+
+def test_no_cursor_without_limit(make_survey, client):
+    make_survey([])
+    response = client.get('/api/surveys?format=ndjson')
+    assert 'X-Next-Cursor' not in response.headers
@@ -0,0 +1,115 @@
+# tests/test_survey_diff.py
+"""
+Minimal-diff survey updates (PUT /api/surveys/<id>).
+
+Reads list questions in id order, so whatever ``align`` reuses, a PUT must
+read back exactly as sent.
+"""
+
+import pytest
+
+from survey_diff import align
+
+
+def question(number, text, options=()):
+    return {'question_number': number, 'text': text, 'options': list(options)}
+
+
+def read_back(client, survey_id):
+    body = client.get(f'/api/surveys/{survey_id}').get_json()
+    return [
+        {'question_number': q['question_number'], 'text': q['text'], 'options': q['options']}
+        for q in body['questions']
+    ], [q['id'] for q in body['questions']]
+
+
+def put(client, survey_id, questions):
+    response = client.put(f'/api/surveys/{survey_id}', json={'questions': questions})
+    assert response.status_code == 200
+    return response.get_json()['rows_touched']
+
+
+def assert_id_order_kept(pairs, deleted, old_count, new_count):
+    # every payload row once, in payload order
+    assert [new_index for _, new_index in pairs] == list(range(new_count))
+    reused = [old_index for old_index, _ in pairs if old_index is not None]
+    # reused rows keep payload order, and inserts (new, higher ids) come last
+    assert reused == sorted(reused)
+    first_insert = next((p for p, (old_index, _) in enumerate(pairs) if old_index is None), len(pairs))
+    assert all(old_index is None for old_index, _ in pairs[first_insert:])
+    assert sorted(reused + deleted) == list(range(old_count))
+
+
+@pytest.mark.parametrize('old, new', [
+    (['a', 'b', 'c'], ['a', 'x', 'b', 'c']),          # insert mid-list
+    (['a', 'b', 'c'], ['x', 'a', 'b', 'c']),          # insert at the front
+    (['a', 'b', 'c'], ['c', 'a', 'b']),               # reorder
+    (['a', 'b', 'c', 'd'], ['d', 'c', 'b', 'a']),     # reverse
+    (['a', 'b', 'c'], ['a', 'c']),                    # delete
+    (['a', 'c'], ['a', 'b', 'c']),                    # re-add
+    (['a', 'b', 'c'], ['a', 'b', 'c', 'd']),          # append
+    ([], ['a', 'b']),
+    (['a', 'b'], []),
+])
+def test_align_keeps_id_order(old, new):
+    pairs, deleted = align(old, new)
+    assert_id_order_kept(pairs, deleted, len(old), len(new))
+
+
+def test_align_reuses_unchanged_prefix():
+    pairs, deleted = align(['a', 'b', 'c'], ['a', 'b', 'c', 'd'])
+    assert pairs == [(0, 0), (1, 1), (2, 2), (None, 3)]
+    assert deleted == []
+
+
+def test_insert_mid_list(client, make_survey):
+    survey_id = make_survey([question('1', 'A', ['y', 'n']), question('2', 'B'), question('3', 'C', ['x'])])
+    _, old_ids = read_back(client, survey_id)
+    payload = [question('1', 'A', ['y', 'n']), question('1b', 'New'), question('2', 'B'), question('3', 'C', ['x'])]
+
+    put(client, survey_id, payload)
+
+    questions, ids = read_back(client, survey_id)
+    assert questions == payload
+    # the rows after the insertion are reused in place; only the last is new
+    assert ids[:3] == old_ids and ids == sorted(ids)
+
+
+def test_reorder(client, make_survey):
+    payload = [question('1', 'A', ['a1']), question('2', 'B', ['b1', 'b2']), question('3', 'C')]
+    survey_id = make_survey(payload)
+
+    reordered = [payload[2], payload[0], payload[1]]
+    put(client, survey_id, reordered)
+
+    questions, ids = read_back(client, survey_id)
+    assert questions == reordered
+    assert ids == sorted(ids)
+
+
+def test_delete_and_re_add(client, make_survey):
+    payload = [question('1', 'A', ['a1']), question('2', 'B', ['b1', 'b2']), question('3', 'C', ['c1'])]
+    survey_id = make_survey(payload)
+
+    put(client, survey_id, [payload[0], payload[2]])
+    assert read_back(client, survey_id)[0] == [payload[0], payload[2]]
+
+    put(client, survey_id, payload)
+    questions, ids = read_back(client, survey_id)
+    assert questions == payload
+    assert ids == sorted(ids)
+
+
+def test_unchanged_put_touches_nothing(client, make_survey):
+    payload = [question('1', 'A', ['a1', 'a2']), question('2', 'B')]
+    survey_id = make_survey(payload)
+
+    assert put(client, survey_id, payload) == {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+
+def test_option_insert_mid_list(client, make_survey):
+    survey_id = make_survey([question('1', 'A', ['a', 'c'])])
+
+    put(client, survey_id, [question('1', 'A', ['a', 'b', 'c'])])
+
+    assert read_back(client, survey_id)[0] == [question('1', 'A', ['a', 'b', 'c'])]
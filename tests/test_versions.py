@@ -0,0 +1,79 @@
+# tests/test_versions.py
+"""
+Version history: replaying keyframes and deltas gives back each stored state.
+"""
+
+import pytest
+
+import versions
+from read_models import survey_detail
+
+
+def question(number, text, options=()):
+    return {'question_number': number, 'text': text, 'options': list(options)}
+
+
+BASE = [question(str(n), f'Question {n}', [f'{n}a', f'{n}b', f'{n}c']) for n in range(1, 13)]
+
+
+def edits():
+    """Successive payloads: edits, insert mid-list, reorder, delete and re-add."""
+    payload = list(BASE)
+    payload[0] = question('1', 'Question 1, reworded', BASE[0]['options'])
+    yield list(payload)
+    payload.insert(4, question('4b', 'Inserted', ['yes', 'no']))
+    yield list(payload)
+    payload[7], payload[8] = payload[8], payload[7]
+    yield list(payload)
+    removed = payload.pop(10)
+    yield list(payload)
+    payload.append(removed)
+    yield list(payload)
+    payload[2] = question('3', 'Question 3', ['3a', '3c'])
+    yield list(payload)
+    payload = payload[:-1]
+    yield list(payload)
+
+
+@pytest.fixture
+def history(app, client, make_survey, monkeypatch):
+    monkeypatch.setattr(versions, 'KEYFRAME_INTERVAL', 3)
+    survey_id = make_survey(BASE)
+    states = {}
+    with app.app_context():
+        states[1] = survey_detail(survey_id)[1]
+    for version, payload in enumerate(edits(), start=2):
+        response = client.put(f'/api/surveys/{survey_id}', json={'questions': payload})
+        assert response.status_code == 200
+        with app.app_context():
+            states[version] = survey_detail(survey_id)[1]
+    return survey_id, states
+
+
+def test_reconstruct_matches_every_version(app, history):
+    survey_id, states = history
+    with app.app_context():
+        for version, state in states.items():
+            assert versions.reconstruct(survey_id, version) == state
+        assert versions.reconstruct(survey_id, len(states) + 1) is None
+
+
+def test_replay_crosses_keyframes(app, history):
+    survey_id, states = history
+    with app.app_context():
+        found = versions.list_versions(survey_id)
+    assert [v['version'] for v in found] == list(states)
+    keyframes = [v['version'] for v in found if v['keyframe']]
+    assert keyframes[0] == 1 and len(keyframes) > 1
+    assert any(not v['keyframe'] for v in found)
+    # never more than KEYFRAME_INTERVAL - 1 deltas after a keyframe
+    assert all(b - a <= 3 for a, b in zip(keyframes, keyframes[1:] + [len(states) + 1]))
+
+
+def test_version_endpoint(client, history):
+    survey_id, states = history
+    for version, state in states.items():
+        response = client.get(f'/api/surveys/{survey_id}/versions/{version}')
+        assert response.status_code == 200
+        assert response.get_json() == state
+    assert client.get(f'/api/surveys/{survey_id}/versions/{len(states) + 1}').status_code == 404
@@ -0,0 +1,295 @@
+# vector_file.py
+"""
+Compact, memory-mappable embedding file.
+
+Layout of ``<path>`` (all integers little-endian, sections 64-byte aligned):
+
+    0    header (64 bytes): magic b"SVEC", version, dtype code, dim, count,
+         data offset, scales offset, index offset, lookup offset, model
+         name length
+    64   name of the model that produced the vectors (UTF-8)
+    ...  ``count * dim`` vector components (float16, or int8), one row per vector
+    ...  int8 files only: ``count`` float32 per-row scales
+    ...  ``count`` packed index records (``kind``, ``entity_id``, ``text_hash``)
+    ...  ``count`` int64 key codes (``kind << 56 | entity_id``), ascending,
+         followed by the ``count`` int64 row numbers they belong to
+
+Row ``i`` starts at byte ``data_offset + i * dim * itemsize``. Everything
+lives in the one file, so replacing it is a single atomic rename. Sections
+are opened with ``np.memmap``, so every worker shares the same page cache
+and nothing is copied until rows are scored; keys are found by binary
+search over the sorted codes, without building a per-process map.
+
+Vectors are unit-normalized before they are written, so scores are cosine
+similarities.
+"""
+
+import heapq
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"SVEC"
+VERSION = 3
+ALIGNMENT = 64
+
+DTYPES = {'float16': (1, np.float16), 'int8': (2, np.int8)}
+_DTYPE_NAMES = {code: name for name, (code, _) in DTYPES.items()}
+
+# magic, version, dtype code, dim, count, data offset, scales offset,
+# index offset, lookup offset, model name length
+_HEADER = struct.Struct("<4sHHIQQQQQH")
+
+KINDS = ('question', 'option')
+INDEX_DTYPE = np.dtype([('kind', 'u1'), ('entity_id', '<i8'), ('text_hash', 'S40')])
+_KIND_SHIFT = 56
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def key_codes(keys):
+    """
+    int64 codes of (kind, entity_id) keys, ordered like the keys themselves.
+    """
+    return np.fromiter(
+        ((KINDS.index(kind) << _KIND_SHIFT) | entity_id for kind, entity_id in keys), dtype=np.int64
+    )
+
+
+class VectorFileWriter:
+    """
+    Streams unit-normalized vectors into a new vector file.
+
+    The file is written under a temporary name and moved into place on
+    ``close()``, so readers never see a partial file.
+
+    Args:
+        path (str): Destination path
+        dim (int): Vector dimensions
+        dtype (str): Component type, one of DTYPES
+        model_name (str): Model that produced the vectors, stored in the file
+    """
+
+    def __init__(self, path, dim, dtype='int8', model_name=''):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype!r}; expected one of {', '.join(DTYPES)}")
+        self.path = path
+        self.dim = dim
+        self.dtype = dtype
+        self._model_name = model_name.encode('utf-8')
+        self._data_offset = _align(ALIGNMENT + len(self._model_name))
+        self._tmp_path = path + ".tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(b"\0" * ALIGNMENT + self._model_name)
+        self._file.write(b"\0" * (self._data_offset - ALIGNMENT - len(self._model_name)))
+        self._count = 0
+        self._scales = []
+        self._index = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.unlink(self._tmp_path)
+
+    def write(self, keys, hashes, vectors):
+        """
+        Append rows; ``keys`` are (kind, entity_id) pairs aligned with ``vectors``.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+
+        if self.dtype == 'int8':
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            data = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales.append(scales.astype(np.float32))
+        else:
+            data = vectors.astype(np.float16)
+
+        self._file.write(data.tobytes())
+        for (kind, entity_id), digest in zip(keys, hashes):
+            self._index.append((KINDS.index(kind), entity_id, digest))
+        self._count += len(vectors)
+
+    def close(self):
+        code, np_dtype = DTYPES[self.dtype]
+        data_offset = self._data_offset
+        scales_offset = 0
+        end = data_offset + self._count * self.dim * np.dtype(np_dtype).itemsize
+
+        if self.dtype == 'int8':
+            scales_offset = _align(end)
+            self._file.write(b"\0" * (scales_offset - end))
+            if self._scales:
+                self._file.write(np.concatenate(self._scales).tobytes())
+            end = scales_offset + self._count * 4
+
+        index_offset = _align(end)
+        self._file.write(b"\0" * (index_offset - end))
+        index = np.array(self._index, dtype=INDEX_DTYPE)
+        self._file.write(index.tobytes())
+        end = index_offset + index.nbytes
+
+        lookup_offset = _align(end)
+        self._file.write(b"\0" * (lookup_offset - end))
+        codes = (index['kind'].astype(np.int64) << _KIND_SHIFT) | index['entity_id']
+        order = np.argsort(codes, kind='stable')
+        self._file.write(codes[order].tobytes())
+        self._file.write(order.astype(np.int64).tobytes())
+
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(
+            MAGIC, VERSION, code, self.dim, self._count, data_offset, scales_offset,
+            index_offset, lookup_offset, len(self._model_name)
+        ))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+
+class VectorFile:
+    """
+    Read-only, zero-copy view of a vector file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(ALIGNMENT)
+            if len(header) < _HEADER.size or header[:4] != MAGIC:
+                raise ValueError(f"{path} is not a vector file")
+            (magic, version, code, dim, count, data_offset, scales_offset,
+             index_offset, lookup_offset, name_length) = _HEADER.unpack_from(header)
+            if version != VERSION:
+                raise ValueError(f"{path} is a version {version} vector file; "
+                                 f"re-export it (version {VERSION} expected)")
+            f.seek(ALIGNMENT)
+            self.model_name = f.read(name_length).decode('utf-8')
+
+        self.dim = dim
+        self.dtype = _DTYPE_NAMES[code]
+
+        np_dtype = DTYPES[self.dtype][1]
+        if count:
+            self.index = np.memmap(path, dtype=INDEX_DTYPE, mode='r', offset=index_offset, shape=(count,))
+            self.vectors = np.memmap(path, dtype=np_dtype, mode='r', offset=data_offset, shape=(count, dim))
+            self.scales = (
+                np.memmap(path, dtype=np.float32, mode='r', offset=scales_offset, shape=(count,))
+                if self.dtype == 'int8' else None
+            )
+            lookup = np.memmap(path, dtype=np.int64, mode='r', offset=lookup_offset, shape=(2, count))
+            self._sorted_codes, self._sorted_rows = lookup[0], lookup[1]
+        else:
+            self.index = np.zeros(0, dtype=INDEX_DTYPE)
+            self.vectors = np.zeros((0, dim), dtype=np_dtype)
+            self.scales = np.zeros(0, dtype=np.float32) if self.dtype == 'int8' else None
+            self._sorted_codes = self._sorted_rows = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.index)
+
+    def key(self, row):
+        record = self.index[row]
+        return (KINDS[record['kind']], int(record['entity_id']))
+
+    def lookup(self, codes):
+        """
+        Row number of each key code (see ``key_codes``), -1 where it is not in the file.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(len(codes), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._sorted_codes, codes), len(self) - 1)
+        found = self._sorted_codes[positions] == codes
+        return np.where(found, self._sorted_rows[positions], -1)
+
+    def row(self, key):
+        """
+        Row number of ``key``, or None if it is not in the file.
+        """
+        row = int(self.lookup(key_codes([key]))[0])
+        return None if row < 0 else row
+
+    def rows(self, keys):
+        """
+        Row numbers of the given keys that are in the file, ascending.
+        """
+        rows = self.lookup(key_codes(keys))
+        return np.sort(rows[rows >= 0])
+
+    def scores(self, query, start=0, stop=None):
+        """
+        Cosine similarity of ``query`` against rows ``start:stop``.
+        """
+        block = self.vectors[start:stop]
+        scores = block.astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales[start:stop]
+        return scores
+
+    def row_scores(self, query, rows):
+        """
+        Cosine similarity of ``query`` against the given (ascending) rows.
+        """
+        scores = self.vectors[rows].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales[rows]
+        return scores
+
+    def search(self, query, top_k=10, threshold=None, mask=None, rows=None, chunk_rows=65536):
+        """
+        Exact top-k scan of the mapped rows, ``chunk_rows`` at a time.
+
+        Args:
+            query: Query vector (normalized internally)
+            top_k (int): Maximum number of results
+            threshold (float): Optional minimum score
+            mask (np.ndarray): Optional boolean array; False rows are skipped
+            rows (np.ndarray): Optional ascending row numbers; only these are
+                read and scored
+
+        Returns:
+            list: ``(key, score)`` pairs, best first
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0 or top_k <= 0:
+            return []
+        query = query / norm
+
+        heap = []
+        for start in range(0, len(self) if rows is None else len(rows), chunk_rows):
+            if rows is None:
+                scores = self.scores(query, start, start + chunk_rows)
+                chunk = np.arange(start, start + len(scores))
+            else:
+                chunk = rows[start:start + chunk_rows]
+                scores = self.row_scores(query, chunk)
+            keep = np.ones(len(scores), dtype=bool)
+            if threshold is not None:
+                keep &= scores >= threshold
+            if mask is not None:
+                keep &= mask[chunk]
+            chunk, scores = chunk[keep], scores[keep]
+            if len(chunk) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                chunk, scores = chunk[best], scores[best]
+            for row, score in zip(chunk, scores):
+                item = (float(score), -int(row))
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+        return [(self.key(-row), score) for score, row in sorted(heap, reverse=True)]
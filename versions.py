@@ -0,0 +1,199 @@
+# versions.py
+"""
+Survey version history stored as deltas with periodic keyframes.
+
+Every create, import and update appends a row to ``survey_version``. A
+keyframe holds the full ``GET /api/surveys/<id>`` body of that version; any
+other row holds only what changed since the previous version: survey
+fields that differ, questions added or edited (with their option lists),
+and ids of removed questions. Bodies are zlib-compressed JSON.
+
+A keyframe is written for the first version, whenever KEYFRAME_INTERVAL
+versions have passed since the last one, and whenever a delta would not be
+much smaller than the full body. Reconstructing a version therefore reads
+one keyframe plus fewer than KEYFRAME_INTERVAL deltas, in one query.
+
+Surveys created before history existed get their pre-edit state stored as
+version 1 on their first update.
+"""
+
+import json
+import os
+import zlib
+
+from sqlalchemy import func, select
+
+from db import db
+from models import SurveyVersion
+import fastjson
+from read_models import survey_detail
+
+KEYFRAME_INTERVAL = int(os.environ.get("SURVEY_KEYFRAME_INTERVAL", "10"))
+
+_version_table = SurveyVersion.__table__
+_FIELDS = ('id', 'name', 'created_at', 'updated_at')
+
+
+def _encode(value):
+    return zlib.compress(fastjson.dumps(value))
+
+
+def _decode(body):
+    return json.loads(zlib.decompress(body))
+
+
+def make_delta(old, new):
+    """
+    Changes from survey dict ``old`` to ``new`` (empty if they are equal).
+    """
+    delta = {field: new[field] for field in _FIELDS if old.get(field) != new.get(field)}
+    old_questions = {q['id']: q for q in old['questions']}
+    new_ids = {q['id'] for q in new['questions']}
+    upsert = [q for q in new['questions'] if old_questions.get(q['id']) != q]
+    removed = [question_id for question_id in old_questions if question_id not in new_ids]
+    if upsert:
+        delta['upsert'] = upsert
+    if removed:
+        delta['delete'] = removed
+    return delta
+
+
+def apply_delta(state, delta):
+    """
+    The survey dict after applying ``delta`` to ``state`` (which is not modified).
+    """
+    result = {field: delta.get(field, state.get(field)) for field in _FIELDS}
+    questions = {q['id']: q for q in state['questions']}
+    for question_id in delta.get('delete', ()):
+        questions.pop(question_id, None)
+    for question in delta.get('upsert', ()):
+        questions[question['id']] = question
+    # question ids grow with insertion, and reads list questions in id order
+    result['questions'] = [questions[question_id] for question_id in sorted(questions)]
+    return result
+
+
+def _chain(survey_id, version):
+    """
+    Rows from the last keyframe at or before ``version`` up to ``version``.
+    """
+    keyframe = select(func.max(_version_table.c.version)).where(
+        _version_table.c.survey_id == survey_id,
+        _version_table.c.is_keyframe.is_(True),
+        _version_table.c.version <= version
+    ).scalar_subquery()
+    return db.session.execute(
+        select(_version_table.c.version, _version_table.c.is_keyframe, _version_table.c.body).where(
+            _version_table.c.survey_id == survey_id,
+            _version_table.c.version <= version,
+            _version_table.c.version >= keyframe
+        ).order_by(_version_table.c.version)
+    ).all()
+
+
+def _replay(rows):
+    state = None
+    for row in rows:
+        value = _decode(row.body)
+        state = value if row.is_keyframe else apply_delta(state, value)
+    return state
+
+
+def reconstruct(survey_id, version):
+    """
+    The survey as it was at ``version``.
+
+    Returns:
+        dict: The ``GET /api/surveys/<id>`` body of that version, or None if
+        the survey has no such version
+    """
+    rows = _chain(survey_id, version)
+    if not rows or rows[-1].version != version:
+        return None
+    return _replay(rows)
+
+
+def latest_version(survey_id):
+    return db.session.execute(
+        select(func.max(_version_table.c.version)).where(_version_table.c.survey_id == survey_id)
+    ).scalar()
+
+
+def record_version(survey_id):
+    """
+    Append the survey's current state to its history, in the current transaction.
+
+    Callers changing an existing survey must hold its row lock (``SELECT ...
+    FOR UPDATE``), or concurrent writers would both claim the next version.
+
+    Returns:
+        int: The new version number, the latest one if nothing changed, or
+        None if the survey does not exist
+    """
+    detail = survey_detail(survey_id)
+    if detail is None:
+        return None
+    _, state = detail
+
+    latest = latest_version(survey_id)
+    if latest is None:
+        _insert(survey_id, 1, True, _encode(state))
+        return 1
+
+    rows = _chain(survey_id, latest)
+    delta = make_delta(_replay(rows), state)
+    if not delta:
+        return latest
+
+    version = latest + 1
+    body = _encode(delta)
+    full = _encode(state)
+    keyframe = version - rows[0].version >= KEYFRAME_INTERVAL or len(body) * 2 > len(full)
+    _insert(survey_id, version, keyframe, full if keyframe else body)
+    return version
+
+
+def ensure_history(survey_id):
+    """
+    Store the current state as version 1 if the survey has no history yet.
+
+    Call before modifying a survey, so its first delta has a base.
+    """
+    if latest_version(survey_id) is None:
+        record_version(survey_id)
+
+
+def _insert(survey_id, version, is_keyframe, body):
+    db.session.execute(_version_table.insert().values(
+        survey_id=survey_id, version=version, is_keyframe=is_keyframe, body=body
+    ))
+
+
+def delete_versions(survey_id):
+    db.session.execute(_version_table.delete().where(_version_table.c.survey_id == survey_id))
+
+
+def list_versions(survey_id, after=None, limit=None):
+    """
+    Version metadata in version order.
+
+    Returns:
+        list: ``{'version', 'created_at', 'keyframe', 'bytes'}`` dicts
+    """
+    stmt = select(
+        _version_table.c.version, _version_table.c.created_at, _version_table.c.is_keyframe,
+        func.length(_version_table.c.body).label('size')
+    ).where(_version_table.c.survey_id == survey_id).order_by(_version_table.c.version)
+    if after is not None:
+        stmt = stmt.where(_version_table.c.version > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return [
+        {
+            'version': row.version,
+            'created_at': row.created_at.isoformat(),
+            'keyframe': row.is_keyframe,
+            'bytes': row.size
+        }
+        for row in db.session.execute(stmt)
+    ]
@@ -0,0 +1,85 @@
+# worker.py
+"""
+Background job worker pool.
+
+    python worker.py                    # one worker per CPU core
+    python worker.py --processes 2
+    python worker.py --drain            # run queued jobs, then exit
+
+Each process claims jobs from the ``job`` table (see jobs.py) and runs them
+one at a time. No broker is needed; workers only share the database.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+
+logger = logging.getLogger("worker")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run background jobs")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="worker processes (default: all cores)")
+    parser.add_argument("--poll-interval", type=float,
+                        help="seconds between polls when idle (default: JOB_POLL_INTERVAL)")
+    parser.add_argument("--drain", action="store_true",
+                        help="exit once no job is runnable")
+    return parser.parse_args(argv)
+
+
+def run_worker(index, poll_interval, drain):
+    """
+    Entry point of one worker process.
+    """
+    logging.basicConfig(level=logging.INFO)
+    from app import app
+    import jobs
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    with app.app_context():
+        count = jobs.work(worker_id, stop=stop, drain=drain,
+                          poll_interval=poll_interval or jobs.JOB_POLL_INTERVAL)
+    logger.info(f"Worker {worker_id} stopped after {count} jobs")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    # Fresh interpreters, so no database connection is shared across a fork
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(index, args.poll_interval, args.drain),
+                        name=f"worker-{index}")
+        for index in range(max(1, args.processes))
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {len(processes)} worker processes")
+
+    def shutdown(*_):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        shutdown()
+        for process in processes:
+            process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())